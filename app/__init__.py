@@ -20,6 +20,15 @@ def create_app():
     app.register_blueprint(tickets_bp)
     app.register_blueprint(main_bp)
 
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
+    from app.utils.static_assets import init_static_assets
+    init_static_assets(app)
+
+    from app.commands import register_commands
+    register_commands(app)
+
     # Forzar recarga de CSS y assets eliminando el caché del navegador
     @app.after_request
     def add_header(response):
@@ -0,0 +1,362 @@
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, render_template
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.wrappers import Request, Response
+
+from app.config import Config
+from app.firebase import get_async_db
+from app.utils.checkin import plausible_id, redeem_entrada_async
+from app.utils.decorators import verify_session_cookie_async
+
+logger = logging.getLogger(__name__)
+
+# Modo de servicio asyncio (ASGI), como alternativa a gunicorn con hilos:
+#
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 1
+#
+# Los endpoints del escáner (/verificar, /verificar/usar y /descargar) se
+# atienden en el event loop: leen y canjean con el AsyncClient de Firestore
+# (transacción async), así un proceso sostiene cientos de escaneos esperando
+# a Firestore a la vez sin un hilo por cada uno. El tablero en vivo
+# (/en_vivo/stream) también: cada cliente SSE espera en el loop, no en un
+# hilo del pool. Todo lo demás, y los casos raros de esos endpoints (sin
+# sesión, QR firmados, ids inválidos), pasa a la app Flask de siempre
+# corriendo en ASGI_WSGI_THREADS hilos. Las rutas salen
+# del url_map de Flask, no se declaran dos veces. wsgi.py sigue igual.
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _read_body(receive, scope, limite=None):
+    # Cuerpo completo, o None si pasa de `limite` (MAX_CONTENT_LENGTH): se
+    # deja de leer ahí, o antes si Content-Length ya lo excede
+    if limite is not None:
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > limite:
+                return None
+    partes, leidos = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        parte = message.get("body", b"")
+        leidos += len(parte)
+        if limite is not None and leidos > limite:
+            return None
+        partes.append(parte)
+        if not message.get("more_body"):
+            break
+    return b"".join(partes)
+
+def _asgi_headers(headers):
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+class _Desconectado(Exception):
+    pass
+
+class Stream:
+    # Respuesta de una vista async cuyo cuerpo sale de un generador async
+    def __init__(self, response, chunks):
+        self.response = response
+        self.chunks = chunks
+
+class AsgiApp:
+    def __init__(self, flask_app, threads):
+        self.flask_app = flask_app
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self._lock = threading.Lock()
+        self.stats = {"nativas": 0, "wsgi": 0, "errores": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        inicio = time.perf_counter()
+        body = await _read_body(receive, scope, self.flask_app.config.get("MAX_CONTENT_LENGTH"))
+        if body is None:
+            response = RequestEntityTooLarge().get_response()
+            await send({"type": "http.response.start", "status": response.status_code,
+                        "headers": _asgi_headers(response.headers.to_wsgi_list())})
+            await send({"type": "http.response.body", "body": response.get_data()})
+            return
+        environ = build_environ(scope, body)
+        environ["app.inicio"] = inicio
+        vista, kwargs = self._match(environ)
+        response = None
+        if vista is not None:
+            try:
+                response = await vista(self, environ, **kwargs)
+            except Exception:
+                logger.exception("Error en %s (asgi)", environ["PATH_INFO"])
+                self._count("errores")
+                response = Response("Internal Server Error", status=500)
+        if response is None:
+            self._count("wsgi")
+            environ["wsgi.input"] = io.BytesIO(body)
+            await self._wsgi(environ, receive, send)
+            return
+        self._count("nativas")
+        if isinstance(response, Stream):
+            return await self._stream(response, receive, send)
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": _asgi_headers(response.headers.to_wsgi_list())})
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+    async def _stream(self, stream, receive, send):
+        # Cada chunk compite con el aviso de desconexión: un cliente que se
+        # va corta el generador aunque esté esperando el próximo evento
+        async def vigilar():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        vigia = asyncio.create_task(vigilar())
+        chunks = stream.chunks
+        siguiente = None
+        try:
+            await send({"type": "http.response.start", "status": stream.response.status_code,
+                        "headers": _asgi_headers(stream.response.headers.to_wsgi_list())})
+            while True:
+                siguiente = asyncio.ensure_future(chunks.__anext__())
+                await asyncio.wait({siguiente, vigia}, return_when=asyncio.FIRST_COMPLETED)
+                if not siguiente.done():
+                    return
+                try:
+                    chunk = siguiente.result()
+                except StopAsyncIteration:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            vigia.cancel()
+            if siguiente is not None and not siguiente.done():
+                # El generador corre su finally (libera el cliente) al cancelarse
+                siguiente.cancel()
+                await asyncio.gather(siguiente, return_exceptions=True)
+            await chunks.aclose()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _match(self, environ):
+        if environ["REQUEST_METHOD"] not in ("GET", "POST"):
+            return None, None
+        try:
+            endpoint, kwargs = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None, None
+        return VISTAS.get(endpoint), kwargs
+
+    def respond(self, environ, sesion, fn, *args, **kwargs):
+        # Corre fn dentro de un request context de Flask (templates, url_for,
+        # send_file) con los mismos hooks que full_dispatch_request:
+        # before_request, after_request y, al salir del contexto, teardown
+        # (métricas, headers de DEBUG). Devuelve la respuesta ya leída. Sin
+        # await en el medio: el contexto de Flask vive en context vars de la
+        # tarea o del hilo.
+        app = self.flask_app
+        with app.request_context(environ):
+            g._session_user = sesion
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = fn(*args, **kwargs)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+            response.direct_passthrough = False
+            response.get_data()
+            return response
+
+    async def _wsgi(self, environ, receive, send):
+        # La app Flask en un hilo del pool. El hilo itera la respuesta entera
+        # (stream_with_context exige el mismo hilo) y manda cada chunk por el
+        # loop esperando a que salga: un cliente lento frena al generador en
+        # vez de acumular en memoria.
+        loop = asyncio.get_running_loop()
+        desconectado = threading.Event()
+
+        async def vigilar():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            desconectado.set()
+
+        def enviar(message):
+            if desconectado.is_set():
+                # Corta streams largos (SSE) al irse el cliente
+                raise _Desconectado()
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def correr():
+            pendiente = {}
+
+            def start_response(status, headers, exc_info=None):
+                pendiente["start"] = {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                                      "headers": _asgi_headers(headers)}
+                return escribir
+
+            def escribir(chunk):
+                start = pendiente.pop("start", None)
+                if start is not None:
+                    enviar(start)
+                if chunk:
+                    enviar({"type": "http.response.body", "body": chunk, "more_body": True})
+
+            chunks = self.flask_app(environ, start_response)
+            try:
+                for chunk in chunks:
+                    escribir(chunk)
+                escribir(b"")
+                enviar({"type": "http.response.body", "body": b"", "more_body": False})
+            except _Desconectado:
+                pass
+            finally:
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+
+        vigia = asyncio.create_task(vigilar())
+        try:
+            await loop.run_in_executor(self.pool, correr)
+        finally:
+            vigia.cancel()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if Config.WARMUP_ON_START:
+                    # Como post_worker_init en gunicorn.conf.py
+                    from app.utils.warmup import warm_up
+                    threading.Thread(target=lambda: logger.info("Warm-up: %s", warm_up(self.flask_app)),
+                                     name="warmup", daemon=True).start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+# --- vistas async: devuelven la respuesta o None para pasarle el request a Flask ---
+
+async def _sesion(request):
+    cookie = request.cookies.get("session")
+    return cookie, await verify_session_cookie_async(cookie)
+
+async def verificar(asgi, environ):
+    request = Request(environ)
+    sesion = await _sesion(request)
+    entrada_id = request.args.get("id")
+    if not sesion[1] or request.args.get("t") or not plausible_id(entrada_id):
+        return None
+    snap = await get_async_db().collection("entradas").document(entrada_id).get()
+    e = snap.to_dict() if snap.exists else {}
+    return asgi.respond(environ, sesion, render_template, "verificacion.html",
+                        estado=e.get("estado", "invalido"),
+                        nombre=e.get("nombre"),
+                        evento=e.get("evento"),
+                        telefono=e.get("telefono"),
+                        entrada_id=entrada_id)
+
+async def verificar_usar(asgi, environ):
+    request = Request(environ)
+    sesion = await _sesion(request)
+    entrada_id = request.form.get("entrada_id")
+    if not sesion[1] or request.form.get("token") or not plausible_id(entrada_id):
+        return None
+    resultado = await redeem_entrada_async(get_async_db(), entrada_id, sesion[1])
+    return asgi.respond(environ, sesion, render_template, "verificacion.html",
+                        estado=resultado["estado"],
+                        nombre=resultado["nombre"],
+                        evento=resultado["evento"],
+                        telefono=resultado["telefono"],
+                        entrada_id=entrada_id)
+
+async def descargar_qr(asgi, environ, id):
+    from app.routes.tickets import _descarga_ticket, _ticket_de_datos, _formato_params
+    from app.utils.qr_generator import FORMATOS
+    request = Request(environ)
+    sesion = await _sesion(request)
+    if not sesion[1] or (request.args.get("formato") or "png").lower() not in FORMATOS or not plausible_id(id):
+        return None
+    snap = await get_async_db().collection("entradas").document(id).get()
+    e = snap.to_dict() if snap.exists else None
+
+    def descarga():
+        ticket = _ticket_de_datos(id, e) if e is not None else None
+        return _descarga_ticket(ticket, *_formato_params())
+
+    # El render (o la espera de uno en curso) ocupa CPU: va a un hilo
+    return await asyncio.get_running_loop().run_in_executor(asgi.pool, asgi.respond, environ, sesion, descarga)
+
+async def en_vivo_stream(asgi, environ):
+    from app.utils.live_feed import get_feed, acquire_client_slot, release_client_slot
+    request = Request(environ)
+    sesion = await _sesion(request)
+    evento = request.args.get("evento", "").strip()
+    if not sesion[1] or not evento:
+        return None
+    if not acquire_client_slot(asincronico=True):
+        return Response('{"error": "Demasiados tableros abiertos, reintentá en unos segundos"}', status=503,
+                        mimetype="application/json", headers={"Retry-After": "10"})
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("ultimo")
+
+    async def chunks():
+        try:
+            async for chunk in get_feed(evento).stream_async(last_event_id):
+                yield chunk
+        finally:
+            release_client_slot(asincronico=True)
+
+    response = Response(mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return Stream(response, chunks())
+
+VISTAS = {
+    "main.verificar": verificar,
+    "main.verificar_usar": verificar_usar,
+    "tickets.descargar_qr": descargar_qr,
+    "events.en_vivo_stream": en_vivo_stream,
+}
+
+def create_asgi_app(flask_app=None):
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    return AsgiApp(flask_app, Config.ASGI_WSGI_THREADS)
@@ -0,0 +1,57 @@
+import click
+
+def register_commands(app):
+    @app.cli.command("seed-contadores")
+    def seed_contadores():
+        """Crea los contadores de numeración por evento desde las entradas existentes."""
+        from app.firebase import db
+        from app.utils.ticket_numbers import seed_counters
+        maximos = seed_counters(db)
+        for evento, maximo in sorted(maximos.items()):
+            click.echo(f"{evento}: {maximo}")
+        click.echo(f"{len(maximos)} contadores actualizados")
+
+    @app.cli.command("recalcular-estadisticas")
+    @click.option("--evento", default=None, help="Sólo este evento")
+    def recalcular_estadisticas_cmd(evento):
+        """Recalcula desde las entradas las estadísticas por evento."""
+        from app.utils.event_stats import recalcular_estadisticas
+        from app.utils.jobs import Job
+        job = Job("recalcular_estadisticas", {"evento": evento})
+        recalcular_estadisticas(job, evento=evento)
+        click.echo(f"{job.procesados} eventos recalculados, {job.actualizados} con cambios")
+
+    @app.cli.command("reanudar-eliminaciones")
+    def reanudar_eliminaciones():
+        """Termina de borrar los eventos marcados cuyo borrado quedó a mitad."""
+        from app.firebase import db
+        from app.utils.event_deletion import pending_deletions, eliminar_evento_job
+        from app.utils.jobs import Job
+        for evento_id in pending_deletions(db):
+            job = Job("eliminar_evento", {"evento_id": evento_id})
+            eliminar_evento_job(job, evento_id=evento_id)
+            click.echo(f"{evento_id}: {job.procesados} entradas borradas")
+
+    @app.cli.command("barrer-huerfanas")
+    @click.option("--aplicar", is_flag=True, help="Borrarlas (sin esto sólo se cuentan)")
+    def barrer_huerfanas_cmd(aplicar):
+        """Cuenta o borra las entradas cuyo evento no está registrado."""
+        from app.utils.event_deletion import barrer_huerfanas
+        from app.utils.jobs import Job
+        job = Job("barrer_huerfanas", {"aplicar": aplicar})
+        barrer_huerfanas(job, aplicar=aplicar)
+        for evento, n in job.resultado.items():
+            click.echo(f"{evento or '(sin evento)'}: {n}")
+        click.echo(f"{job.procesados if aplicar else job.total} entradas {'borradas' if aplicar else 'huérfanas'}")
+
+    @app.cli.command("sync-canjes")
+    def sync_canjes():
+        """Sincroniza con Firestore los canjes de QR firmados registrados localmente."""
+        from app.firebase import db
+        from app.utils.redemption_log import get_redemption_log
+        resumen = get_redemption_log(app.config["REDEMPTION_LOG_PATH"]).sync(db)
+        click.echo(f"{resumen['sincronizados']} canjes sincronizados")
+        for entrada_id in resumen["doble_uso"]:
+            click.echo(f"DOBLE USO: {entrada_id}")
+        for entrada_id in resumen["inexistentes"]:
+            click.echo(f"Entrada inexistente: {entrada_id}")
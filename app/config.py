@@ -5,7 +5,130 @@ class Config:
     DEBUG = os.environ.get("FLASK_DEBUG", "1") == "1"
     FIREBASE_WEB_API_KEY = os.environ.get("FIREBASE_WEB_API_KEY", "TU_API_KEY_WEB")
     EXTERNAL_BASE_URL = os.environ.get("EXTERNAL_BASE_URL") or os.environ.get("RENDER_EXTERNAL_URL")
+    # La cookie "session" es la de Firebase; la sesión de Flask (mensajes
+    # flash) va en otra para no pisarla
+    SESSION_COOKIE_NAME = "flask_session"
     
-    # Optimizaciones para Desarrollo en Tiempo Real
-    TEMPLATES_AUTO_RELOAD = True
-    SEND_FILE_MAX_AGE_DEFAULT = 0
+    # En desarrollo se recargan templates y estáticos en cada request. En
+    # producción los estáticos llevan el hash del contenido en la URL y se
+    # cachean un año (ver app/utils/static_assets.py); los nombres sin hash,
+    # una hora.
+    TEMPLATES_AUTO_RELOAD = DEBUG
+    SEND_FILE_MAX_AGE_DEFAULT = 0 if DEBUG else 3600
+    STATIC_FINGERPRINT = os.environ.get("STATIC_FINGERPRINT", "0" if DEBUG else "1") == "1"
+
+    # Render de tickets: el encode PNG domina el tiempo de CPU. Por defecto el
+    # nivel de zlib de siempre (6); con 3 el encode es ~2x más rápido a cambio
+    # de ~20% más de peso, para despliegues limitados por CPU.
+    TICKET_PNG_COMPRESS_LEVEL = int(os.environ.get("TICKET_PNG_COMPRESS_LEVEL", "6"))
+
+    # Cache de sesiones verificadas (ver app/utils/decorators.py). Una sesión
+    # revocada o cerrada en otro worker deja de aceptarse en a lo sumo
+    # SESSION_REVOCATION_CHECK_SECONDS.
+    SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "1024"))
+    SESSION_CACHE_TTL = int(os.environ.get("SESSION_CACHE_TTL", "3600"))
+    SESSION_REVOCATION_CHECK_SECONDS = int(os.environ.get("SESSION_REVOCATION_CHECK_SECONDS", "60"))
+
+    # Números de entrada reservados por proceso en cada viaje a Firestore.
+    # Con más de 1 baja la contención, pero pueden quedar huecos y la
+    # numeración deja de seguir estrictamente el orden de creación.
+    TICKET_NUMBER_BLOCK_SIZE = int(os.environ.get("TICKET_NUMBER_BLOCK_SIZE", "1"))
+
+    # Batches de 500 escrituras que /asignar_numeros confirma en paralelo
+    RENUMBER_PARALLEL_BATCHES = int(os.environ.get("RENUMBER_PARALLEL_BATCHES", "4"))
+
+    # Batches de borrado en vuelo al eliminar un evento con sus entradas (ver
+    # app/utils/event_deletion.py)
+    EVENT_DELETE_PARALLEL_BATCHES = int(os.environ.get("EVENT_DELETE_PARALLEL_BATCHES", "4"))
+
+    # QR firmados (HMAC): el QR lleva id, evento, número y vencimiento; uno
+    # falso o vencido se rechaza sin leer Firestore. El canje se hace en
+    # Firestore como con los QR con sólo el id, salvo con
+    # QR_OFFLINE_REDEMPTION: ahí se canjean sólo contra el registro local
+    # REDEMPTION_LOG_PATH (compartido por los workers del host) y
+    # `flask sync-canjes` los lleva a Firestore al volver la conexión,
+    # informando los dobles usos.
+    QR_SIGNED_TOKENS = os.environ.get("QR_SIGNED_TOKENS", "0") == "1"
+    QR_SIGNING_KEY = os.environ.get("QR_SIGNING_KEY") or SECRET_KEY
+    QR_TOKEN_TTL_DAYS = int(os.environ.get("QR_TOKEN_TTL_DAYS", "365"))
+    QR_OFFLINE_REDEMPTION = os.environ.get("QR_OFFLINE_REDEMPTION", "0") == "1"
+    REDEMPTION_LOG_PATH = os.environ.get("REDEMPTION_LOG_PATH", "instance/canjes.jsonl")
+
+    # Espejo en memoria de colecciones mantenido con listeners on_snapshot
+    # (ver app/utils/firestore_cache.py). `entradas` puede ser grande: se
+    # habilita aparte y se abandona si supera FIRESTORE_MIRROR_MAX_RECORDS.
+    FIRESTORE_MIRROR_EVENTOS = os.environ.get("FIRESTORE_MIRROR_EVENTOS", "1") == "1"
+    FIRESTORE_MIRROR_ENTRADAS = os.environ.get("FIRESTORE_MIRROR_ENTRADAS", "0") == "1"
+    FIRESTORE_MIRROR_MAX_RECORDS = int(os.environ.get("FIRESTORE_MIRROR_MAX_RECORDS", "200000"))
+    # Versiones de entradas y eventos (un documento por evento): el cache
+    # HTTP de las páginas las consulta en cada request
+    FIRESTORE_MIRROR_VERSIONES = os.environ.get("FIRESTORE_MIRROR_VERSIONES", "1") == "1"
+
+    # Tablero en vivo por evento con Server-Sent Events (ver
+    # app/utils/live_feed.py). En modo ASGI (el del Procfile) cada cliente
+    # espera en el event loop, hasta LIVE_MAX_CLIENTS_ASGI. Con wsgi.py cada
+    # uno ocupa un hilo de gunicorn: LIVE_MAX_CLIENTS tiene que quedar por
+    # debajo de --threads para dejar hilos a los demás requests. El stream se
+    # corta a los LIVE_STREAM_MAX_SECONDS y el navegador reconecta solo.
+    LIVE_MAX_CLIENTS = int(os.environ.get("LIVE_MAX_CLIENTS", "16"))
+    LIVE_MAX_CLIENTS_ASGI = int(os.environ.get("LIVE_MAX_CLIENTS_ASGI", "1000"))
+    LIVE_HEARTBEAT_SECONDS = float(os.environ.get("LIVE_HEARTBEAT_SECONDS", "15"))
+    LIVE_STREAM_MAX_SECONDS = float(os.environ.get("LIVE_STREAM_MAX_SECONDS", "300"))
+    LIVE_RETRY_MS = int(os.environ.get("LIVE_RETRY_MS", "3000"))
+    LIVE_BUFFER_EVENTS = int(os.environ.get("LIVE_BUFFER_EVENTS", "256"))
+    LIVE_RECENT_REDEMPTIONS = int(os.environ.get("LIVE_RECENT_REDEMPTIONS", "20"))
+    LIVE_IDLE_SECONDS = float(os.environ.get("LIVE_IDLE_SECONDS", "120"))
+
+    # Índice de búsqueda en memoria (ver app/utils/search_index.py): se
+    # reconstruye en segundo plano cada SEARCH_INDEX_REFRESH_SECONDS para ver
+    # escrituras de otros procesos; por encima de SEARCH_INDEX_MAX_RECORDS no
+    # se arma y el buscador filtra sólo la página cargada.
+    SEARCH_INDEX_REFRESH_SECONDS = int(os.environ.get("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+    SEARCH_INDEX_MAX_RECORDS = int(os.environ.get("SEARCH_INDEX_MAX_RECORDS", "200000"))
+
+    # Cache de PNG de tickets (ver app/utils/ticket_cache.py): tope en memoria
+    # por proceso y directorio opcional compartido entre workers, con su
+    # propio tope en bytes (0 = sin tope).
+    TICKET_CACHE_MAX_BYTES = int(os.environ.get("TICKET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    TICKET_CACHE_DIR = os.environ.get("TICKET_CACHE_DIR", "")
+    TICKET_CACHE_DIR_MAX_BYTES = int(os.environ.get("TICKET_CACHE_DIR_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+    # Renders de tickets en cola a la vez (ver app/utils/render_queue.py) y
+    # cuánto espera /ticket/<id>.png un render en curso antes de hacerlo él.
+    RENDER_QUEUE_MAX_PENDING = int(os.environ.get("RENDER_QUEUE_MAX_PENDING", "64"))
+    RENDER_WAIT_SECONDS = float(os.environ.get("RENDER_WAIT_SECONDS", "10"))
+
+    # Exports (PDF de la lista, etc.) guardados por versión de las entradas
+    EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR", "instance/exports")
+    EXPORT_CACHE_MAX_FILES = int(os.environ.get("EXPORT_CACHE_MAX_FILES", "50"))
+
+    # Cache HTTP de /lista, /eventos y el PDF (ver app/utils/page_cache.py):
+    # ETag por versión de las entradas y los eventos más el usuario, 304 si
+    # no cambió, y las páginas ya renderizadas en memoria hasta
+    # PAGE_CACHE_MAX_BYTES por proceso. Apagado en desarrollo (los templates
+    # se recargan).
+    PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "0" if DEBUG else "1") == "1"
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+    # Tope del cuerpo de un request (CSV/XLSX de importación incluidos): Flask
+    # responde 413. En modo ASGI se corta al leerlo, sin juntarlo entero.
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", str(32 * 1024 * 1024)))
+
+    # Modo asyncio (asgi.py, ver app/asgi.py): /verificar, /verificar/usar y
+    # /descargar se atienden en el event loop con el AsyncClient de
+    # Firestore; el resto de la app corre en ASGI_WSGI_THREADS hilos, como
+    # con los --threads de gunicorn. Los streams de /en_vivo no usan estos hilos.
+    ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "24"))
+
+    # Métricas Prometheus en /metrics (ver app/utils/metrics.py). Apagadas
+    # no agregan nada por request. METRICS_TOKEN: bearer para el scraper
+    # (sin token, /metrics pide sesión). SLOW_REQUEST_MS > 0 loguea los
+    # requests más lentos que eso (requiere las métricas encendidas).
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+    # Calentamiento al arrancar cada worker de gunicorn (ver gunicorn.conf.py
+    # y app/utils/warmup.py): abre el canal de Firestore, los mirrors y el
+    # pool de render antes del primer request, en un hilo aparte.
+    WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "0") == "1"
@@ -1,10 +1,20 @@
 import os
 import json
 import base64
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
+import threading
+
+# firebase_admin y el cliente de Firestore (gRPC) se crean recién en el primer
+# uso: importar este módulo no carga el stack de Google ni lee credenciales.
+# `db` y `auth` son proxies que delegan en los singletons reales.
+
+_lock = threading.RLock()
+_db = None
+_async_db = None
+_auth = None
+_ready_callbacks = []
 
 def load_firebase_credentials():
+    from firebase_admin import credentials
     env_key = os.environ.get("FIREBASE_KEY_JSON")
     if env_key:
         try:
@@ -16,9 +26,77 @@ def load_firebase_credentials():
     return credentials.Certificate("firebase_key.json")
 
 def init_firebase():
-    if not firebase_admin._apps:
-        cred = load_firebase_credentials()
-        firebase_admin.initialize_app(cred)
+    import firebase_admin
+    with _lock:
+        if not firebase_admin._apps:
+            cred = load_firebase_credentials()
+            firebase_admin.initialize_app(cred)
+
+def get_db():
+    global _db
+    client = _db
+    if client is None:
+        with _lock:
+            if _db is None:
+                init_firebase()
+                from firebase_admin import firestore
+                client = firestore.client()
+                for fn in _ready_callbacks:
+                    fn(client)
+                _db = client
+            client = _db
+    return client
+
+def get_async_db():
+    # AsyncClient de Firestore para el modo ASGI (ver app/asgi.py). Su canal
+    # gRPC queda atado al event loop del primer uso: se crea desde el loop
+    # del servidor, no al importar.
+    global _async_db
+    client = _async_db
+    if client is None:
+        with _lock:
+            if _async_db is None:
+                init_firebase()
+                from firebase_admin import firestore_async
+                _async_db = firestore_async.client()
+            client = _async_db
+    return client
+
+def get_auth():
+    global _auth
+    module = _auth
+    if module is None:
+        with _lock:
+            if _auth is None:
+                init_firebase()
+                from firebase_admin import auth as firebase_auth
+                _auth = firebase_auth
+            module = _auth
+    return module
+
+def when_ready(fn):
+    # fn(cliente) al crearse el cliente de Firestore (o ya, si existe)
+    with _lock:
+        if _db is None:
+            _ready_callbacks.append(fn)
+            return
+    fn(_db)
+
+def is_initialized():
+    return _db is not None
+
+class _LazyProxy:
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._factory(), name, value)
+
+    def __repr__(self):
+        return f"<lazy {self._factory.__name__}>"
 
-init_firebase()
-db = firestore.client()
+db = _LazyProxy(get_db)
+auth = _LazyProxy(get_auth)
@@ -1,9 +1,9 @@
 from flask import Blueprint, request, redirect, url_for, render_template, make_response
-import requests
 from datetime import timedelta
 from app.firebase import auth
 from app.config import Config
-from app.utils.decorators import verify_session_cookie
+from app.utils.decorators import verify_session_cookie, invalidate_session_cookie
+from app.utils import metrics
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -13,19 +13,22 @@ def login():
         return redirect(request.args.get("next") or url_for("main.index"))
 
     if request.method == "POST":
+        import requests  # sólo el login usa la API REST; no se carga al arrancar
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "")
         try:
-            r = requests.post(
-                f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={Config.FIREBASE_WEB_API_KEY}",
-                json={"email": email, "password": password, "returnSecureToken": True},
-                timeout=10
-            )
-            r.raise_for_status()
+            with metrics.timed(metrics.AUTH_VERIFY, "login_password", resultado=True):
+                r = requests.post(
+                    f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={Config.FIREBASE_WEB_API_KEY}",
+                    json={"email": email, "password": password, "returnSecureToken": True},
+                    timeout=10
+                )
+                r.raise_for_status()
             id_token = r.json()["idToken"]
 
             expires_in = timedelta(days=5)
-            session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
+            with metrics.timed(metrics.AUTH_VERIFY, "crear_sesion", resultado=True):
+                session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
 
             resp = make_response(redirect(request.args.get("next") or url_for("main.index")))
             resp.set_cookie(
@@ -53,6 +56,7 @@ def login():
 
 @auth_bp.route("/logout")
 def logout():
+    invalidate_session_cookie(request.cookies.get("session"))
     resp = make_response(redirect(url_for("auth.login")))
     resp.delete_cookie("session")
     return resp
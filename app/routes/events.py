@@ -1,7 +1,15 @@
-from flask import Blueprint, request, redirect, url_for, render_template, flash, current_app
+from flask import Blueprint, request, redirect, url_for, render_template, flash, current_app, jsonify, Response
 import uuid
 from app.firebase import db
 from app.utils.decorators import login_required
+from app.utils.firestore_cache import list_eventos, mirror_upsert, mirror_discard
+from app.utils.event_stats import load_stats, recalcular_estadisticas
+from app.utils.jobs import start_job, get_job
+from app.utils.live_feed import get_feed, acquire_client_slot, release_client_slot
+from app.utils.event_deletion import mark_for_deletion, eliminar_evento_job, barrer_huerfanas
+from app.utils.search_index import index_upsert
+from app.utils.versions import bump_collection_version, page_versions
+from app.utils.page_cache import cached_page
 
 events_bp = Blueprint('events', __name__)
 
@@ -12,36 +20,121 @@ def registrar_evento():
         nombre = request.form["nombre"]
         fecha_hora = request.form["fecha_hora"]
         evento_id = str(uuid.uuid4())
-        db.collection("eventos").document(evento_id).set({
+        data = {
             "nombre": nombre,
             "fecha_hora": fecha_hora,
             "id": evento_id
-        })
+        }
+        batch = db.batch()
+        batch.set(db.collection("eventos").document(evento_id), data)
+        bump_collection_version(batch, db, "eventos")
+        batch.commit()
+        mirror_upsert("eventos", evento_id, data)
+        index_upsert("eventos", [(evento_id, data)])
+        # Estadísticas desde el inicio (puede haber entradas viejas con el
+        # mismo nombre), en segundo plano como /recalcular_estadisticas
+        start_job("recalcular_estadisticas", recalcular_estadisticas, evento=nombre)
         return redirect(url_for("events.lista_eventos"))
     return render_template("registrar_evento.html")
 
 @events_bp.route('/eventos', endpoint='lista_eventos')
 @login_required
+@cached_page(lambda: page_versions(db, colecciones=("eventos",)))
 def lista_eventos():
-    eventos_ref = db.collection('eventos').stream()
-    eventos = []
-    for doc in eventos_ref:
-        data = doc.to_dict() or {}
-        data['id'] = data.get('id') or doc.id
-        eventos.append(data)
-    return render_template('eventos.html', eventos=eventos)
+    eventos = list_eventos(db)
+    stats = load_stats(db, sorted(filter(None, (ev.get("nombre") for ev in eventos))))
+    return render_template('eventos.html', eventos=eventos, stats=stats)
+
+@events_bp.route('/recalcular_estadisticas', methods=['POST'])
+@login_required
+def recalcular():
+    evento = (request.form.get("evento") or request.args.get("evento") or "").strip() or None
+    job = start_job("recalcular_estadisticas", recalcular_estadisticas, evento=evento)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job.to_dict()), 202, {"Location": url_for("events.estado_recalcular", job_id=job.id)}
+    flash("Recalculando estadísticas de los eventos.", "success")
+    return redirect(url_for('events.lista_eventos'))
+
+@events_bp.route('/recalcular_estadisticas/<job_id>')
+@login_required
+def estado_recalcular(job_id):
+    job = get_job(job_id)
+    if not job or job.kind != "recalcular_estadisticas":
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(job.to_dict())
+
+@events_bp.route('/en_vivo')
+@login_required
+def en_vivo():
+    eventos = sorted(filter(None, (ev.get("nombre") for ev in list_eventos(db))))
+    evento = request.args.get("evento", "").strip() or (eventos[0] if len(eventos) == 1 else None)
+    return render_template('en_vivo.html', eventos=eventos, evento=evento)
+
+@events_bp.route('/en_vivo/stream')
+@login_required
+def en_vivo_stream():
+    evento = request.args.get("evento", "").strip()
+    if not evento:
+        return jsonify(error="Falta el evento"), 400
+    if not acquire_client_slot():
+        return jsonify(error="Demasiados tableros abiertos, reintentá en unos segundos"), 503, {"Retry-After": "10"}
+    # Al reconectar, EventSource manda el último id recibido
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("ultimo")
+    resp = Response(get_feed(evento).stream(last_event_id), mimetype="text/event-stream")
+    resp.call_on_close(release_client_slot)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 @events_bp.route('/eliminar_evento/<evento_id>', methods=['POST'])
 @login_required
 def eliminar_evento(evento_id):
+    # Se marca el evento y las entradas se borran en segundo plano; volver a
+    # eliminar un evento marcado retoma el borrado
     try:
-        db.collection('eventos').document(evento_id).delete()
-        flash("Evento eliminado correctamente.", "success")
+        nombre = mark_for_deletion(db, evento_id)
     except Exception as e:
         current_app.logger.exception("Error al eliminar evento")
         flash(f"Error al eliminar evento: {e}", "danger")
+        return redirect(url_for('events.lista_eventos'))
+    if nombre is None:
+        mirror_discard('eventos', evento_id)
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(error="Evento no encontrado"), 404
+        return redirect(url_for('events.lista_eventos'))
+    job = start_job("eliminar_evento", eliminar_evento_job, evento_id=evento_id)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job.to_dict()), 202, {"Location": url_for("events.estado_eliminar_evento", job_id=job.id)}
+    flash(f"Eliminando el evento {nombre} y sus entradas.", "success")
+    return redirect(url_for('events.lista_eventos'))
+
+@events_bp.route('/eliminar_evento/estado/<job_id>')
+@login_required
+def estado_eliminar_evento(job_id):
+    job = get_job(job_id)
+    if not job or job.kind != "eliminar_evento":
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(job.to_dict())
+
+@events_bp.route('/barrer_huerfanas', methods=['POST'])
+@login_required
+def barrer():
+    # Sin aplicar=1 sólo cuenta las entradas sin evento registrado
+    aplicar = (request.form.get("aplicar") or request.args.get("aplicar")) == "1"
+    job = start_job("barrer_huerfanas", barrer_huerfanas, aplicar=aplicar)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job.to_dict()), 202, {"Location": url_for("events.estado_barrer", job_id=job.id)}
+    flash("Borrando entradas de eventos eliminados." if aplicar else "Contando entradas de eventos eliminados.", "success")
     return redirect(url_for('events.lista_eventos'))
 
+@events_bp.route('/barrer_huerfanas/<job_id>')
+@login_required
+def estado_barrer(job_id):
+    job = get_job(job_id)
+    if not job or job.kind != "barrer_huerfanas":
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(job.to_dict())
+
 @events_bp.route('/ver_eventos')
 @login_required
 def ver_eventos():
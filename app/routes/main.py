@@ -1,9 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
+import time
 
 from app.firebase import db
-from app.utils.decorators import login_required, verify_session_cookie
-from google.cloud import firestore as gcf_firestore
+from app.config import Config
+from app.utils.decorators import login_required, api_login_required, verify_session_cookie
+from app.utils.qr_tokens import verify_ticket_token, TokenError
+from app.utils.redemption_log import get_redemption_log
+from app.utils.checkin import redeem_entrada, load_manifest, get_manifest, loaded_manifests, plausible_id
 
 main_bp = Blueprint('main', __name__)
 
@@ -12,9 +15,46 @@ main_bp = Blueprint('main', __name__)
 def index():
     return render_template("index.html")
 
+def _canjear_token(claims, user):
+    # Con QR_OFFLINE_REDEMPTION el registro local es la única autoridad de
+    # doble uso de los QR firmados; si no, la misma transacción que el resto
+    # de los canjes, con el evento del token.
+    if Config.QR_OFFLINE_REDEMPTION:
+        return get_redemption_log(Config.REDEMPTION_LOG_PATH).redeem(claims, user), "registro_local"
+    return redeem_entrada(db, claims["id"], user, evento=claims.get("ev")), "firestore"
+
+def _verificar_token(token, usar=False):
+    # QR firmado: la firma se valida localmente, así uno falso no llega ni a
+    # Firestore ni al registro local
+    try:
+        claims = verify_ticket_token(Config.QR_SIGNING_KEY.encode("utf-8"), token)
+    except TokenError:
+        return render_template("verificacion.html",
+                               estado="invalido",
+                               nombre=None, evento=None, telefono=None,
+                               entrada_id=None)
+    entrada_id = claims["id"]
+    if usar:
+        e, _ = _canjear_token(claims, verify_session_cookie(request))
+    elif Config.QR_OFFLINE_REDEMPTION:
+        e = get_redemption_log(Config.REDEMPTION_LOG_PATH).lookup(claims)
+    else:
+        snap = db.collection("entradas").document(entrada_id).get()
+        e = snap.to_dict() if snap.exists else {}
+        if e and e.get("evento") != claims.get("ev"):
+            e["estado"] = "invalido"
+    return render_template("verificacion.html",
+                           estado=e.get("estado", "invalido"),
+                           nombre=e.get("nombre"), evento=e.get("evento"), telefono=e.get("telefono"),
+                           numero=e.get("numero"), usada_en=e.get("usada_en"),
+                           entrada_id=entrada_id, token=token)
+
 @main_bp.route("/verificar")
 @login_required
 def verificar():
+    token = request.args.get("t")
+    if token:
+        return _verificar_token(token)
     entrada_id = request.args.get("id")
     if not entrada_id:
         return render_template("verificacion.html",
@@ -42,37 +82,14 @@ def verificar():
 @main_bp.route("/verificar/usar", methods=["POST"])
 @login_required
 def verificar_usar():
+    token = request.form.get("token")
+    if token:
+        return _verificar_token(token, usar=True)
     entrada_id = request.form.get("entrada_id")
     if not entrada_id:
         return redirect(url_for("main.index"))
 
-    doc_ref = db.collection("entradas").document(entrada_id)
-    transaction = db.transaction()
-
-    @gcf_firestore.transactional
-    def mark_used(tx, ref):
-        snap = ref.get(transaction=tx)
-        if not snap.exists:
-            return {"estado": "invalido", "nombre": None, "evento": None, "telefono": None}
-        data = snap.to_dict()
-        estado = data.get("estado", "invalido")
-        if estado == "valido":
-            user = verify_session_cookie(request) or {}
-            tx.update(ref, {
-                "estado": "usado",
-                "usada_en": datetime.utcnow().isoformat() + "Z",
-                "usada_por_uid": user.get("uid"),
-                "usada_por_email": user.get("email")
-            })
-            data["estado"] = "usado"
-        return {
-            "estado": data.get("estado", "invalido"),
-            "nombre": data.get("nombre"),
-            "evento": data.get("evento"),
-            "telefono": data.get("telefono"),
-        }
-
-    resultado = mark_used(transaction, doc_ref)
+    resultado = redeem_entrada(db, entrada_id, verify_session_cookie(request))
     return render_template("verificacion.html",
                            estado=resultado["estado"],
                            nombre=resultado["nombre"],
@@ -80,6 +97,101 @@ def verificar_usar():
                            telefono=resultado["telefono"],
                            entrada_id=entrada_id)
 
+@main_bp.route("/verificar/sincronizar", methods=["POST"])
+@login_required
+def sincronizar_canjes():
+    resumen = get_redemption_log(Config.REDEMPTION_LOG_PATH).sync(db)
+    return jsonify(resumen)
+
+@main_bp.route("/api/checkin/manifiesto", methods=["GET", "POST"])
+@api_login_required
+def checkin_manifiesto():
+    if request.method == "POST":
+        payload = request.get_json(silent=True) or request.form
+        evento = (payload.get("evento") or "").strip()
+        if not evento:
+            return jsonify(error="Falta el evento"), 400
+        return jsonify(load_manifest(db, evento).to_dict())
+    return jsonify(manifiestos=loaded_manifests())
+
+@main_bp.route("/api/checkin", methods=["POST"])
+@api_login_required
+def checkin():
+    inicio = time.perf_counter()
+    payload = request.get_json(silent=True) or request.form
+    entrada_id = (payload.get("id") or "").strip()
+    evento = (payload.get("evento") or "").strip() or None
+    token = payload.get("t")
+
+    def respuesta(estado, fuente, **datos):
+        datos.update(estado=estado, entrada_id=entrada_id or None, fuente=fuente,
+                     latencia_ms=round((time.perf_counter() - inicio) * 1000, 3))
+        return jsonify(datos)
+
+    if token:
+        try:
+            claims = verify_ticket_token(Config.QR_SIGNING_KEY.encode("utf-8"), token)
+        except TokenError as e:
+            return respuesta("invalido", "firma", motivo=str(e))
+        entrada_id = claims["id"]
+        if evento and claims.get("ev") != evento:
+            return respuesta("invalido", "firma", motivo="otro_evento")
+    if not plausible_id(entrada_id):
+        return respuesta("invalido", "formato")
+
+    if token:
+        resultado, fuente = _canjear_token(claims, verify_session_cookie(request))
+    else:
+        resultado, fuente = redeem_entrada(db, entrada_id, verify_session_cookie(request), evento=evento), "firestore"
+    # El manifiesto es una foto de este proceso: quien no figura puede ser
+    # una entrada creada después, así que decide Firestore y se agrega
+    manifest = get_manifest(evento) if evento else None
+    if manifest is not None and entrada_id not in manifest:
+        manifest.desconocida(entrada_id, resultado["estado"] != "invalido")
+    if resultado["canjeada"]:
+        estado = "valido"
+    elif resultado["estado"] == "usado":
+        estado = "usado"
+    else:
+        estado = "invalido"
+    return respuesta(estado, fuente,
+                     nombre=resultado["nombre"], evento=resultado["evento"],
+                     numero=resultado["numero"], usada_en=resultado["usada_en"])
+
+@main_bp.route("/api/buscar")
+@api_login_required
+def buscar():
+    # Type-ahead de /lista (tipo=entradas) y /eventos (tipo=eventos) sobre el
+    # índice en memoria (ver app/utils/search_index.py)
+    from app.utils.search_index import INDEXES, IndexUnavailable, get_search_index
+    inicio = time.perf_counter()
+    tipo = request.args.get("tipo", "entradas")
+    if tipo not in INDEXES:
+        return jsonify(error="Tipo de búsqueda inválido"), 400
+    try:
+        limit = max(1, min(100, int(request.args.get("limit", 20))))
+    except ValueError:
+        limit = 20
+    filtros = {}
+    if tipo == "entradas":
+        filtros = {"evento": request.args.get("evento", "").strip(), "estado": request.args.get("estado", "").strip()}
+    try:
+        # Las entradas pueden tardar en indexarse: mientras tanto el buscador
+        # filtra la página cargada
+        index = get_search_index(tipo, wait=(tipo == "eventos"))
+    except IndexUnavailable as e:
+        return jsonify(error=str(e)), 503, {"Retry-After": "5"}
+    resultados, total = index.search(request.args.get("q", ""), limit, **filtros)
+    return jsonify(resultados=resultados, total=total,
+                   ms=round((time.perf_counter() - inicio) * 1000, 3))
+
+@main_bp.route("/api/warmup", methods=["POST"])
+@api_login_required
+def warmup():
+    # Calentamiento manual del worker que atiende (ver app/utils/warmup.py)
+    from app.utils.warmup import warm_up
+    return jsonify(warm_up(current_app._get_current_object()))
+
 @main_bp.get("/__map")
 def __map():
     return "<pre>" + "\n".join(sorted(str(r) for r in current_app.url_map.iter_rules())) + "</pre>"
@@ -1,40 +1,38 @@
-from flask import Blueprint, request, render_template, redirect, url_for, send_file
+from flask import Blueprint, request, render_template, redirect, url_for, send_file, jsonify, Response, stream_with_context, current_app
 import uuid
-import base64
 import io
 from datetime import datetime
-from collections import Counter
-from google.cloud import firestore
 
 from app.firebase import db
 from app.utils.decorators import login_required
-from app.utils.helpers import make_verification_url, safe_filename
-from app.utils.qr_generator import build_qr_image_with_text
+from app.utils.helpers import ticket_qr_url, safe_filename
+from app.utils.qr_generator import FORMATOS, TEMPLATE_FILE
+from app.utils.ticket_cache import ticket_key, get_ticket_cache, cached_ticket
+from app.utils.render_queue import get_render_queue
+from app.utils.ticket_sheets import ticket_sheets_pdf, GRILLAS
 from app.utils.pdf_builder import descargar_lista_pdf_logic
+from app.utils.exports import exportar_entradas_logic, parse_campos, parse_fecha, FORMATOS as FORMATOS_EXPORT
+from app.utils.render_pool import render_tickets
+from app.utils.zip_stream import stream_zip
+from app.utils.bulk_import import parse_rows, write_entradas, resumen_csv
+from app.utils.ticket_numbers import get_allocator
+from app.utils.jobs import start_job, get_job
+from app.utils.renumbering import renumerar_entradas
+from app.utils.checkin import manifest_add, manifest_discard
+from app.utils.firestore_cache import list_eventos, mirror_upsert, mirror_discard
+from app.utils.search_index import index_upsert, index_discard
+from app.utils.versions import bump_version, page_versions
+from app.utils.page_cache import cached_page
+from app.utils.event_stats import record_stats
+from app.utils import metrics
+from app.utils.entradas import page_entradas, count_sin_orden, count_by_estado, count_by_evento, ESTADOS, PAGE_SIZE
 
 tickets_bp = Blueprint('tickets', __name__)
 
-def get_next_ticket_number(evento):
-    entradas_ref = db.collection("entradas")
-    query = entradas_ref.where("evento", "==", evento).order_by("numero", direction=firestore.Query.DESCENDING).limit(1)
-    results = list(query.stream())
-    if results:
-        max_num = results[0].to_dict().get("numero", 0)
-        return max_num + 1
-    else:
-        all_event_docs = list(entradas_ref.where("evento", "==", evento).stream())
-        if all_event_docs:
-            nums = [doc.to_dict().get("numero") for doc in all_event_docs if "numero" in doc.to_dict()]
-            if nums:
-                return max(nums) + 1
-            return len(all_event_docs) + 1
-        return 1
-
 @tickets_bp.route("/registrar_entrada", methods=["GET", "POST"])
 @login_required
 def registrar_entrada():
-    eventos_docs = db.collection("eventos").stream()
-    eventos = [doc.to_dict() for doc in eventos_docs]
+    eventos = [ev for ev in list_eventos(db) if not ev.get("eliminando")]
 
     if request.method == "POST":
         evento = request.form["evento"]
@@ -42,7 +40,7 @@ def registrar_entrada():
         telefono = request.form["telefono"]
         qr_id = str(uuid.uuid4())
 
-        numero = get_next_ticket_number(evento)
+        numero = get_allocator().next_number(evento)
 
         data = {
             "evento": evento,
@@ -53,15 +51,22 @@ def registrar_entrada():
             "creada_en": datetime.utcnow().isoformat() + "Z",
             "numero": numero,
         }
-        db.collection("entradas").document(qr_id).set(data)
+        batch = db.batch()
+        batch.set(db.collection("entradas").document(qr_id), data)
+        bump_version(batch, db, evento)
+        record_stats(batch, db, evento, emitidas=1, numero=numero)
+        batch.commit()
+        mirror_upsert("entradas", qr_id, data)
+        manifest_add(evento, qr_id)
+        index_upsert("entradas", [(qr_id, data)])
 
-        qr_url = make_verification_url(qr_id)
-        png_bytes = build_qr_image_with_text(qr_url, nombre=nombre, evento=evento, telefono=telefono, numero=numero)
-        qr_base64 = base64.b64encode(png_bytes).decode("utf-8")
+        # El render va a la cola; la página carga la imagen desde /ticket/<id>.png
+        qr_url = ticket_qr_url(data)
+        version = get_render_queue().submit(qr_url, nombre, evento, telefono, numero)
 
         return render_template(
             "registrar_entrada.html",
-            qr_base64=qr_base64,
+            ticket_url=url_for("tickets.ticket_png", id=qr_id, v=version[:16]),
             qr_id=qr_id,
             evento=evento,
             nombre=nombre,
@@ -72,82 +77,272 @@ def registrar_entrada():
 
     return render_template("registrar_entrada.html", eventos=eventos)
 
+@tickets_bp.route("/importar_entradas", methods=["GET", "POST"])
+@login_required
+def importar_entradas():
+    eventos = [ev for ev in list_eventos(db) if not ev.get("eliminando")]
+    if request.method == "GET":
+        return render_template("importar_entradas.html", eventos=eventos)
+
+    archivo = request.files.get("archivo")
+    if not archivo or not archivo.filename:
+        return jsonify(error="Falta el archivo (CSV o JSON)"), 400
+    try:
+        filas, errores = parse_rows(archivo.filename, archivo.read(), request.form.get("evento", "").strip())
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify(error=f"No se pudo leer el archivo: {e}"), 400
+
+    nombres_eventos = {ev.get("nombre") for ev in eventos}
+    validas = []
+    for fila in filas:
+        if fila["evento"] in nombres_eventos:
+            validas.append(fila)
+        else:
+            errores.append({"fila": fila["fila"], "error": f"Evento inexistente: {fila['evento']}"})
+    if not validas:
+        return jsonify(creadas=0, errores=errores), 400
+
+    write_entradas(db, validas, get_allocator().reserve)
+    for fila in validas:
+        mirror_upsert("entradas", fila["id"], dict(fila, estado="valido"))
+        manifest_add(fila["evento"], fila["id"])
+    index_upsert("entradas", [(f["id"], dict(f, estado="valido")) for f in validas])
+
+    resultados = [dict(e, estado="error") for e in errores]
+    jobs = [
+        (ticket_qr_url(f), f["nombre"], f["evento"], f["telefono"], f["numero"])
+        for f in validas
+    ]
+    renders = render_tickets(jobs)
+
+    def entries():
+        for fila, (png, error) in zip(validas, renders):
+            resultado = {k: fila[k] for k in ("fila", "numero", "evento", "nombre", "id")}
+            if png is None:
+                resultados.append(dict(resultado, estado="error", error=f"Render: {error}"))
+                continue
+            resultados.append(dict(resultado, estado="ok"))
+            yield f"{safe_filename(fila['evento'])}/{fila['numero']:04d}_{safe_filename(fila['nombre'])}.png", png
+        yield "resumen.csv", resumen_csv(resultados)
+
+    fname = f"entradas_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    resp = Response(stream_with_context(stream_zip(entries())), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f"attachment; filename={fname}"
+    resp.headers["X-Importacion-Creadas"] = str(len(validas))
+    resp.headers["X-Importacion-Errores"] = str(len(errores))
+    return resp
+
+def _lista_params():
+    evento = request.args.get("evento", "").strip() or None
+    estado = request.args.get("estado", "").strip() or None
+    if estado not in ESTADOS:
+        estado = None
+    try:
+        limit = int(request.args.get("limit", PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return evento, estado, request.args.get("cursor") or None, limit
+
 @tickets_bp.route("/lista")
 @login_required
+@cached_page(lambda: page_versions(db, colecciones=("eventos",)))
 def lista_entradas():
-    docs = db.collection("entradas").stream()
-    entradas = [doc.to_dict() for doc in docs]
-    entradas.sort(key=lambda e: (e.get("evento", "").lower(), e.get("numero", 0)))
-    conteo_eventos = Counter(
-        (e.get("evento") or "(Sin evento)") for e in entradas
-    )
-    return render_template("lista.html", entradas=entradas, conteo_eventos=conteo_eventos)
+    evento, estado, cursor, limit = _lista_params()
+    entradas, siguiente = page_entradas(db, evento, estado, cursor, limit)
+    # En la última página, cuántas quedaron afuera del orden (sin número)
+    sin_orden = count_sin_orden(db, evento, estado) if not siguiente else 0
+    conteos = count_by_estado(db, evento)
+    eventos = sorted(filter(None, (ev.get("nombre") for ev in list_eventos(db))))
+    conteo_eventos = count_by_evento(db, eventos)
+    return render_template("lista.html", entradas=entradas, conteo_eventos=conteo_eventos,
+                           conteos=conteos, evento=evento, estado=estado,
+                           cursor=cursor, siguiente=siguiente, sin_orden=sin_orden,
+                           trabajo_id=request.args.get("trabajo"))
+
+@tickets_bp.route("/api/entradas")
+@login_required
+def api_entradas():
+    evento, estado, cursor, limit = _lista_params()
+    entradas, siguiente = page_entradas(db, evento, estado, cursor, limit)
+    sin_orden = count_sin_orden(db, evento, estado) if not siguiente else 0
+    return jsonify(entradas=entradas, siguiente=siguiente, sin_orden=sin_orden, conteos=count_by_estado(db, evento))
 
 @tickets_bp.route("/asignar_numeros", methods=["POST"])
 @login_required
 def asignar_numeros():
-    docs = db.collection("entradas").stream()
-    entradas = []
-    for doc in docs:
-        d = doc.to_dict()
-        d["_doc_id"] = doc.id
-        entradas.append(d)
-        
-    by_event = {}
-    for e in entradas:
-        ev = e.get("evento", "(Sin evento)")
-        if ev not in by_event:
-            by_event[ev] = []
-        by_event[ev].append(e)
-        
-    for ev, ev_entradas in by_event.items():
-        ev_entradas.sort(key=lambda x: x.get("creada_en", ""))
-        for index, e in enumerate(ev_entradas):
-            doc_id = e["_doc_id"]
-            num = index + 1
-            db.collection("entradas").document(doc_id).update({"numero": num})
-            
-    return redirect(url_for("tickets.lista_entradas"))
+    evento = (request.form.get("evento") or request.args.get("evento") or "").strip() or None
+    job = start_job("asignar_numeros", renumerar_entradas, evento=evento)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job.to_dict()), 202, {"Location": url_for("tickets.estado_asignar_numeros", job_id=job.id)}
+    return redirect(url_for("tickets.lista_entradas", trabajo=job.id))
+
+@tickets_bp.route("/asignar_numeros/<job_id>")
+@login_required
+def estado_asignar_numeros(job_id):
+    job = get_job(job_id)
+    if not job or job.kind != "asignar_numeros":
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(job.to_dict())
 
 @tickets_bp.route("/eliminar/<entrada_id>", methods=["POST"])
 @login_required
 def eliminar_entrada(entrada_id):
-    db.collection("entradas").document(entrada_id).delete()
+    ref = db.collection("entradas").document(entrada_id)
+    snap = ref.get()
+    if snap.exists:
+        data = snap.to_dict() or {}
+        batch = db.batch()
+        batch.delete(ref)
+        bump_version(batch, db, data.get("evento"))
+        record_stats(batch, db, data.get("evento"), eliminadas=1, usadas=-1 if data.get("estado") == "usado" else 0)
+        batch.commit()
+    mirror_discard("entradas", entrada_id)
+    manifest_discard(entrada_id)
+    index_discard("entradas", [entrada_id])
     return redirect(url_for("tickets.lista_entradas"))
 
 @tickets_bp.route("/descargar_lista_pdf")
 @login_required
+@cached_page(lambda: page_versions(db, _lista_params()[0]))
 def descargar_lista_pdf():
-    return descargar_lista_pdf_logic()
+    evento, estado, _, _ = _lista_params()
+    return descargar_lista_pdf_logic(evento, estado)
+
+@tickets_bp.route("/exportar_entradas.<formato>")
+@login_required
+def exportar_entradas(formato):
+    # ?campos=nombre,telefono&evento=..&estado=..&desde=2025-03-01&hasta=2025-03-31
+    if formato not in FORMATOS_EXPORT:
+        return jsonify(error="Formato no soportado"), 404
+    evento, estado, _, _ = _lista_params()
+    try:
+        desde = parse_fecha(request.args.get("desde"))
+        hasta = parse_fecha(request.args.get("hasta"), hasta=True)
+    except ValueError:
+        return jsonify(error="Fecha inválida (usar AAAA-MM-DD o AAAA-MM-DDTHH:MM)"), 400
+    return exportar_entradas_logic(formato, parse_campos(request.args.get("campos")),
+                                   evento, estado, desde, hasta)
+
+def _entradas_para_imprimir(evento, ids):
+    # Selección explícita por ids, o todo el evento en orden de número
+    if ids:
+        refs = [db.collection("entradas").document(i) for i in ids]
+        entradas = []
+        for start in range(0, len(refs), 100):
+            for snap in db.get_all(refs[start:start + 100]):
+                if snap.exists:
+                    entradas.append(dict(snap.to_dict(), id=snap.id))
+        entradas.sort(key=lambda e: (e.get("evento") or "", e.get("numero") or 0))
+        return iter(entradas)
+    query = db.collection("entradas").where("evento", "==", evento).order_by("numero")
+    return (dict(doc.to_dict(), id=doc.id) for doc in query.stream())
+
+@tickets_bp.route("/imprimir_tickets", methods=["GET", "POST"])
+@login_required
+def imprimir_tickets():
+    # Pliego A4 para imprimir: ?evento=<nombre> o ids=<id>,<id>... (también
+    # por POST) y por_hoja=1|2|4|9. El PDF se envía a medida que se arma.
+    evento = (request.values.get("evento") or "").strip()
+    ids = [i for v in request.values.getlist("ids") for i in v.split(",") if i.strip()]
+    ids = [i.strip() for i in ids]
+    try:
+        por_hoja = int(request.values.get("por_hoja", 4))
+    except ValueError:
+        por_hoja = 0
+    if por_hoja not in GRILLAS:
+        return jsonify(error="por_hoja debe ser 1, 2, 4 o 9"), 400
+    if not evento and not ids:
+        return jsonify(error="Indicá un evento o una selección de entradas"), 400
+
+    entradas = _entradas_para_imprimir(evento, ids)
+    jobs = ((ticket_qr_url(e), e.get("nombre", ""), e.get("evento", ""), e.get("telefono", ""), e.get("numero"))
+            for e in entradas)
+    titulo = evento or "Selección de tickets"
+    fname = f"tickets_{safe_filename(titulo)}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+    chunks = metrics.timed_iter(metrics.PDF_BUILD, ticket_sheets_pdf(jobs, por_hoja, titulo), "pliego")
+    resp = Response(stream_with_context(chunks), mimetype="application/pdf")
+    resp.headers["Content-Disposition"] = f"attachment; filename={fname}"
+    return resp
+
+def _ticket_de_entrada(entrada_id):
+    snap = db.collection("entradas").document(entrada_id).get()
+    return _ticket_de_datos(entrada_id, snap.to_dict()) if snap.exists else None
+
+def _ticket_de_datos(entrada_id, e):
+    return (ticket_qr_url(dict(e, id=entrada_id)), e.get("nombre", ""), e.get("evento", ""),
+            e.get("telefono", ""), e.get("numero"))
+
+def _formato_params():
+    # ?calidad sólo cambia el JPEG: en el resto no debe partir el cache ni el ETag
+    formato = (request.args.get("formato") or "png").lower()
+    try:
+        calidad = min(100, max(1, int(request.args["calidad"]))) if formato == "jpeg" else None
+    except (KeyError, ValueError):
+        calidad = None
+    return formato, calidad
 
 @tickets_bp.route("/descargar/<id>")
 @login_required
 def descargar_qr(id):
-    snap = db.collection("entradas").document(id).get()
-    if not snap.exists:
+    # ?formato=png|png8|webp|jpeg|svg|pdf y, para jpeg, ?calidad=1-100
+    formato, calidad = _formato_params()
+    if formato not in FORMATOS:
+        return f"Formato desconocido: {formato}", 400
+    return _descarga_ticket(_ticket_de_entrada(id), formato, calidad)
+
+def _descarga_ticket(ticket, formato, calidad):
+    # Respuesta de /descargar con la entrada ya leída (la usa también el modo
+    # ASGI, que la lee con el AsyncClient)
+    if ticket is None:
+        return "Entrada no encontrada", 404
+    _, nombre, evento, _, _ = ticket
+    background_href = url_for("static", filename=TEMPLATE_FILE, _external=True) if formato == "svg" else None
+
+    # La clave del cache es un hash de todo lo que entra al render: sirve
+    # como ETag fuerte y permite responder 304 sin renderizar.
+    etag = ticket_key(*ticket, formato, calidad, background_href)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        if formato == "png":
+            _, data = get_render_queue().get_png(*ticket, timeout=current_app.config["RENDER_WAIT_SECONDS"])
+        else:
+            _, data = cached_ticket(*ticket, formato, calidad, background_href)
+        mimetype, ext = FORMATOS[formato]
+        fname = f"{safe_filename(evento)}_{safe_filename(nombre)}.{ext}"
+        resp = send_file(
+            io.BytesIO(data),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=fname,
+            etag=False
+        )
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@tickets_bp.route("/ticket/<id>.png")
+@login_required
+def ticket_png(id):
+    # Igual que /descargar pero inline. Con ?v=<versión> vigente la URL es
+    # inmutable y el navegador no vuelve a pedirla.
+    ticket = _ticket_de_entrada(id)
+    if ticket is None:
         return "Entrada no encontrada", 404
-    e = snap.to_dict()
-
-    nombre = e.get("nombre", "")
-    evento = e.get("evento", "")
-    numero = e.get("numero")
-
-    qr_url = make_verification_url(id)
-    png_bytes = build_qr_image_with_text(
-        qr_url,
-        nombre=nombre,
-        evento=evento,
-        telefono=e.get("telefono", ""),
-        numero=numero
-    )
-
-    fname = f"{safe_filename(evento)}_{safe_filename(nombre)}.png"
-
-    buf = io.BytesIO(png_bytes)
-    buf.seek(0)
-    return send_file(
-        buf,
-        mimetype="image/png",
-        as_attachment=True,
-        download_name=fname
-    )
+    etag = ticket_key(*ticket)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        _, png_bytes = get_render_queue().get_png(*ticket, timeout=current_app.config["RENDER_WAIT_SECONDS"])
+        resp = Response(png_bytes, mimetype="image/png")
+    resp.set_etag(etag)
+    if request.args.get("v") == etag[:16]:
+        resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    else:
+        resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@tickets_bp.route("/api/render/metricas")
+@login_required
+def render_metricas():
+    return jsonify(cola=get_render_queue().stats(), cache=get_ticket_cache().stats())
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from app.utils.versions import bump_versions
+from app.utils.event_stats import record_stats
+
+BATCH_SIZE = 500
+CAMPOS = ("nombre", "telefono", "evento")
+
+def parse_rows(filename: str, raw: bytes, evento_default: str = ""):
+    # Devuelve (filas_validas, errores). Cada fila válida conserva su número de
+    # fila original para poder reportar el resultado por fila.
+    text = raw.decode("utf-8-sig")
+    if (filename or "").lower().endswith(".json") or text.lstrip().startswith(("[", "{")):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("entradas", [])
+        if not isinstance(data, list):
+            raise ValueError("El JSON debe ser una lista de entradas")
+        records = data
+    else:
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        records = list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+    filas, errores = [], []
+    for i, rec in enumerate(records, start=1):
+        if not isinstance(rec, dict):
+            errores.append({"fila": i, "error": "Formato de fila inválido"})
+            continue
+        rec = {str(k).strip().lower(): (str(v).strip() if v is not None else "") for k, v in rec.items() if k}
+        fila = {c: rec.get(c, "") for c in CAMPOS}
+        if not fila["evento"]:
+            fila["evento"] = evento_default
+        faltan = [c for c in CAMPOS if not fila[c]]
+        if faltan:
+            errores.append({"fila": i, "error": "Faltan campos: " + ", ".join(faltan)})
+            continue
+        fila["fila"] = i
+        filas.append(fila)
+    return filas, errores
+
+def write_entradas(db, filas, allocate_numbers):
+    # allocate_numbers(evento, n) -> primer número de un bloque contiguo de n.
+    # Completa id/numero en cada fila y escribe con WriteBatch de a 500.
+    por_evento = {}
+    for fila in filas:
+        por_evento.setdefault(fila["evento"], []).append(fila)
+    for evento, grupo in por_evento.items():
+        inicio = allocate_numbers(evento, len(grupo))
+        for offset, fila in enumerate(grupo):
+            fila["numero"] = inicio + offset
+            fila["id"] = str(uuid.uuid4())
+
+    # Un creada_en distinto y creciente por fila (en el orden del archivo), así
+    # el orden de creación que usa /asignar_numeros no depende de los uuid
+    inicio = datetime.utcnow()
+    entradas = db.collection("entradas")
+    for offset, fila in enumerate(filas):
+        fila["creada_en"] = (inicio + timedelta(microseconds=offset)).isoformat(timespec="microseconds") + "Z"
+    # Dos lugares del batch quedan para la versión y las estadísticas de cada
+    # evento del tramo
+    por_batch = max(BATCH_SIZE // 2, BATCH_SIZE - 2 * len(por_evento))
+    for start in range(0, len(filas), por_batch):
+        batch = db.batch()
+        tramo = filas[start:start + por_batch]
+        bump_versions(batch, db, (f["evento"] for f in tramo))
+        numeros = {}
+        for fila in tramo:
+            numeros.setdefault(fila["evento"], []).append(fila["numero"])
+        for evento, nums in numeros.items():
+            record_stats(batch, db, evento, emitidas=len(nums), numero=max(nums))
+        for fila in tramo:
+            batch.set(entradas.document(fila["id"]), {
+                "evento": fila["evento"],
+                "nombre": fila["nombre"],
+                "telefono": fila["telefono"],
+                "id": fila["id"],
+                "estado": "valido",
+                "creada_en": fila["creada_en"],
+                "numero": fila["numero"],
+            })
+        batch.commit()
+    return filas
+
+def resumen_csv(resultados) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["fila", "estado", "numero", "evento", "nombre", "id", "error"])
+    writer.writeheader()
+    for r in sorted(resultados, key=lambda r: r["fila"]):
+        writer.writerow({k: r.get(k, "") for k in writer.fieldnames})
+    return out.getvalue().encode("utf-8-sig")
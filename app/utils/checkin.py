@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime
+
+from app.utils.versions import bump_version
+from app.utils.event_stats import record_stats
+from app.utils.search_index import index_update
+
+def _mark_used(tx, db, ref, snap, user, evento):
+    # Cuerpo de la transacción de canje, común al cliente sync y al asyncio:
+    # las escrituras de una transacción se acumulan sin I/O hasta el commit.
+    if not snap.exists:
+        return {"estado": "invalido", "canjeada": False, "nombre": None, "evento": None,
+                "telefono": None, "numero": None, "usada_en": None}
+    data = snap.to_dict()
+    estado = data.get("estado", "invalido")
+    if evento is not None and data.get("evento") != evento:
+        estado = data["estado"] = "invalido"
+    canjeada = False
+    if estado == "valido":
+        user_data = user or {}
+        data["usada_en"] = datetime.utcnow().isoformat() + "Z"
+        tx.update(ref, {
+            "estado": "usado",
+            "usada_en": data["usada_en"],
+            "usada_por_uid": user_data.get("uid"),
+            "usada_por_email": user_data.get("email")
+        })
+        bump_version(tx, db, data.get("evento"))
+        record_stats(tx, db, data.get("evento"), usadas=1)
+        data["estado"] = "usado"
+        canjeada = True
+    return {
+        "estado": data.get("estado", "invalido"),
+        "canjeada": canjeada,
+        "nombre": data.get("nombre"),
+        "evento": data.get("evento"),
+        "telefono": data.get("telefono"),
+        "numero": data.get("numero"),
+        "usada_en": data.get("usada_en"),
+    }
+
+def redeem_entrada(db, entrada_id, user=None, evento=None):
+    # Marca la entrada como usada dentro de una transacción. Devuelve el
+    # estado resultante y si el canje ocurrió en esta llamada. Con `evento`,
+    # una entrada de otro evento se informa como inválida y no se canjea.
+    from google.cloud import firestore
+    doc_ref = db.collection("entradas").document(entrada_id)
+
+    @firestore.transactional
+    def mark_used(tx, ref):
+        return _mark_used(tx, db, ref, ref.get(transaction=tx), user, evento)
+
+    resultado = mark_used(db.transaction(), doc_ref)
+    if resultado["canjeada"]:
+        index_update("entradas", [(entrada_id, {"estado": "usado"})])
+    return resultado
+
+async def redeem_entrada_async(adb, entrada_id, user=None, evento=None):
+    # Igual que redeem_entrada con el AsyncClient (modo ASGI, ver app/asgi.py)
+    from google.cloud import firestore
+    doc_ref = adb.collection("entradas").document(entrada_id)
+
+    @firestore.async_transactional
+    async def mark_used(tx, ref):
+        return _mark_used(tx, adb, ref, await ref.get(transaction=tx), user, evento)
+
+    resultado = await mark_used(adb.transaction(), doc_ref)
+    if resultado["canjeada"]:
+        index_update("entradas", [(entrada_id, {"estado": "usado"})])
+    return resultado
+
+class EventManifest:
+    # Ids de las entradas de un evento, cargados antes de abrir puertas. No
+    # decide canjes: las altas de otros workers no llegan acá, así que un id
+    # desconocido se consulta igual en Firestore y, si existe, se agrega.
+    # `faltantes` cuenta esos casos para saber cuándo recargarlo.
+    def __init__(self, evento, ids):
+        self.evento = evento
+        self.ids = set(ids)
+        self.cargado_en = time.time()
+        self.faltantes = 0
+
+    def __contains__(self, entrada_id):
+        return entrada_id in self.ids
+
+    def desconocida(self, entrada_id, existe):
+        if existe:
+            with _manifests_lock:
+                self.ids.add(entrada_id)
+                self.faltantes += 1
+
+    def to_dict(self):
+        return {"evento": self.evento, "entradas": len(self.ids), "cargado_en": self.cargado_en,
+                "faltantes": self.faltantes}
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def load_manifest(db, evento) -> EventManifest:
+    query = db.collection("entradas").where("evento", "==", evento).select(["estado"])
+    manifest = EventManifest(evento, (doc.id for doc in query.stream()))
+    with _manifests_lock:
+        _manifests[evento] = manifest
+    return manifest
+
+def get_manifest(evento):
+    return _manifests.get(evento)
+
+def loaded_manifests():
+    with _manifests_lock:
+        return [m.to_dict() for m in _manifests.values()]
+
+def manifest_add(evento, entrada_id):
+    manifest = _manifests.get(evento)
+    if manifest is not None:
+        with _manifests_lock:
+            manifest.ids.add(entrada_id)
+
+def manifest_discard(entrada_id):
+    with _manifests_lock:
+        for manifest in _manifests.values():
+            manifest.ids.discard(entrada_id)
+
+def plausible_id(entrada_id) -> bool:
+    # Ids que Firestore no aceptaría se descartan sin RPC
+    return bool(entrada_id) and len(entrada_id) <= 128 and "/" not in entrada_id and entrada_id not in (".", "..")
@@ -1,16 +1,101 @@
+import asyncio
+import hashlib
+import threading
+import time
 from functools import wraps
-from flask import request, redirect, url_for
+from cachetools import TTLCache
+from flask import request, redirect, url_for, g, has_request_context, jsonify
 from app.firebase import auth
+from app.config import Config
+from app.utils import metrics
+
+# Claims ya verificados, por hash de la cookie. La verificación completa
+# (con check_revoked, que es un RPC a Firebase) se repite como mucho cada
+# SESSION_REVOCATION_CHECK_SECONDS por sesión.
+_session_cache = TTLCache(maxsize=Config.SESSION_CACHE_SIZE, ttl=Config.SESSION_CACHE_TTL)
+_session_lock = threading.Lock()
+_session_stats = {"hits": 0, "misses": 0, "revocation_checks": 0, "request_memo_hits": 0}
+
+def _cookie_key(session_cookie):
+    return hashlib.sha256(session_cookie.encode("utf-8")).hexdigest()
+
+def session_cache_stats():
+    with _session_lock:
+        stats = dict(_session_stats)
+        stats["size"] = len(_session_cache)
+    return stats
+
+def invalidate_session_cookie(session_cookie):
+    if session_cookie:
+        with _session_lock:
+            _session_cache.pop(_cookie_key(session_cookie), None)
+
+def _cached_claims(session_cookie):
+    # Claims en cache todavía vigentes, sin RPC; None si hay que verificar
+    key = _cookie_key(session_cookie)
+    now = time.time()
+    with _session_lock:
+        entry = _session_cache.get(key)
+        if entry is None:
+            return None
+        claims, checked_at = entry
+        if claims.get("exp", now + 1) <= now or now - checked_at >= Config.SESSION_REVOCATION_CHECK_SECONDS:
+            return None
+        _session_stats["hits"] += 1
+        return claims
+
+def _verify_cached(session_cookie):
+    key = _cookie_key(session_cookie)
+    now = time.time()
+    with _session_lock:
+        entry = _session_cache.get(key)
+        if entry is not None:
+            claims, checked_at = entry
+            if claims.get("exp", now + 1) <= now:
+                _session_cache.pop(key, None)
+                return None
+            if now - checked_at < Config.SESSION_REVOCATION_CHECK_SECONDS:
+                _session_stats["hits"] += 1
+                return claims
+            _session_stats["revocation_checks"] += 1
+        else:
+            _session_stats["misses"] += 1
+    try:
+        with metrics.timed(metrics.AUTH_VERIFY, "verificar_sesion", resultado=True):
+            decoded = auth.verify_session_cookie(session_cookie, check_revoked=True)
+    except Exception:
+        invalidate_session_cookie(session_cookie)
+        return None
+    with _session_lock:
+        _session_cache[key] = (decoded, now)
+    return decoded
 
 def verify_session_cookie(req):
     session_cookie = req.cookies.get("session")
     if not session_cookie:
         return None
-    try:
-        decoded = auth.verify_session_cookie(session_cookie, check_revoked=True)
-        return decoded
-    except Exception:
+    # Una sola verificación por request: context processor y login_required
+    # comparten el resultado.
+    if has_request_context():
+        memo = g.get("_session_user")
+        if memo is not None and memo[0] == session_cookie:
+            with _session_lock:
+                _session_stats["request_memo_hits"] += 1
+            return memo[1]
+    decoded = _verify_cached(session_cookie)
+    if has_request_context():
+        g._session_user = (session_cookie, decoded)
+    return decoded
+
+async def verify_session_cookie_async(session_cookie):
+    # Para el modo ASGI: del cache sin bloquear el loop; la verificación con
+    # RPC a Firebase (firebase_admin no tiene API asyncio) va a un hilo.
+    if not session_cookie:
         return None
+    claims = _cached_claims(session_cookie)
+    if claims is not None:
+        return claims
+    return await asyncio.to_thread(_verify_cached, session_cookie)
 
 def login_required(fn):
     @wraps(fn)
@@ -20,3 +105,14 @@ def login_required(fn):
             return redirect(url_for("auth.login", next=request.path))
         return fn(*args, **kwargs)
     return wrapper
+
+def api_login_required(fn):
+    # Igual que login_required pero para clientes JSON (escáneres): 401 en
+    # vez de redirigir al login.
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = verify_session_cookie(request)
+        if not user:
+            return jsonify(error="No autenticado"), 401
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,201 @@
+import base64
+import bisect
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.event_stats import load_stats
+from app.utils.firestore_cache import list_entradas, sorted_entradas
+from app.utils.metrics import propagate
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ESTADOS = ("valido", "usado")
+
+def base_query(db, evento=None, estado=None):
+    query = db.collection("entradas")
+    if evento:
+        query = query.where("evento", "==", evento)
+    if estado:
+        query = query.where("estado", "==", estado)
+    return query
+
+def encode_cursor(entrada) -> str:
+    raw = json.dumps([entrada.get("evento"), entrada.get("numero"), entrada["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        evento, numero, entrada_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(entrada_id, str):
+        return None
+    return {"evento": evento, "numero": numero, "__name__": entrada_id}
+
+def _orden(valor):
+    # Orden de Firestore entre tipos: nulo < booleano < número < texto
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, bool):
+        return (1, valor)
+    if isinstance(valor, (int, float)):
+        return (2, valor)
+    if isinstance(valor, str):
+        return (4, valor)
+    return (9, repr(valor))
+
+def _clave_lista(r):
+    return (_orden(r.evento), _orden(r.numero), r.id)
+
+def page_entradas(db, evento=None, estado=None, cursor=None, limit=PAGE_SIZE):
+    # Una página ordenada por (evento, numero, id); el id desempata números
+    # repetidos hasta que corre asignar_numeros. Las entradas sin evento o
+    # numero no entran en el orden (ver count_sin_orden). Se pide un
+    # documento de más para saber si hay página siguiente sin otra consulta.
+    from google.cloud import firestore
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    start = decode_cursor(cursor)
+    vista = sorted_entradas("lista", _clave_lista)
+    if vista is not None:
+        return _page_from_mirror(*vista, evento, estado, start, limit)
+    query = (base_query(db, evento, estado).order_by("evento").order_by("numero")
+             .order_by(firestore.FieldPath.document_id()))
+    if start:
+        query = query.start_after(start)
+    entradas = [data for _, data in _leer(query.limit(limit + 1))]
+    siguiente = encode_cursor(entradas[limit - 1]) if len(entradas) > limit else None
+    return entradas[:limit], siguiente
+
+def _leer(query):
+    for doc in query.stream():
+        data = doc.to_dict() or {}
+        data["id"] = data.get("id") or doc.id
+        yield doc, data
+
+def _page_from_mirror(registros, claves, evento, estado, start, limit):
+    # Mismo orden y cursor que la consulta, sobre la vista ordenada del
+    # espejo: se busca el comienzo y se recorre sólo lo que hace falta
+    desde = 0
+    if start:
+        desde = bisect.bisect_right(claves, (_orden(start["evento"]), _orden(start["numero"]), start["__name__"]))
+    if evento:
+        desde = max(desde, bisect.bisect_left(claves, (_orden(evento),)))
+    filas = []
+    for i in range(desde, len(registros)):
+        r = registros[i]
+        if not r.ordenable:
+            continue
+        if evento and r.evento != evento:
+            break
+        if estado and r.estado != estado:
+            continue
+        filas.append(r.to_dict())
+        if len(filas) > limit:
+            break
+    siguiente = encode_cursor(filas[limit - 1]) if len(filas) > limit else None
+    return filas[:limit], siguiente
+
+def count_sin_orden(db, evento=None, estado=None) -> int:
+    # Entradas que la lista no muestra por no tener evento o numero
+    # (anteriores a la numeración); asignar_numeros les completa los campos.
+    # Dos agregaciones, sin leer documentos.
+    registros = list_entradas(evento, estado)
+    if registros is not None:
+        return sum(1 for r in registros if not r.ordenable)
+    ordenadas = base_query(db, evento, estado).order_by("evento").order_by("numero")
+    return count_entradas(db, evento, estado) - int(ordenadas.count(alias="total").get()[0][0].value)
+
+def iter_entradas(db, evento=None, estado=None, page_size=MAX_PAGE_SIZE):
+    # Todas las entradas en el orden de page_entradas, de a una página por
+    # vez, y al final las que no entran en ese orden. Esas se buscan
+    # recorriendo por id sólo si las cuentas dicen que hay alguna: quien
+    # recorre todo ya lee cada documento una vez.
+    cursor = None
+    while True:
+        entradas, cursor = page_entradas(db, evento, estado, cursor, page_size)
+        yield from entradas
+        if not cursor:
+            break
+    if count_sin_orden(db, evento, estado):
+        yield from _sin_orden(db, evento, estado, page_size)
+
+def _sin_orden(db, evento, estado, page_size):
+    from google.cloud import firestore
+    registros = list_entradas(evento, estado)
+    if registros is not None:
+        for r in sorted((r for r in registros if not r.ordenable), key=lambda r: r.id):
+            yield r.to_dict()
+        return
+    # Sólo los campos del orden para decidir; las que faltan se leen enteras
+    query = (base_query(db, evento, estado).order_by(firestore.FieldPath.document_id())
+             .select(["evento", "numero"]).limit(page_size))
+    ultimo = None
+    while True:
+        pagina = query.start_after(ultimo) if ultimo is not None else query
+        refs = []
+        leidos = 0
+        for doc in pagina.stream():
+            leidos += 1
+            ultimo = doc
+            data = doc.to_dict() or {}
+            if "evento" not in data or "numero" not in data:
+                refs.append(doc.reference)
+        for snap in (db.get_all(refs) if refs else ()):
+            if snap.exists:
+                data = snap.to_dict() or {}
+                data["id"] = data.get("id") or snap.id
+                yield data
+        if leidos < page_size:
+            return
+
+def count_entradas(db, evento=None, estado=None) -> int:
+    result = base_query(db, evento, estado).count(alias="total").get()
+    return int(result[0][0].value)
+
+def _stats_conteos(db, evento=None):
+    # Conteos desde las estadísticas por evento (event_stats), o None si falta
+    # alguna recalculada
+    stats = load_stats(db, [evento] if evento else None)
+    if not stats or any(s is None for s in stats.values()) or (evento and evento not in stats):
+        return None
+    return {k: sum(s[k] for s in stats.values()) for k in ("total",) + ESTADOS}
+
+def count_by_estado(db, evento=None):
+    # Primero las estadísticas por evento (un documento por evento); si no
+    # están, el mirror o consultas de agregación (no se leen documentos)
+    conteos = _stats_conteos(db, evento)
+    if conteos is not None:
+        return conteos
+    filtros = (None,) + ESTADOS
+    registros = list_entradas(evento)
+    if registros is not None:
+        return dict(zip(("total",) + ESTADOS,
+                        [len(registros)] + [sum(1 for r in registros if r.estado == e) for e in ESTADOS]))
+    with ThreadPoolExecutor(max_workers=len(filtros)) as pool:
+        valores = list(pool.map(propagate(lambda estado: count_entradas(db, evento, estado)), filtros))
+    return dict(zip(("total",) + ESTADOS, valores))
+
+def count_by_evento(db, eventos):
+    if not eventos:
+        return {}
+    stats = load_stats(db, eventos)
+    conteo = {ev: stats[ev]["total"] for ev in eventos if stats.get(ev) is not None}
+    faltan = [ev for ev in eventos if ev not in conteo]
+    if faltan:
+        conteo.update(_count_by_evento(db, faltan))
+    return {ev: conteo[ev] for ev in eventos}
+
+def _count_by_evento(db, eventos):
+    registros = list_entradas()
+    if registros is not None:
+        conteo = dict.fromkeys(eventos, 0)
+        for r in registros:
+            if r.evento in conteo:
+                conteo[r.evento] += 1
+        return conteo
+    with ThreadPoolExecutor(max_workers=min(8, len(eventos))) as pool:
+        valores = list(pool.map(propagate(lambda ev: count_entradas(db, ev)), eventos))
+    return dict(zip(eventos, valores))
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from app.config import Config
+from app.utils.versions import bump_version, bump_collection_version
+from app.utils.event_stats import record_stats, stats_ref
+
+# Borrado de un evento con sus entradas, como trabajo en segundo plano. El
+# documento del evento se marca primero (`eliminando`) y se borra al final:
+# si el proceso se cae a mitad, el evento sigue en /eventos marcado y volver
+# a eliminarlo (o `flask reanudar-eliminaciones`) retoma desde las entradas
+# que quedan, porque las ya borradas no vuelven a aparecer en la consulta.
+
+BATCH_SIZE = 500
+# Cada batch lleva además la versión y las estadísticas del evento
+POR_BATCH = BATCH_SIZE - 2
+
+def _delete_chunk(db, docs):
+    # docs: [(ref, evento, estado)] de un mismo evento
+    batch = db.batch()
+    for ref, _, _ in docs:
+        batch.delete(ref)
+    evento = docs[0][1]
+    usadas = sum(1 for _, _, estado in docs if estado == "usado")
+    bump_version(batch, db, evento)
+    record_stats(batch, db, evento, eliminadas=len(docs), usadas=-usadas)
+    batch.commit()
+
+def delete_in_batches(db, job, chunks):
+    # Confirma los batches con a lo sumo EVENT_DELETE_PARALLEL_BATCHES en
+    # vuelo; `chunks` se consume a medida que hay lugar, así se lee la
+    # siguiente página mientras se borran las anteriores.
+    from app.utils.firestore_cache import mirror_discard
+    from app.utils.checkin import manifest_discard
+    from app.utils.search_index import index_discard
+    paralelo = max(1, Config.EVENT_DELETE_PARALLEL_BATCHES)
+
+    def run(chunk):
+        _delete_chunk(db, chunk)
+        for ref, _, _ in chunk:
+            mirror_discard("entradas", ref.id)
+            manifest_discard(ref.id)
+        index_discard("entradas", [ref.id for ref, _, _ in chunk])
+        job.advance(procesados=len(chunk), actualizados=len(chunk))
+
+    with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix="borrado") as pool:
+        pendientes = set()
+        for chunk in chunks:
+            if len(pendientes) >= paralelo:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for f in hechos:
+                    f.result()
+            pendientes.add(pool.submit(run, chunk))
+        for f in pendientes:
+            f.result()
+
+def _event_chunks(db, evento):
+    # Páginas de entradas del evento ordenadas por id con cursor: la página
+    # siguiente no depende de que la anterior ya se haya borrado
+    from google.cloud import firestore
+    query = (db.collection("entradas").where("evento", "==", evento)
+             .order_by(firestore.FieldPath.document_id())
+             .select(["estado"]).limit(POR_BATCH))
+    ultimo = None
+    while True:
+        pagina = query.start_after(ultimo) if ultimo is not None else query
+        chunk = []
+        for doc in pagina.stream():
+            ultimo = doc
+            chunk.append((doc.reference, evento, (doc.to_dict() or {}).get("estado")))
+        if chunk:
+            yield chunk
+        if len(chunk) < POR_BATCH:
+            return
+
+def mark_for_deletion(db, evento_id):
+    # Devuelve el nombre del evento marcado, o None si no existe
+    ref = db.collection("eventos").document(evento_id)
+    snap = ref.get()
+    if not snap.exists:
+        return None
+    data = snap.to_dict() or {}
+    if not data.get("eliminando"):
+        data["eliminando"] = datetime.utcnow().isoformat() + "Z"
+        batch = db.batch()
+        batch.update(ref, {"eliminando": data["eliminando"]})
+        bump_collection_version(batch, db, "eventos")
+        batch.commit()
+    from app.utils.firestore_cache import mirror_upsert
+    mirror_upsert("eventos", evento_id, dict(data, id=data.get("id") or evento_id))
+    return data.get("nombre")
+
+def eliminar_evento_job(job, evento_id):
+    # Trabajo en segundo plano (ver app/utils/jobs.py)
+    from app.firebase import db
+    from app.utils.entradas import count_entradas
+    from app.utils.firestore_cache import mirror_discard
+    from app.utils.search_index import index_discard
+    ref = db.collection("eventos").document(evento_id)
+    snap = ref.get()
+    if not snap.exists:
+        return
+    nombre = (snap.to_dict() or {}).get("nombre")
+    # Otro evento registrado con el mismo nombre conserva las entradas
+    otros = [d.id for d in db.collection("eventos").where("nombre", "==", nombre).stream() if d.id != evento_id]
+    batch = db.batch()
+    if nombre and not otros:
+        job.total = count_entradas(db, nombre)
+        delete_in_batches(db, job, _event_chunks(db, nombre))
+        batch.delete(stats_ref(db, nombre))
+    batch.delete(ref)
+    bump_collection_version(batch, db, "eventos")
+    batch.commit()
+    mirror_discard("eventos", evento_id)
+    index_discard("eventos", [evento_id])
+
+def pending_deletions(db):
+    # Eventos marcados cuyo borrado no terminó
+    return [d.id for d in db.collection("eventos").where("eliminando", ">", "").stream()]
+
+def barrer_huerfanas(job, aplicar=False):
+    # Entradas cuyo evento no está registrado (borrados de antes de que el
+    # borrado fuera en cascada, o cargas con un nombre mal escrito). Sin
+    # `aplicar` sólo las cuenta por evento en job.resultado.
+    from app.firebase import db
+    registrados = {(d.to_dict() or {}).get("nombre") for d in db.collection("eventos").select(["nombre"]).stream()}
+    huerfanas = {}
+    for doc in db.collection("entradas").select(["evento", "estado"]).stream():
+        data = doc.to_dict() or {}
+        evento = data.get("evento") or ""
+        if evento not in registrados:
+            huerfanas.setdefault(evento, []).append((doc.reference, evento, data.get("estado")))
+    job.resultado = {evento: len(docs) for evento, docs in sorted(huerfanas.items())}
+    job.total = sum(job.resultado.values())
+    if not aplicar:
+        return
+    chunks = (docs[i:i + POR_BATCH] for docs in huerfanas.values() for i in range(0, len(docs), POR_BATCH))
+    delete_in_batches(db, job, chunks)
+    for evento in huerfanas:
+        stats_ref(db, evento).delete()
@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime
+
+from app.utils.versions import bump_version
+
+# Estadísticas de las entradas de cada evento, un documento por evento:
+# emitidas (creadas alguna vez), eliminadas, usadas (entre las que siguen
+# existiendo) y el número más alto entregado. Se actualizan con
+# transformaciones atómicas (Increment/Maximum) en el mismo batch o
+# transacción que la escritura a `entradas`, así /lista y /eventos leen un
+# documento por evento en vez de contar entradas. Escrituras hechas por fuera
+# de la app (consola) no las actualizan: recalcular_estadisticas las rehace
+# desde las entradas. Hasta recalcularlo una vez (`recalculada_en`) un
+# documento sólo tiene los cambios desde el deploy y no se usa para leer.
+STATS_COLLECTION = "estadisticas_eventos"
+
+def stats_ref(db, evento):
+    doc_id = hashlib.sha1((evento or "").encode("utf-8")).hexdigest()
+    return db.collection(STATS_COLLECTION).document(doc_id)
+
+def record_stats(writer, db, evento, emitidas=0, usadas=0, eliminadas=0, numero=None):
+    # writer: WriteBatch o Transaction
+    from google.cloud import firestore
+    data = {"evento": evento or ""}
+    for campo, n in (("emitidas", emitidas), ("usadas", usadas), ("eliminadas", eliminadas)):
+        if n:
+            data[campo] = firestore.Increment(n)
+    if numero is not None:
+        data["ultimo_numero"] = firestore.Maximum(numero)
+    writer.set(stats_ref(db, evento), data, merge=True)
+
+def _conteos(data):
+    total = max(0, (data.get("emitidas") or 0) - (data.get("eliminadas") or 0))
+    usadas = min(total, max(0, data.get("usadas") or 0))
+    return {"total": total, "valido": total - usadas, "usado": usadas,
+            "ultimo_numero": data.get("ultimo_numero") or 0}
+
+def load_stats(db, eventos=None):
+    # {evento: {total, valido, usado, ultimo_numero}} de los eventos pedidos
+    # (o de todos); None si el documento nunca se recalculó. Los que no
+    # tienen documento no aparecen.
+    if eventos is None:
+        snaps = db.collection(STATS_COLLECTION).stream()
+    elif eventos:
+        snaps = db.get_all([stats_ref(db, ev) for ev in eventos])
+    else:
+        return {}
+    stats = {}
+    for snap in snaps:
+        if snap.exists:
+            data = snap.to_dict() or {}
+            stats[data.get("evento", "")] = _conteos(data) if data.get("recalculada_en") else None
+    return stats
+
+def reconcile_event(db, evento):
+    # Recalcula el documento de un evento desde las entradas dentro de una
+    # transacción. Las escrituras de la app también escriben este documento,
+    # así que una que ocurra a la vez hace reintentar la transacción en vez
+    # de perderse. Las eliminadas no se pueden contar desde la fuente y se
+    # conservan.
+    from google.cloud import firestore
+    from app.utils.entradas import base_query
+    from app.utils.ticket_numbers import counter_ref, max_existing_number
+    ref = stats_ref(db, evento)
+
+    def contar(tx, estado=None):
+        result = base_query(db, evento, estado).count(alias="total").get(transaction=tx)
+        return int(result[0][0].value)
+
+    @firestore.transactional
+    def recompute(tx):
+        snap = ref.get(transaction=tx)
+        anterior = (snap.to_dict() or {}) if snap.exists else {}
+        contador = counter_ref(db, evento).get(transaction=tx)
+        eliminadas = anterior.get("eliminadas") or 0
+        data = {
+            "evento": evento or "",
+            "emitidas": contar(tx) + eliminadas,
+            "usadas": contar(tx, "usado"),
+            "eliminadas": eliminadas,
+            "ultimo_numero": max(max_existing_number(db, evento, transaction=tx),
+                                 (contador.to_dict() or {}).get("ultimo_numero", 0) if contador.exists else 0),
+        }
+        cambio = any(anterior.get(k) != v for k, v in data.items())
+        tx.set(ref, dict(data, recalculada_en=datetime.utcnow().isoformat() + "Z"))
+        if cambio:
+            # Los conteos que muestran /eventos y /lista cambiaron
+            bump_version(tx, db, evento)
+        return cambio
+
+    return recompute(db.transaction())
+
+def recalcular_estadisticas(job, evento=None):
+    # Trabajo en segundo plano (ver app/utils/jobs.py): los eventos
+    # registrados más los que ya tienen estadísticas
+    from app.firebase import db
+    if evento:
+        eventos = [evento]
+    else:
+        nombres = {(d.to_dict() or {}).get("nombre") for d in db.collection("eventos").select(["nombre"]).stream()}
+        nombres |= {(d.to_dict() or {}).get("evento") for d in db.collection(STATS_COLLECTION).select(["evento"]).stream()}
+        eventos = sorted(filter(None, nombres))
+    job.total = len(eventos)
+    for ev in eventos:
+        cambio = reconcile_event(db, ev)
+        job.advance(procesados=1, actualizados=int(cambio))
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+
+from app.config import Config
+
+# Exports ya generados, en disco y por clave (versión de las entradas más
+# filtros). Un export nuevo se guarda mientras se envía: si la descarga se
+# corta, el archivo a medias se descarta.
+class ExportCache:
+    def __init__(self, directory, max_files):
+        self.directory = os.path.abspath(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def get(self, key, ext):
+        path = self.path(key, ext)
+        if os.path.exists(path):
+            os.utime(path)
+            with self._lock:
+                self.stats["hits"] += 1
+            return path
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def tee(self, key, ext, chunks):
+        # Generador: reenvía los chunks y al final publica el archivo
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        completo = False
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+                    yield chunk
+            completo = True
+        finally:
+            if completo:
+                os.replace(tmp, self.path(key, ext))
+                self._prune()
+            else:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def _prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file() and not e.name.endswith(".tmp")]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_files:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_export_cache() -> ExportCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExportCache(Config.EXPORT_CACHE_DIR, Config.EXPORT_CACHE_MAX_FILES)
+    return _cache
@@ -0,0 +1,119 @@
+import bisect
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+from flask import Response, send_file, stream_with_context
+
+from app.firebase import db
+from app.utils.entradas import base_query, MAX_PAGE_SIZE
+from app.utils.export_cache import get_export_cache
+from app.utils.firestore_cache import sorted_entradas
+from app.utils.spreadsheet import csv_stream, xlsx_stream
+from app.utils.versions import versions_key
+
+# Exports de entradas para planillas (CSV y XLSX). Sólo se piden a Firestore
+# las columnas elegidas (select) y se lee de a una página por vez; las filas
+# salen a la respuesta a medida que llegan, así la memoria no depende de la
+# cantidad de entradas.
+
+CAMPOS = ("numero", "evento", "nombre", "telefono", "estado", "creada_en", "usada_en", "id")
+FORMATOS = {"csv": "text/csv",
+            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+def parse_campos(valor):
+    # "nombre,telefono" -> ("nombre", "telefono"); vacío o inválido: todos
+    pedidos = [c.strip() for c in (valor or "").split(",") if c.strip() in CAMPOS]
+    return tuple(dict.fromkeys(pedidos)) or CAMPOS
+
+def parse_fecha(valor, hasta=False):
+    # creada_en se guarda como ISO en UTC ("2025-03-01T18:30:00.000000Z"), así
+    # que el rango se compara como texto. Una fecha y hora con offset se pasa
+    # a UTC; sin offset se toma como UTC. Una fecha sola en `hasta` incluye
+    # todo ese día. Devuelve (operador, valor) o None; ValueError si no parsea.
+    valor = (valor or "").strip().rstrip("Z")
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(valor)
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    if len(valor) == 10:
+        if hasta:
+            return "<", (fecha + timedelta(days=1)).date().isoformat()
+        return ">=", fecha.date().isoformat()
+    return ("<=" if hasta else ">="), fecha.isoformat()
+
+def iter_export_rows(db, campos, evento=None, estado=None, desde=None, hasta=None, page_size=MAX_PAGE_SIZE):
+    # Dicts con sólo `campos`. Con rango se ordena por creación (las entradas
+    # sin creada_en quedan afuera); sin rango, por id para no excluir ninguna.
+    rango = [("creada_en",) + r for r in (desde, hasta) if r]
+
+    if rango:
+        vista = sorted_entradas("export_creada", _clave_creada)
+    else:
+        vista = sorted_entradas("export_id", _clave_id)
+    if vista is not None:
+        yield from _filas_de_vista(vista, campos, evento, estado, rango)
+        return
+
+    from google.cloud import firestore
+    query = base_query(db, evento, estado)
+    for campo, op, valor in rango:
+        query = query.where(campo, op, valor)
+    if rango:
+        query = query.order_by("creada_en")
+    query = query.order_by(firestore.FieldPath.document_id())
+    # El cursor necesita los campos del orden aunque no se exporten
+    query = query.select(list(dict.fromkeys(campos + ("creada_en",)))).limit(page_size)
+    ultimo = None
+    while True:
+        pagina = query.start_after(ultimo) if ultimo is not None else query
+        leidos = 0
+        for doc in pagina.stream():
+            leidos += 1
+            ultimo = doc
+            data = doc.to_dict() or {}
+            data["id"] = data.get("id") or doc.id
+            yield {c: data.get(c) for c in campos}
+        if leidos < page_size:
+            return
+
+def _clave_id(r):
+    return str(r.id)
+
+def _clave_creada(r):
+    return (r.creada_en if isinstance(r.creada_en, str) else "", str(r.id))
+
+def _filas_de_vista(vista, campos, evento, estado, rango):
+    # Recorre la vista ordenada del espejo (compartida, no se copia) sólo
+    # entre los límites del rango; se arma el dict de cada fila que sale.
+    # valor + "\0" es el menor texto mayor que valor (para "<=").
+    registros, claves = vista
+    inicio, fin = 0, len(registros)
+    for _, op, valor in rango:
+        if op == ">=":
+            inicio = bisect.bisect_left(claves, (valor,))
+        else:
+            fin = bisect.bisect_left(claves, (valor if op == "<" else valor + "\0",))
+    for i in range(inicio, fin):
+        r = registros[i]
+        if rango and not isinstance(r.creada_en, str):
+            continue
+        if (evento is None or r.evento == evento) and (estado is None or r.estado == estado):
+            yield {c: getattr(r, c) for c in campos}
+
+
+def exportar_entradas_logic(formato, campos, evento=None, estado=None, desde=None, hasta=None):
+    # Mismo esquema que la lista PDF: clave = filtros + versión de las entradas
+    filtros = repr((formato, campos, evento, estado, desde, hasta)).encode("utf-8")
+    key = f"export_{hashlib.sha1(filtros).hexdigest()[:12]}_{versions_key(db, evento)}"
+    filename = f"entradas_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    cache = get_export_cache()
+    path = cache.get(key, formato)
+    if path:
+        return send_file(path, mimetype=FORMATOS[formato], as_attachment=True, download_name=filename)
+
+    filas = iter_export_rows(db, campos, evento, estado, desde, hasta)
+    chunks = csv_stream(filas, campos) if formato == "csv" else xlsx_stream(filas, campos)
+    response = Response(stream_with_context(cache.tee(key, formato, chunks)), mimetype=FORMATOS[formato])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
@@ -0,0 +1,248 @@
+import sys
+import threading
+import time
+
+from app.config import Config
+from app.utils.versions import VERSIONS_COLLECTION, COLLECTION_VERSIONS
+
+# Espejo en memoria de colecciones chicas o muy leídas, mantenido al día con
+# listeners on_snapshot. Las vistas leen del espejo; las escrituras siguen
+# yendo a Firestore. Si el listener no está conectado se lee directo.
+
+class EventoRecord:
+    __slots__ = ("id", "nombre", "fecha_hora", "eliminando")
+
+    def __init__(self, doc_id, data):
+        self.id = data.get("id") or doc_id
+        self.nombre = data.get("nombre")
+        self.fecha_hora = data.get("fecha_hora")
+        self.eliminando = data.get("eliminando")
+
+    def to_dict(self):
+        return {"id": self.id, "nombre": self.nombre, "fecha_hora": self.fecha_hora, "eliminando": self.eliminando}
+
+class EntradaRecord:
+    CAMPOS = ("id", "evento", "nombre", "telefono", "estado", "numero", "creada_en", "usada_en")
+    __slots__ = CAMPOS + ("ordenable",)
+
+    def __init__(self, doc_id, data):
+        self.id = data.get("id") or doc_id
+        self.evento = data.get("evento")
+        self.nombre = data.get("nombre")
+        self.telefono = data.get("telefono")
+        self.estado = data.get("estado")
+        self.numero = data.get("numero")
+        self.creada_en = data.get("creada_en")
+        self.usada_en = data.get("usada_en")
+        # Firestore deja afuera de order_by("evento").order_by("numero") a los
+        # documentos sin alguno de los dos campos (nulo sí cuenta)
+        self.ordenable = "evento" in data and "numero" in data
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.CAMPOS}
+
+class VersionRecord:
+    __slots__ = ("id", "clave", "version")
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.clave = data.get("evento", data.get("coleccion", ""))
+        self.version = data.get("version", 0)
+
+    def to_dict(self):
+        return {"id": self.id, "clave": self.clave, "version": self.version}
+
+class CollectionMirror:
+    RETRY_SECONDS = 30
+
+    def __init__(self, db, collection, record_cls, max_records):
+        self.db = db
+        self.collection = collection
+        self.record_cls = record_cls
+        self.max_records = max_records
+        self._records = {}
+        self._lock = threading.Lock()
+        self._watch = None
+        self._synced = False
+        self._disabled = False
+        self._last_update = None
+        self._last_start = 0.0
+        # Vistas ordenadas de los registros, válidas mientras no cambien
+        self._generation = 0
+        self._vistas = {}
+        self.stats_counters = {"snapshots": 0, "cambios": 0, "lecturas_directas": 0, "reconexiones": 0}
+
+    def start(self):
+        with self._lock:
+            if self._disabled or (self._watch is not None and self._watch_active()):
+                return
+            if time.time() - self._last_start < self.RETRY_SECONDS and self._last_start:
+                return
+            if self._watch is not None:
+                self.stats_counters["reconexiones"] += 1
+            self._last_start = time.time()
+            self._synced = False
+            self._watch = self.db.collection(self.collection).on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        with self._lock:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+            self._watch = None
+            self._synced = False
+
+    def _watch_active(self):
+        return getattr(self._watch, "is_active", True)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            if not self._synced:
+                # Primer snapshot (o reset del stream): reconstruir completo
+                self._records = {doc.id: self.record_cls(doc.id, doc.to_dict() or {}) for doc in docs}
+            else:
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == "REMOVED":
+                        self._records.pop(doc.id, None)
+                    else:
+                        self._records[doc.id] = self.record_cls(doc.id, doc.to_dict() or {})
+            self._synced = True
+            self._generation += 1
+            self._last_update = time.time()
+            self.stats_counters["snapshots"] += 1
+            self.stats_counters["cambios"] += len(changes)
+            overflow = len(self._records) > self.max_records
+        if overflow:
+            # Memoria acotada: la colección creció más de lo previsto, se
+            # vuelve a leer directo de Firestore.
+            self._disabled = True
+            self.stop()
+            with self._lock:
+                self._records = {}
+                self._vistas = {}
+
+    def is_live(self):
+        if self._disabled:
+            return False
+        if self._watch is None or not self._watch_active():
+            self.start()
+        return self._synced and self._watch is not None and self._watch_active()
+
+    def records(self):
+        with self._lock:
+            return list(self._records.values())
+
+    def sorted_records(self, nombre, key):
+        # (registros, claves) ordenados por key; se ordena una vez por cada
+        # cambio del espejo y no por request. Las listas son compartidas: no
+        # modificarlas.
+        with self._lock:
+            vista = self._vistas.get(nombre)
+            if vista is None or vista[0] != self._generation:
+                registros = sorted(self._records.values(), key=key)
+                vista = self._vistas[nombre] = (self._generation, registros, [key(r) for r in registros])
+            return vista[1], vista[2]
+
+    def upsert(self, doc_id, data):
+        # Aplica una escritura propia sin esperar al listener (leer lo escrito)
+        with self._lock:
+            if self._synced:
+                self._records[doc_id] = self.record_cls(doc_id, data)
+                self._generation += 1
+
+    def discard(self, doc_id):
+        with self._lock:
+            if self._records.pop(doc_id, None) is not None:
+                self._generation += 1
+
+    def count_direct_read(self):
+        with self._lock:
+            self.stats_counters["lecturas_directas"] += 1
+
+    def stats(self):
+        with self._lock:
+            registros = len(self._records)
+            per_record = sys.getsizeof(next(iter(self._records.values()))) if registros else 0
+            return dict(
+                self.stats_counters,
+                coleccion=self.collection,
+                registros=registros,
+                bytes_aprox=registros * per_record,
+                conectado=bool(self._watch is not None and self._synced and self._watch_active()),
+                deshabilitado=self._disabled,
+                antiguedad_s=round(time.time() - self._last_update, 3) if self._last_update else None,
+            )
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+MIRRORED = {
+    "eventos": (EventoRecord, "FIRESTORE_MIRROR_EVENTOS"),
+    "entradas": (EntradaRecord, "FIRESTORE_MIRROR_ENTRADAS"),
+    VERSIONS_COLLECTION: (VersionRecord, "FIRESTORE_MIRROR_VERSIONES"),
+    COLLECTION_VERSIONS: (VersionRecord, "FIRESTORE_MIRROR_VERSIONES"),
+}
+
+def get_mirror(collection):
+    record_cls, flag = MIRRORED[collection]
+    if not getattr(Config, flag):
+        return None
+    mirror = _mirrors.get(collection)
+    if mirror is None:
+        with _mirrors_lock:
+            mirror = _mirrors.get(collection)
+            if mirror is None:
+                from app.firebase import db
+                mirror = _mirrors[collection] = CollectionMirror(db, collection, record_cls, Config.FIRESTORE_MIRROR_MAX_RECORDS)
+    mirror.start()
+    return mirror
+
+def live_mirror(collection):
+    mirror = get_mirror(collection)
+    if mirror is None:
+        return None
+    if not mirror.is_live():
+        mirror.count_direct_read()
+        return None
+    return mirror
+
+def mirror_stats():
+    with _mirrors_lock:
+        return [m.stats() for m in _mirrors.values()]
+
+def mirror_upsert(collection, doc_id, data):
+    mirror = _mirrors.get(collection)
+    if mirror is not None:
+        mirror.upsert(doc_id, data)
+
+def mirror_discard(collection, doc_id):
+    mirror = _mirrors.get(collection)
+    if mirror is not None:
+        mirror.discard(doc_id)
+
+def list_eventos(db):
+    mirror = live_mirror("eventos")
+    if mirror is not None:
+        return [r.to_dict() for r in mirror.records()]
+    eventos = []
+    for doc in db.collection("eventos").stream():
+        data = doc.to_dict() or {}
+        data["id"] = data.get("id") or doc.id
+        eventos.append(data)
+    return eventos
+
+def sorted_entradas(nombre, key):
+    # Vista ordenada del espejo de entradas, o None si no está disponible
+    mirror = live_mirror("entradas")
+    if mirror is None:
+        return None
+    return mirror.sorted_records(nombre, key)
+
+def list_entradas(evento=None, estado=None):
+    # Entradas desde el espejo, o None si no está disponible (el llamador
+    # decide cómo consultar Firestore).
+    mirror = live_mirror("entradas")
+    if mirror is None:
+        return None
+    return [r for r in mirror.records()
+            if (evento is None or r.evento == evento) and (estado is None or r.estado == estado)]
@@ -1,18 +1,48 @@
 import unicodedata
 import re
+from datetime import datetime, timedelta
 from flask import url_for, request
 from app.config import Config
+from app.utils.qr_tokens import sign_ticket
 
-def make_verification_url(entrada_id: str) -> str:
-    path = url_for('main.verificar', id=entrada_id)
+def make_verification_url(entrada_id: str, token: str = None) -> str:
+    if token:
+        path = url_for('main.verificar', t=token)
+    else:
+        path = url_for('main.verificar', id=entrada_id)
     if Config.EXTERNAL_BASE_URL:
         return Config.EXTERNAL_BASE_URL.rstrip("/") + path
     return (request.host_url.rstrip("/") + path)
 
+def ticket_token(entrada: dict):
+    # El vencimiento sale de creada_en para que el mismo ticket genere
+    # siempre el mismo QR. Sin creada_en no se firma: el QR lleva sólo el id.
+    try:
+        creada = datetime.fromisoformat((entrada.get("creada_en") or "").rstrip("Z"))
+    except ValueError:
+        return None
+    expires = creada + timedelta(days=Config.QR_TOKEN_TTL_DAYS)
+    return sign_ticket(
+        Config.QR_SIGNING_KEY.encode("utf-8"),
+        entrada["id"],
+        entrada.get("evento"),
+        entrada.get("numero"),
+        int((expires - datetime(1970, 1, 1)).total_seconds()),
+    )
+
+def ticket_qr_url(entrada: dict) -> str:
+    if Config.QR_SIGNED_TOKENS:
+        return make_verification_url(entrada["id"], token=ticket_token(entrada))
+    return make_verification_url(entrada["id"])
+
+def fold_accents(text: str) -> str:
+    # "Ñandú Pérez" -> "Nandu Perez"
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
 def safe_filename(text: str) -> str:
     if not text:
         return "sin_nombre"
-    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = fold_accents(text)
     text = re.sub(r"[^\w\-]+", "_", text, flags=re.ASCII)
     text = re.sub(r"_+", "_", text).strip("_")
     return text[:60] or "sin_nombre"
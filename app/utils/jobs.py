@@ -0,0 +1,78 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Trabajos en segundo plano dentro del proceso. El estado vive en memoria:
+# con un solo worker de gunicorn (ver Procfile) el endpoint de consulta
+# siempre lo encuentra.
+MAX_JOBS = 100
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.estado = "pendiente"
+        self.total = 0
+        self.procesados = 0
+        self.actualizados = 0
+        self.resultado = None
+        self.error = None
+        self.creado_en = time.time()
+        self.terminado_en = None
+        self._lock = threading.Lock()
+
+    def advance(self, procesados=0, actualizados=0):
+        with self._lock:
+            self.procesados += procesados
+            self.actualizados += actualizados
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "tipo": self.kind,
+                "parametros": self.params,
+                "estado": self.estado,
+                "total": self.total,
+                "procesados": self.procesados,
+                "actualizados": self.actualizados,
+                "resultado": self.resultado,
+                "progreso": round(self.procesados / self.total, 4) if self.total else (1.0 if self.estado == "completado" else 0.0),
+                "error": self.error,
+                "creado_en": self.creado_en,
+                "terminado_en": self.terminado_en,
+            }
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jobs")
+
+def _run(job, fn, app):
+    job.estado = "en_curso"
+    try:
+        with app.app_context():
+            fn(job, **job.params)
+        job.estado = "completado"
+    except Exception as e:
+        app.logger.exception("Error en trabajo %s (%s)", job.id, job.kind)
+        job.error = str(e)
+        job.estado = "error"
+    finally:
+        job.terminado_en = time.time()
+
+def start_job(kind, fn, **params) -> Job:
+    job = Job(kind, params)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    _executor.submit(_run, job, fn, current_app._get_current_object())
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+from app.config import Config
+
+# Tablero en vivo de un evento (/en_vivo): un único listener on_snapshot por
+# evento y por proceso, compartido por todos los que miran ese evento. Cada
+# snapshot se traduce una sola vez a eventos SSE (emitida, canje, eliminada)
+# que se guardan ya serializados en un buffer circular común; cada cliente
+# sólo guarda hasta qué número leyó. Un cliente que se atrasa más que el
+# buffer recibe un resumen completo en vez de los cambios perdidos, así la
+# memoria no crece con los clientes lentos. Las lecturas a Firestore son las
+# del listener (las entradas del evento al conectarse, después una por
+# cambio), sin importar cuántos miren. En modo ASGI (app/asgi.py) los
+# clientes esperan en el event loop (stream_async) y no ocupan un hilo.
+
+class EventFeed:
+    RETRY_SECONDS = 30
+
+    def __init__(self, db, evento):
+        self.db = db
+        self.evento = evento
+        # Identifica la vida de este feed en los ids SSE: un Last-Event-ID de
+        # otro proceso o de un feed anterior recibe el resumen
+        self.epoch = uuid.uuid4().hex[:8]
+        self.cond = threading.Condition()
+        self._entradas = {}  # id -> (estado, numero, nombre, usada_en)
+        self._usadas = 0
+        self._recientes = deque(maxlen=Config.LIVE_RECENT_REDEMPTIONS)
+        self._buffer = deque(maxlen=Config.LIVE_BUFFER_EVENTS)  # (seq, bytes)
+        self._seq = 0
+        self._watch = None
+        self._synced = False
+        self._last_start = 0.0
+        self._idle_timer = None
+        self._esperas = set()  # (loop, asyncio.Event) de los clientes async
+        self.clientes = 0
+        self.stats_counters = {"snapshots": 0, "publicados": 0, "resumenes": 0, "reconexiones": 0}
+
+    # --- listener ---
+
+    def start(self):
+        with self.cond:
+            if self._watch is not None and getattr(self._watch, "is_active", True):
+                return
+            if self._last_start and time.time() - self._last_start < self.RETRY_SECONDS:
+                return
+            if self._watch is not None:
+                self.stats_counters["reconexiones"] += 1
+            self._last_start = time.time()
+            self._synced = False
+            query = self.db.collection("entradas").where("evento", "==", self.evento)
+            self._watch = query.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        with self.cond:
+            if self._watch is not None:
+                self._watch.unsubscribe()
+            self._watch = None
+            self._synced = False
+            self._entradas = {}
+            self._usadas = 0
+            self._recientes.clear()
+            self._notify()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self.cond:
+            self.stats_counters["snapshots"] += 1
+            if not self._synced:
+                # Primer snapshot (o reset del stream): estado completo
+                self._entradas = {doc.id: _fila(doc.to_dict() or {}) for doc in docs}
+                usadas = sorted(((f[3] or "", doc_id) for doc_id, f in self._entradas.items() if f[0] == "usado"))
+                self._usadas = len(usadas)
+                self._recientes.clear()
+                self._recientes.extend(_publica(doc_id, self._entradas[doc_id]) for _, doc_id in usadas)
+                self._synced = True
+                self._publish_resumen()
+                return
+            cambios = []
+            for change in changes:
+                doc = change.document
+                anterior = self._entradas.get(doc.id)
+                if anterior is not None and anterior[0] == "usado":
+                    self._usadas -= 1
+                if change.type.name == "REMOVED":
+                    if self._entradas.pop(doc.id, None) is not None:
+                        cambios.append(("eliminada", doc.id, anterior))
+                    continue
+                fila = self._entradas[doc.id] = _fila(doc.to_dict() or {})
+                if fila[0] == "usado":
+                    self._usadas += 1
+                if anterior is None:
+                    cambios.append(("emitida", doc.id, fila))
+                if fila[0] == "usado" and (anterior is None or anterior[0] != "usado"):
+                    self._recientes.append(_publica(doc.id, fila))
+                    cambios.append(("canje", doc.id, fila))
+                elif anterior is not None and fila[0] != anterior[0]:
+                    cambios.append(("estado", doc.id, fila))
+            if len(cambios) > self._buffer.maxlen // 2:
+                # Importación o renumeración masiva: un resumen en vez de
+                # llenar el buffer con un evento por entrada
+                self._publish_resumen()
+            elif cambios:
+                totales = self._totales()
+                for tipo, doc_id, fila in cambios:
+                    self._publish(tipo, {"entrada": _publica(doc_id, fila), "totales": totales})
+
+    def _totales(self):
+        total = len(self._entradas)
+        return {"total": total, "usado": self._usadas, "valido": total - self._usadas}
+
+    def _resumen(self):
+        return {"evento": self.evento, "totales": self._totales(),
+                "recientes": list(reversed(self._recientes))}
+
+    def _publish_resumen(self):
+        self.stats_counters["resumenes"] += 1
+        self._publish("resumen", self._resumen())
+
+    def _publish(self, tipo, data):
+        # Con self.cond tomado: se serializa una vez para todos los clientes
+        self._seq += 1
+        self._buffer.append((self._seq, _sse(tipo, data, f"{self.epoch}-{self._seq}")))
+        self.stats_counters["publicados"] += 1
+        self._notify()
+
+    def _notify(self):
+        # Con self.cond tomado: despierta a los hilos y a los clientes async
+        self.cond.notify_all()
+        for loop, evento in self._esperas:
+            try:
+                loop.call_soon_threadsafe(evento.set)
+            except RuntimeError:
+                pass  # loop ya cerrado
+
+    # --- clientes ---
+
+    def subscribe(self):
+        with self.cond:
+            self.clientes += 1
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+        self.start()
+
+    def unsubscribe(self):
+        with self.cond:
+            self.clientes -= 1
+            if self.clientes > 0:
+                return
+            # Sin clientes se corta el listener después de un rato, así una
+            # reconexión (o el corte periódico del stream) no vuelve a leer
+            # todas las entradas del evento
+            self._idle_timer = threading.Timer(Config.LIVE_IDLE_SECONDS, self._stop_if_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _stop_if_idle(self):
+        with self.cond:
+            if self.clientes > 0:
+                return
+            self._idle_timer = None
+        self.stop()
+
+    def _cursor(self, last_event_id):
+        # Número desde el que sigue un cliente que reconecta con Last-Event-ID,
+        # o None si tiene que empezar por el resumen
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq or (self._buffer and self._buffer[0][0] > seq + 1):
+            return None
+        return seq
+
+    def _listo(self, cursor):
+        return self._synced and (cursor is None or self._seq > cursor)
+
+    def _siguientes(self, cursor):
+        # Con self.cond tomado y _listo: (payloads, nuevo cursor)
+        if cursor is None or (self._buffer and self._buffer[0][0] > cursor + 1):
+            # Recién conectado o atrasado más que el buffer
+            self.stats_counters["resumenes"] += 1
+            return [_sse("resumen", self._resumen(), f"{self.epoch}-{self._seq}")], self._seq
+        return [payload for seq, payload in self._buffer if seq > cursor], self._seq
+
+    def stream(self, last_event_id=None):
+        # Generador de bytes SSE para un cliente. Termina a los
+        # LIVE_STREAM_MAX_SECONDS; el navegador reconecta solo (retry) y
+        # continúa desde su Last-Event-ID.
+        heartbeat = Config.LIVE_HEARTBEAT_SECONDS
+        fin = time.monotonic() + Config.LIVE_STREAM_MAX_SECONDS
+        self.subscribe()
+        try:
+            yield f"retry: {int(Config.LIVE_RETRY_MS)}\n\n".encode()
+            with self.cond:
+                cursor = self._cursor(last_event_id)
+            while time.monotonic() < fin:
+                with self.cond:
+                    if self.cond.wait_for(lambda: self._listo(cursor), timeout=heartbeat):
+                        pendientes, cursor = self._siguientes(cursor)
+                    else:
+                        pendientes = None
+                if pendientes is None:
+                    # Mantiene viva la conexión a través de proxies y permite
+                    # notar que el listener se cayó
+                    yield b": ping\n\n"
+                    self.start()
+                else:
+                    yield b"".join(pendientes)
+        finally:
+            self.unsubscribe()
+
+    async def stream_async(self, last_event_id=None):
+        # Como stream, pero espera en el event loop: el listener avisa con
+        # call_soon_threadsafe y el cliente no ocupa un hilo mientras tanto
+        heartbeat = Config.LIVE_HEARTBEAT_SECONDS
+        fin = time.monotonic() + Config.LIVE_STREAM_MAX_SECONDS
+        espera = (asyncio.get_running_loop(), asyncio.Event())
+        self.subscribe()
+        with self.cond:
+            self._esperas.add(espera)
+        try:
+            yield f"retry: {int(Config.LIVE_RETRY_MS)}\n\n".encode()
+            with self.cond:
+                cursor = self._cursor(last_event_id)
+            while time.monotonic() < fin:
+                with self.cond:
+                    espera[1].clear()
+                    listo = self._listo(cursor)
+                if not listo:
+                    try:
+                        await asyncio.wait_for(espera[1].wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                with self.cond:
+                    pendientes, cursor = self._siguientes(cursor) if self._listo(cursor) else (None, cursor)
+                if pendientes is None:
+                    yield b": ping\n\n"
+                    self.start()
+                else:
+                    yield b"".join(pendientes)
+        finally:
+            with self.cond:
+                self._esperas.discard(espera)
+            self.unsubscribe()
+
+    def stats(self):
+        with self.cond:
+            return dict(self.stats_counters, evento=self.evento, clientes=self.clientes,
+                        entradas=len(self._entradas), buffer=len(self._buffer),
+                        conectado=bool(self._watch is not None and self._synced))
+
+def _fila(data):
+    return (data.get("estado"), data.get("numero"), data.get("nombre"), data.get("usada_en"))
+
+def _publica(doc_id, fila):
+    estado, numero, nombre, usada_en = fila
+    return {"id": doc_id, "estado": estado, "numero": numero, "nombre": nombre, "usada_en": usada_en}
+
+def _sse(tipo, data, event_id):
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {tipo}\ndata: {payload}\n\n".encode("utf-8")
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+_conectados = 0
+_conectados_async = 0
+
+def get_feed(evento):
+    feed = _feeds.get(evento)
+    if feed is None:
+        with _feeds_lock:
+            feed = _feeds.get(evento)
+            if feed is None:
+                from app.firebase import db
+                feed = _feeds[evento] = EventFeed(db, evento)
+    return feed
+
+def acquire_client_slot(asincronico=False):
+    # Con hilos cada cliente conectado ocupa uno mientras dure el stream: se
+    # limita para dejar hilos a los demás requests. En el event loop sólo
+    # cuesta memoria y el tope es otro.
+    global _conectados, _conectados_async
+    with _feeds_lock:
+        if asincronico:
+            if _conectados_async >= Config.LIVE_MAX_CLIENTS_ASGI:
+                return False
+            _conectados_async += 1
+            return True
+        if _conectados >= Config.LIVE_MAX_CLIENTS:
+            return False
+        _conectados += 1
+        return True
+
+def release_client_slot(asincronico=False):
+    global _conectados, _conectados_async
+    with _feeds_lock:
+        if asincronico:
+            _conectados_async -= 1
+        else:
+            _conectados -= 1
+
+def feed_stats():
+    with _feeds_lock:
+        feeds = list(_feeds.values())
+    return [f.stats() for f in feeds]
@@ -0,0 +1,353 @@
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from app.config import Config
+
+# Métricas de rendimiento en formato Prometheus (texto), sin dependencias.
+# Con METRICS_ENABLED=0 no se instala ningún hook: observe() y timed()
+# vuelven enseguida y el cliente de Firestore queda sin envolver.
+
+enabled = Config.METRICS_ENABLED
+logger = logging.getLogger("qrpass.metrics")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_LARGOS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BUCKETS_RPCS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pares = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pares + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        if not enabled:
+            return
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            # Conteo por bucket; se acumula al exportar
+            serie[0][bisect_left(self.buckets, value)] += 1
+            serie[1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            acumulado = 0
+            for limite, count in zip(self.buckets + (float("inf"),), counts):
+                acumulado += count
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (_num(limite),))} {acumulado}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {acumulado}"
+
+_registry = []
+
+HTTP = Histogram("qrpass_http_request_duration_seconds",
+                 "Duración de los requests hasta terminar de enviar la respuesta",
+                 ("endpoint", "method", "status"))
+REQUEST_RPCS = Histogram("qrpass_http_request_firestore_rpcs", "RPCs a Firestore por request",
+                         ("endpoint",), BUCKETS_RPCS)
+REQUEST_RPC_SECONDS = Histogram("qrpass_http_request_firestore_seconds",
+                                "Tiempo esperando a Firestore por request", ("endpoint",))
+FIRESTORE_RPC = Histogram("qrpass_firestore_rpc_duration_seconds",
+                          "Duración de cada RPC a Firestore (en streams, el tiempo esperando respuestas)",
+                          ("method", "resultado"))
+TICKET_RENDER = Histogram("qrpass_ticket_render_seconds",
+                          "Render de un ticket en el proceso web (los del pool se ven en render_queue)",
+                          ("formato",))
+RENDER_QUEUE = Histogram("qrpass_render_queue_seconds", "Desde que se encola un ticket hasta que está renderizado",
+                         ("resultado",))
+PDF_BUILD = Histogram("qrpass_pdf_build_seconds", "Generación completa de un PDF", ("documento",), BUCKETS_LARGOS)
+AUTH_VERIFY = Histogram("qrpass_auth_verify_seconds", "Llamadas a Firebase Auth",
+                        ("operacion", "resultado"))
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "resultado", "inicio")
+
+    def __init__(self, histogram, labels, resultado):
+        self.histogram = histogram
+        self.labels = labels
+        self.resultado = resultado
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels + (("error" if exc_type else "ok",) if self.resultado else ())
+        self.histogram.observe(time.perf_counter() - self.inicio, *labels)
+        return False
+
+def timed(histogram, *labels, resultado=False):
+    # resultado=True agrega la etiqueta "ok"/"error" según si hubo excepción
+    return _Timer(histogram, labels, resultado) if enabled else _NULL_TIMER
+
+def timed_iter(histogram, chunks, *labels):
+    # Para generadores que se envían de a partes (PDF): mide hasta el último
+    # chunk. Si la descarga se corta no se registra.
+    if not enabled:
+        return chunks
+
+    def medir():
+        inicio = time.perf_counter()
+        yield from chunks
+        histogram.observe(time.perf_counter() - inicio, *labels)
+    return medir()
+
+# --- RPCs a Firestore por request ---
+
+class _RequestStats:
+    __slots__ = ("rpcs", "rpc_seconds", "lock")
+
+    def __init__(self):
+        self.rpcs = 0
+        self.rpc_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, rpcs, seconds):
+        with self.lock:
+            self.rpcs += rpcs
+            self.rpc_seconds += seconds
+
+_current = contextvars.ContextVar("qrpass_request_stats", default=None)
+
+def propagate(fn):
+    # Los hilos de un ThreadPoolExecutor no heredan el contexto: con esto
+    # las consultas que hacen se cuentan en el request que las lanzó.
+    if not enabled:
+        return fn
+    stats = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(stats)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+# Métodos del cliente GAPIC que usa google-cloud-firestore. Los de stream
+# devuelven un iterador: se mide el tiempo bloqueado esperando cada respuesta.
+FIRESTORE_RPCS = ("batch_get_documents", "run_query", "run_aggregation_query", "commit",
+                  "begin_transaction", "rollback", "list_documents", "list_collection_ids",
+                  "partition_query", "batch_write")
+STREAMING_RPCS = {"batch_get_documents", "run_query", "run_aggregation_query"}
+
+class _TimedStream:
+    def __init__(self, method, stream, stats):
+        self._method = method
+        self._stream = iter(stream)
+        self._raw = stream
+        self._stats = stats
+        self._elapsed = 0.0
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            item = next(self._stream)
+        except StopIteration:
+            self._finish(inicio, "ok")
+            raise
+        except Exception:
+            self._finish(inicio, "error")
+            raise
+        dt = time.perf_counter() - inicio
+        self._elapsed += dt
+        if self._stats is not None:
+            self._stats.add(0, dt)
+        return item
+
+    def _finish(self, inicio, resultado):
+        dt = time.perf_counter() - inicio
+        self._elapsed += dt
+        if self._stats is not None:
+            self._stats.add(0, dt)
+        if not self._done:
+            self._done = True
+            FIRESTORE_RPC.observe(self._elapsed, self._method, resultado)
+
+    def __getattr__(self, name):
+        # cancel(), trailing_metadata(), etc. del stream gRPC
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+    def __del__(self):
+        # Stream abandonado antes del final (p. ej. una consulta con limit 1)
+        if not self._done:
+            self._done = True
+            FIRESTORE_RPC.observe(self._elapsed, self._method, "ok")
+
+def _wrap_rpc(method, original):
+    def call(*args, **kwargs):
+        stats = _current.get()
+        if method in STREAMING_RPCS:
+            if stats is not None:
+                stats.add(1, 0.0)
+            return _TimedStream(method, original(*args, **kwargs), stats)
+        inicio = time.perf_counter()
+        resultado = "error"
+        try:
+            response = original(*args, **kwargs)
+            resultado = "ok"
+            return response
+        finally:
+            dt = time.perf_counter() - inicio
+            FIRESTORE_RPC.observe(dt, method, resultado)
+            if stats is not None:
+                stats.add(1, dt)
+    call._qrpass_metrics = True
+    return call
+
+def instrument_firestore(db):
+    # Envuelve los métodos del cliente GAPIC del `db` (todas las consultas,
+    # lecturas y escrituras pasan por ahí). No toca el listener de on_snapshot.
+    try:
+        api = db._firestore_api
+    except Exception as e:
+        logger.warning("No se pudo instrumentar Firestore: %s", e)
+        return False
+    for method in FIRESTORE_RPCS:
+        original = getattr(api, method, None)
+        if original is None or getattr(original, "_qrpass_metrics", False):
+            continue
+        setattr(api, method, _wrap_rpc(method, original))
+    return True
+
+# --- Flask ---
+
+def _stats_gauges():
+    # Contadores que ya llevan los caches y colas, expuestos tal cual
+    from app.utils.decorators import session_cache_stats
+    from app.utils.ticket_cache import get_ticket_cache
+    from app.utils.render_queue import get_render_queue
+    from app.utils.firestore_cache import mirror_stats
+    from app.utils.ticket_numbers import get_allocator
+    from app.utils.export_cache import get_export_cache
+    from app.utils.live_feed import feed_stats
+    from app.utils.search_index import index_stats
+    from app.utils.page_cache import get_page_cache
+
+    fuentes = [("session_cache", {}, session_cache_stats()),
+               ("ticket_cache", {}, get_ticket_cache().stats()),
+               ("render_queue", {}, get_render_queue().stats()),
+               ("ticket_numbers", {}, dict(get_allocator().stats)),
+               ("export_cache", {}, dict(get_export_cache().stats)),
+               ("page_cache", {}, get_page_cache().stats())]
+    for stats in mirror_stats():
+        fuentes.append(("mirror", {"coleccion": stats.get("coleccion")}, stats))
+    for stats in index_stats():
+        fuentes.append(("search_index", {"coleccion": stats.get("coleccion")}, stats))
+    for stats in feed_stats():
+        fuentes.append(("live_feed", {"evento": stats.get("evento")}, stats))
+    for prefijo, labels, stats in fuentes:
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"qrpass_{prefijo}_{key}"
+            yield f"# TYPE {name} untyped"
+            yield f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}"
+
+def render_metrics():
+    lines = []
+    for histogram in _registry:
+        lines.extend(histogram.collect())
+    lines.extend(_stats_gauges())
+    return "\n".join(lines) + "\n"
+
+def init_metrics(app):
+    if not enabled:
+        return
+    from flask import request, g, Response, jsonify
+    from app.firebase import when_ready
+    from app.utils.decorators import verify_session_cookie
+
+    # El cliente de Firestore se crea en el primer uso; se instrumenta ahí
+    when_ready(instrument_firestore)
+    slow_ms = Config.SLOW_REQUEST_MS
+
+    @app.before_request
+    def _metrics_start():
+        # En modo ASGI cuenta desde que llegó el request: las vistas async
+        # esperan a Firestore antes de entrar a Flask (ver app/asgi.py)
+        inicio = request.environ.get("app.inicio") or time.perf_counter()
+        g._metrics = (inicio, _current.set(_RequestStats()))
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    # En teardown y no en after_request: con stream_with_context se ejecuta
+    # al terminar de enviar el cuerpo.
+    @app.teardown_request
+    def _metrics_end(exc):
+        inicio, token = g.pop("_metrics", (None, None))
+        if inicio is None:
+            return
+        duracion = time.perf_counter() - inicio
+        stats = _current.get()
+        _current.reset(token)
+        endpoint = request.endpoint or "sin_ruta"
+        status = g.pop("_metrics_status", 500 if exc else 200)
+        HTTP.observe(duracion, endpoint, request.method, str(status))
+        REQUEST_RPCS.observe(stats.rpcs, endpoint)
+        REQUEST_RPC_SECONDS.observe(stats.rpc_seconds, endpoint)
+        if slow_ms and duracion * 1000 >= slow_ms:
+            logger.warning("Request lenta: %s %s (%s) %d en %.0f ms, %d RPC a Firestore (%.0f ms)",
+                           request.method, request.path, endpoint, status, duracion * 1000,
+                           stats.rpcs, stats.rpc_seconds * 1000)
+
+    # Con METRICS_TOKEN el scraper se autentica con "Authorization: Bearer";
+    # sin token, sólo con sesión iniciada.
+    def metrics_view():
+        if Config.METRICS_TOKEN:
+            auth = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(auth.encode("utf-8"), f"Bearer {Config.METRICS_TOKEN}".encode("utf-8")):
+                return jsonify(error="No autorizado"), 401
+        elif not verify_session_cookie(request):
+            return jsonify(error="No autenticado"), 401
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
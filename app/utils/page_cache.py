@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, session, make_response, Response
+from werkzeug.http import is_resource_modified
+
+from app.config import Config
+
+# Cache HTTP de las páginas que leen mucho (/lista, /eventos, el PDF). El ETag
+# es un hash del endpoint, los parámetros, el usuario y la versión de los
+# datos que muestra la página (ver versions.page_versions, que sale del
+# espejo de las versiones sin leer documentos). Si el navegador ya tiene esa
+# versión se responde 304; si otro request ya la renderizó se sirve el HTML
+# guardado. En ninguno de los dos casos se lee Firestore.
+
+class PageCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # etag -> (body, mimetype)
+        self._bytes = 0
+        self._vistas = OrderedDict()  # huella -> primera vez que se vio
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "no_modificadas": 0, "evictions": 0}
+
+    def get(self, etag):
+        with self._lock:
+            item = self._items.get(etag)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(etag)
+            self._stats["hits"] += 1
+            return item
+
+    def put(self, etag, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previo = self._items.pop(etag, None)
+            if previo is not None:
+                self._bytes -= len(previo[0])
+            self._items[etag] = (body, mimetype)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (viejo, _) = self._items.popitem(last=False)
+                self._bytes -= len(viejo)
+                self._stats["evictions"] += 1
+
+    def last_modified(self, huella):
+        # Last-Modified: cuándo vio este proceso esa versión por primera vez
+        with self._lock:
+            visto = self._vistas.get(huella)
+            if visto is None:
+                visto = self._vistas[huella] = datetime.now(timezone.utc).replace(microsecond=0)
+                while len(self._vistas) > 4096:
+                    self._vistas.popitem(last=False)
+            return visto
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats["no_modificadas"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._items), bytes=self._bytes)
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache():
+    global _page_cache
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                _page_cache = PageCache(Config.PAGE_CACHE_MAX_BYTES)
+    return _page_cache
+
+def _conditional_headers(resp, etag, last_modified):
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    # El navegador guarda la página pero revalida cada vez; es por usuario
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.vary.add("Cookie")
+    return resp
+
+def cached_page(versiones):
+    # versiones(): huella de los datos que muestra la vista. Se lee antes de
+    # renderizar: una escritura a mitad del render deja la página guardada
+    # con la huella vieja, nunca datos viejos con la huella nueva.
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Con mensajes flash pendientes (el redirect después de un POST) se
+            # renderiza: si no, el mensaje aparecería en otra página
+            if not Config.PAGE_CACHE_ENABLED or session.get("_flashes"):
+                return fn(*args, **kwargs)
+            from app.utils.decorators import verify_session_cookie
+            user = verify_session_cookie(request) or {}
+            huella = versiones()
+            raw = json.dumps([request.endpoint, sorted(request.args.items(multi=True)), user.get("uid"), huella],
+                             ensure_ascii=False, separators=(",", ":"))
+            etag = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+            cache = get_page_cache()
+            last_modified = cache.last_modified(huella)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                cache.count_not_modified()
+                return _conditional_headers(Response(status=304), etag, last_modified)
+            item = cache.get(etag)
+            if item is not None:
+                body, mimetype = item
+                return _conditional_headers(Response(body, mimetype=mimetype), etag, last_modified)
+
+            resp = make_response(fn(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+            # Archivos y streams (el PDF) sólo llevan el ETag: el contenido ya
+            # lo guarda el cache de exports
+            if not resp.direct_passthrough and not resp.is_streamed and "Set-Cookie" not in resp.headers:
+                cache.put(etag, resp.get_data(), resp.mimetype)
+            return _conditional_headers(resp, etag, last_modified)
+        return wrapper
+    return decorator
@@ -1,51 +1,143 @@
-import os
-from fpdf import FPDF
-from flask import make_response, current_app
+import hashlib
+from flask import Response, send_file, stream_with_context
 from datetime import datetime
 from app.firebase import db
+from app.utils.entradas import iter_entradas
+from app.utils.export_cache import get_export_cache
+from app.utils import metrics
+from app.utils.pdf_stream import PdfStream, A4, standard_fonts, pdf_string, text_width, num
+from app.utils.versions import versions_key
 
-def descargar_lista_pdf_logic():
-    docs = db.collection("entradas").stream()
-    entradas = [doc.to_dict() for doc in docs]
-    entradas.sort(key=lambda e: (e.get("evento", "").lower(), e.get("numero", 0)))
-
-    pdf = FPDF()
-    pdf.add_page()
-    
-    font_path = os.path.join(current_app.static_folder, 'arial.ttf')
-    if os.path.exists(font_path):
-        pass
-    
-    pdf.set_font("Arial", size=12)
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Lista de Entradas Generadas", ln=True, align="C")
-    pdf.ln(10)
-    
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(20, 10, "N°", 1, align="C")
-    pdf.cell(50, 10, "Evento", 1)
-    pdf.cell(65, 10, "Nombre", 1)
-    pdf.cell(55, 10, "Teléfono".encode('latin-1').decode('latin-1'), 1)
-    pdf.ln()
-    
-    pdf.set_font("Arial", size=12)
+# Lista de entradas en PDF. Se lee de a una página de Firestore en orden
+# (evento, numero) y cada hoja se envía apenas está completa, así la memoria
+# no depende de la cantidad de entradas. Cada evento empieza en una hoja
+# nueva y el encabezado de la tabla se repite en todas. Las entradas sin
+# número van juntas en una última sección.
+
+MM = 72 / 25.4
+MARGEN = 10 * MM
+FILA = 10 * MM
+COLUMNAS = (("N°", 20 * MM, "C", 20), ("Evento", 50 * MM, "L", 20),
+            ("Nombre", 65 * MM, "L", 25), ("Teléfono", 55 * MM, "L", 30))
+
+# Sube cuando cambia el contenido de la lista: los PDF guardados con la
+# versión anterior dejan de servirse
+FORMATO_LISTA = 2
+
+# Sección de las entradas sin número (no es un nombre de evento posible)
+SIN_NUMERO = object()
+
+class _Hoja:
+    def __init__(self):
+        self.ops = ["0 G 0.57 w 0 g"]
+        self.y = A4[1] - MARGEN
+
+    def texto(self, text, x, y, size, bold=False):
+        self.ops.append(f"BT /{'F2' if bold else 'F1'} {size} Tf {num(float(x))} {num(float(y))} Td "
+                        + pdf_string(text).decode("latin-1") + " Tj ET")
+
+    def centrado(self, text, size, bold, alto):
+        self.texto(text, (A4[0] - text_width(text, size, bold)) / 2, self.y - alto / 2 - size * 0.3, size, bold)
+        self.y -= alto
+
+    def fila(self, valores, bold=False, size=12):
+        x = MARGEN
+        for (_, ancho, align, _), valor in zip(COLUMNAS, valores):
+            self.ops.append(f"{num(x)} {num(self.y - FILA)} {num(ancho)} {num(FILA)} re S")
+            if align == "C":
+                tx = x + (ancho - text_width(valor, size, bold)) / 2
+            else:
+                tx = x + MM
+            self.texto(valor, tx, self.y - FILA / 2 - size * 0.3, size, bold)
+            x += ancho
+        self.y -= FILA
+
+    def cabe(self, alto):
+        return self.y - alto >= MARGEN + 6 * MM
+
+def _celdas(ent):
+    return (str(ent.get("numero") or ""),
+            *[(ent.get(campo, "") or "")[:limite] for campo, (_, _, _, limite)
+              in zip(("evento", "nombre", "telefono"), COLUMNAS[1:])])
+
+def _sin_numero_al_final(entradas):
+    # Con numero nulo Firestore las ordena primero en su evento: se guardan
+    # (son pocas, anteriores a la numeración) y salen al final
+    sin_numero = []
     for ent in entradas:
-        numero = str(ent.get("numero") or "")
+        if ent.get("numero") is None:
+            sin_numero.append(ent)
+        else:
+            yield ent
+    yield from sin_numero
+
+def lista_pdf(entradas, titulo="Lista de Entradas Generadas", subtitulo=""):
+    # Generador de bytes del PDF a partir de un iterable ordenado de entradas
+    pdf = PdfStream()
+    yield pdf.header()
+    pages_id, catalog_id = pdf.reserve(), pdf.reserve()
+    fonts, font_res = standard_fonts(pdf)
+    yield fonts
+    resources = f"<<{font_res}>>"
+    generado = datetime.now().strftime("%d/%m/%Y %H:%M")
+
+    def cerrar(hoja, evento):
+        if evento is SIN_NUMERO:
+            evento = "sin número"
+        pie = f"Generado {generado}" + (f" - {evento}" if evento else "")
+        hoja.texto(pie, MARGEN, MARGEN, 8)
+        pagina = f"Página {len(pdf.page_ids) + 1}"
+        hoja.texto(pagina, A4[0] - MARGEN - text_width(pagina, 8), MARGEN, 8)
+        return pdf.page(pages_id, "\n".join(hoja.ops).encode("latin-1"), resources)
+
+    def encabezado(hoja):
+        hoja.fila([c[0] for c in COLUMNAS], bold=True)
+
+    hoja = _Hoja()
+    hoja.centrado(titulo, 16, True, 10 * MM)
+    if subtitulo:
+        hoja.centrado(subtitulo, 10, False, 6 * MM)
+    hoja.y -= 4 * MM
+    evento_actual = None
+    filas_en_hoja = 0
+    for ent in _sin_numero_al_final(entradas):
         evento = ent.get("evento", "") or ""
-        nombre = ent.get("nombre", "") or ""
-        telefono = ent.get("telefono", "") or ""
-        
-        def clean(txt):
-            return txt.encode('latin-1', 'replace').decode('latin-1')
-
-        pdf.cell(20, 10, clean(numero), 1, align="C")
-        pdf.cell(50, 10, clean(evento)[:20], 1)
-        pdf.cell(65, 10, clean(nombre)[:25], 1)
-        pdf.cell(55, 10, clean(telefono), 1)
-        pdf.ln()
-
-    response = make_response(pdf.output(dest='S').encode('latin-1'))
-    response.headers['Content-Type'] = 'application/pdf'
+        if ent.get("numero") is None:
+            evento = SIN_NUMERO
+        if evento != evento_actual:
+            if filas_en_hoja:
+                yield cerrar(hoja, evento_actual)
+                hoja, filas_en_hoja = _Hoja(), 0
+            evento_actual = evento
+            titulo_seccion = "Sin número asignado" if evento is SIN_NUMERO else f"Evento: {evento or '(sin evento)'}"
+            hoja.texto(titulo_seccion, MARGEN, hoja.y - 14, 14, True)
+            hoja.y -= 10 * MM
+            encabezado(hoja)
+        elif not hoja.cabe(FILA):
+            yield cerrar(hoja, evento_actual)
+            hoja, filas_en_hoja = _Hoja(), 0
+            encabezado(hoja)
+        hoja.fila(_celdas(ent))
+        filas_en_hoja += 1
+    if evento_actual is None:
+        hoja.texto("No hay entradas.", MARGEN, hoja.y - 12, 12)
+    yield cerrar(hoja, evento_actual)
+    yield pdf.finish(pages_id, catalog_id, {"Title": titulo, "Producer": "QR Pass"})
+
+def descargar_lista_pdf_logic(evento=None, estado=None):
+    # La clave incluye la versión de las entradas: si nada cambió desde la
+    # última descarga con los mismos filtros, se sirve el archivo guardado.
+    filtros = hashlib.sha1(repr((FORMATO_LISTA, evento, estado)).encode("utf-8")).hexdigest()[:12]
+    key = f"lista_{filtros}_{versions_key(db, evento)}"
     filename = f"lista_entradas_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    cache = get_export_cache()
+    path = cache.get(key, "pdf")
+    if path:
+        return send_file(path, mimetype="application/pdf", as_attachment=True, download_name=filename)
+
+    subtitulo = " - ".join(filter(None, [evento, {"valido": "Válidas", "usado": "Usadas"}.get(estado)]))
+    chunks = metrics.timed_iter(metrics.PDF_BUILD, lista_pdf(iter_entradas(db, evento, estado), subtitulo=subtitulo),
+                                "lista")
+    response = Response(stream_with_context(cache.tee(key, "pdf", chunks)), mimetype="application/pdf")
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
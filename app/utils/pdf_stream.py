@@ -0,0 +1,100 @@
+import zlib
+
+# Escritor de PDF incremental: cada objeto se devuelve como bytes apenas se
+# arma, así el documento se puede mandar al cliente página por página sin
+# tenerlo entero en memoria. Sólo se guardan los offsets para la tabla xref.
+# Los números de objeto se reservan antes (p. ej. el árbol de páginas, que
+# se escribe al final pero al que cada página apunta como /Parent).
+
+A4 = (595.28, 841.89)
+
+def pdf_string(text: str) -> bytes:
+    # Literal de texto en WinAnsi (latin-1 para los caracteres de acá)
+    raw = text.encode("latin-1", "replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+def num(value) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".") if isinstance(value, float) else str(value)
+
+def text_width(text: str, size: float, bold: bool = False) -> float:
+    # Ancho en puntos con las métricas de Helvetica que trae fpdf
+    from fpdf.fonts import fpdf_charwidths
+    widths = fpdf_charwidths["helveticaB" if bold else "helvetica"]
+    return sum(widths.get(ch, 556) for ch in text.encode("latin-1", "replace").decode("latin-1")) * size / 1000
+
+class PdfStream:
+    def __init__(self):
+        self._offset = 0
+        self._offsets = {}
+        self._next_id = 1
+        self.page_ids = []
+
+    def reserve(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def obj(self, obj_id: int, body, stream: bytes = None, compress: bool = True) -> bytes:
+        # body: diccionario PDF ya armado (str); con `stream` se agrega /Length
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        self._offsets[obj_id] = self._offset
+        if stream is None:
+            return self._emit(b"%d 0 obj\n%s\nendobj\n" % (obj_id, body))
+        if compress:
+            stream = zlib.compress(stream, 6)
+            body = body[:-2] + b"/Filter/FlateDecode>>"
+        body = body[:-2] + b"/Length %d>>" % len(stream)
+        return self._emit(b"%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n" % (obj_id, body, stream))
+
+    def page(self, pages_id, content: bytes, resources: str, size=A4) -> bytes:
+        # Objeto de contenido más objeto página; el id queda para /Kids
+        content_id, page_id = self.reserve(), self.reserve()
+        self.page_ids.append(page_id)
+        return (self.obj(content_id, "<<>>", content)
+                + self.obj(page_id, f"<</Type/Page/Parent {pages_id} 0 R/MediaBox[0 0 {num(size[0])} {num(size[1])}]"
+                                    f"/Resources {resources}/Contents {content_id} 0 R>>"))
+
+    def finish(self, pages_id, catalog_id, info: dict = None) -> bytes:
+        kids = " ".join(f"{p} 0 R" for p in self.page_ids)
+        out = self.obj(pages_id, f"<</Type/Pages/Kids[{kids}]/Count {len(self.page_ids)}>>")
+        out += self.obj(catalog_id, f"<</Type/Catalog/Pages {pages_id} 0 R>>")
+        info_ref = ""
+        if info:
+            info_id = self.reserve()
+            entries = b"".join(b"/" + k.encode("ascii") + pdf_string(v) for k, v in info.items())
+            out += self.obj(info_id, b"<<" + entries + b">>")
+            info_ref = f"/Info {info_id} 0 R"
+        xref_at = self._offset
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            offset = self._offsets.get(obj_id)
+            lines.append(f"{offset:010d} 00000 n \n" if offset is not None else "0000000000 65535 f \n")
+        lines.append(f"trailer\n<</Size {size}/Root {catalog_id} 0 R{info_ref}>>\nstartxref\n{xref_at}\n%%EOF\n")
+        return out + self._emit("".join(lines).encode("ascii"))
+
+def standard_fonts(pdf: PdfStream) -> tuple:
+    # Helvetica y Helvetica-Bold (métricas iguales a Arial), sin embeber.
+    # Devuelve (bytes de los objetos, diccionario /Font para /Resources).
+    regular, bold = pdf.reserve(), pdf.reserve()
+    data = b""
+    for obj_id, name in ((regular, "Helvetica"), (bold, "Helvetica-Bold")):
+        data += pdf.obj(obj_id, f"<</Type/Font/Subtype/Type1/BaseFont/{name}/Encoding/WinAnsiEncoding>>")
+    return data, f"/Font<</F1 {regular} 0 R/F2 {bold} 0 R>>"
+
+def jpeg_xobject(pdf: PdfStream, jpeg: bytes, width: int, height: int, mode: str = "RGB") -> tuple:
+    # El JPEG se embebe tal cual (DCTDecode): no se recodifica
+    obj_id = pdf.reserve()
+    colorspace = {"L": "DeviceGray", "CMYK": "DeviceCMYK"}.get(mode, "DeviceRGB")
+    extra = "/Decode[1 0 1 0 1 0 1 0]" if mode == "CMYK" else ""
+    data = pdf.obj(obj_id, f"<</Type/XObject/Subtype/Image/Width {width}/Height {height}/ColorSpace/{colorspace}"
+                           f"/BitsPerComponent 8/Filter/DCTDecode{extra}>>", jpeg, compress=False)
+    return data, obj_id
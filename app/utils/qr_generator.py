@@ -1,136 +1,383 @@
 import os
 import io
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
+import hashlib
+import threading
 import textwrap
-from flask import current_app
+from xml.sax.saxutils import escape
+from flask import current_app, has_app_context
 
-def build_qr_image_with_text(qr_url: str, nombre: str, evento: str, telefono: str, numero: int = None) -> bytes:
-    qr_img = qrcode.make(qr_url).convert("RGB")
-    template_path = os.path.join(current_app.static_folder, 'ticketDDA.jpg')
-    
-    if os.path.exists(template_path):
-        try:
-            bg = Image.open(template_path).convert("RGB")
-            W, H = bg.size
-            qr_size = 650
-            qr_img = qr_img.resize((qr_size, qr_size), Image.NEAREST)
-            qr_x = (W - qr_size) // 2
-            qr_y = (H - qr_size) // 2 - 40
-            bg.paste(qr_img, (qr_x, qr_y))
-            
-            draw = ImageDraw.Draw(bg)
+from app.utils import metrics
+
+TEMPLATE_FILE = 'ticketDDA.jpg'
+FONT_BOLD_FILE = 'arialbd.ttf'
+FONT_REGULAR_FILE = 'arial.ttf'
+
+# formato -> (mimetype, extensión)
+FORMATOS = {
+    "png": ("image/png", "png"),
+    "png8": ("image/png", "png"),
+    "webp": ("image/webp", "webp"),
+    "jpeg": ("image/jpeg", "jpg"),
+    "svg": ("image/svg+xml", "svg"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+# WebP sin pérdida: esfuerzo de compresión 0-100 y method 0-6. method=0 es
+# ~8x más rápido que 4 y pesa ~15% más.
+WEBP_EFFORT = 20
+WEBP_METHOD = 0
+
+# qrcode y PIL se importan en las funciones que los usan: importar el módulo
+# (lo hacen las rutas al arrancar) no carga el stack de imágenes.
+
+def qr_matrix(data: str):
+    # Misma configuración que qrcode.make (corrección M, borde de 4 módulos)
+    import qrcode
+    qr = qrcode.QRCode(border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+def qr_image(data: str, size: int) -> "Image.Image":
+    # Un pixel por módulo y un único escalado NEAREST al tamaño final,
+    # en vez de rasterizar a box_size=10 y volver a redimensionar.
+    from PIL import Image
+    matrix = qr_matrix(data)
+    n = len(matrix)
+    raw = bytes(0 if dark else 255 for row in matrix for dark in row)
+    img = Image.frombytes("L", (n, n), raw)
+    return img.resize((size, size), Image.NEAREST)
+
+class TicketRenderer:
+    QR_SIZE = 650
+    PLAIN_QR_SIZE = 480
+
+    def __init__(self, static_folder: str, png_compress_level: int = 6):
+        self.static_folder = static_folder
+        self.png_compress_level = png_compress_level
+        self._lock = threading.Lock()
+        self._fonts = {}
+        self._base = None
+        self._mtimes = {}
+        self.fingerprint = None
+        self.reload()
+
+    def _path(self, filename):
+        return os.path.join(self.static_folder, filename)
+
+    def _asset_mtimes(self):
+        mtimes = {}
+        for filename in (TEMPLATE_FILE, FONT_BOLD_FILE, FONT_REGULAR_FILE):
+            try:
+                mtimes[filename] = os.stat(self._path(filename)).st_mtime_ns
+            except OSError:
+                mtimes[filename] = None
+        return mtimes
+
+    def _assets_fingerprint(self):
+        # Cambia si cambia el template, alguna fuente o la configuración de
+        # salida: es parte de la clave del cache de imágenes.
+        h = hashlib.sha256(f"{self.QR_SIZE}:{self.PLAIN_QR_SIZE}:{self.png_compress_level}".encode())
+        for filename in (TEMPLATE_FILE, FONT_BOLD_FILE, FONT_REGULAR_FILE):
+            h.update(filename.encode())
+            try:
+                with open(self._path(filename), "rb") as fh:
+                    h.update(hashlib.sha256(fh.read()).digest())
+            except OSError:
+                h.update(b"-")
+        return h.hexdigest()[:16]
+
+    def _font(self, filename, size):
+        key = (filename, size)
+        font = self._fonts.get(key)
+        if font is None:
+            from PIL import ImageFont
             try:
-                font_phone_path = os.path.join(current_app.static_folder, 'arialbd.ttf')
-                font_name_path = os.path.join(current_app.static_folder, 'arial.ttf')
-                font_phone = ImageFont.truetype(font_phone_path, 65) 
-                font_name = ImageFont.truetype(font_name_path, 55)    
+                font = ImageFont.truetype(self._path(filename), size)
             except Exception as e:
                 print(f"Error loading fonts: {e}")
-                font_phone = ImageFont.load_default()
-                font_name = ImageFont.load_default()
-            
-            def draw_centered(text, y, font, color=(0,0,0)):
+                font = ImageFont.load_default()
+            self._fonts[key] = font
+        return font
+
+    def reload(self):
+        from PIL import Image
+        with self._lock:
+            base = None
+            template_path = self._path(TEMPLATE_FILE)
+            if os.path.exists(template_path):
+                try:
+                    # Imagen base decodificada una sola vez; nunca se modifica,
+                    # cada render trabaja sobre una copia.
+                    with Image.open(template_path) as im:
+                        base = im.convert("RGB")
+                except Exception as e:
+                    print(f"Error usando template: {e}")
+            self._fonts = {}
+            self._base = base
+            self._mtimes = self._asset_mtimes()
+            self.fingerprint = self._assets_fingerprint()
+            for filename, size in ((FONT_BOLD_FILE, 65), (FONT_REGULAR_FILE, 55), (FONT_REGULAR_FILE, 65)):
+                self._font(filename, size)
+
+    def reload_if_changed(self):
+        if self._asset_mtimes() != self._mtimes:
+            self.reload()
+            return True
+        return False
+
+    def layout(self, nombre: str, evento: str, telefono: str, numero: int = None):
+        # Posiciones de todo lo que va en el ticket, compartidas por el
+        # render raster y los formatos vectoriales (SVG/PDF). Los textos son
+        # (texto, x o None para centrar, y superior, fuente, tamaño).
+        base = self._base
+        if base is None:
+            return self._layout_plain(nombre, evento, telefono, numero)
+        W, H = base.size
+        qr_size = self.QR_SIZE
+        qr_x = (W - qr_size) // 2
+        qr_y = (H - qr_size) // 2 - 40
+        texts = []
+        if numero is not None:
+            texts.append((str(numero), None, qr_y - 60, FONT_BOLD_FILE, 65))
+        text_y = qr_y + qr_size + 40
+        texts.append((telefono or "", None, text_y, FONT_BOLD_FILE, 65))
+        texts.append((nombre or "", None, text_y + 80, FONT_REGULAR_FILE, 55))
+        return {"size": (W, H), "background": base, "qr": (qr_x, qr_y, qr_size), "texts": texts}
+
+    def _layout_plain(self, nombre, evento, telefono, numero):
+        from PIL import Image, ImageDraw
+        qr_size = self.PLAIN_QR_SIZE
+        margin = 24
+        line_spacing = 10
+        font_title = self._font(FONT_REGULAR_FILE, 65)
+        font_text = self._font(FONT_REGULAR_FILE, 55)
+
+        title = "QR Pass"
+        lines = [f"Nombre: {nombre}", f"Evento: {evento}", f"Teléfono: {telefono}"]
+        if numero is not None:
+            lines.append(f"Número: {numero}")
+
+        canvas_width = qr_size + margin * 2
+        max_chars = max(1, (canvas_width - margin * 2) // 12)
+
+        dummy = Image.new("RGB", (10, 10))
+        ddraw = ImageDraw.Draw(dummy)
+        title_h = ddraw.textbbox((0, 0), title, font=font_title)[3]
+
+        texts = [(title, None, margin, FONT_REGULAR_FILE, 65)]
+        y = margin + title_h + margin
+        qr = ((canvas_width - qr_size) // 2, y, qr_size)
+        y += qr_size + margin
+        for ln in lines:
+            for paragraph in ln.split("\n"):
+                for wln in textwrap.wrap(paragraph, width=max_chars):
+                    texts.append((wln, margin, y, FONT_REGULAR_FILE, 55))
+                    y += ddraw.textbbox((0, 0), wln, font=font_text)[3] + line_spacing
+        if len(texts) > 1:
+            y -= line_spacing
+        return {"size": (canvas_width, y + margin), "background": None, "qr": qr, "texts": texts}
+
+    def render_image(self, qr_url: str, nombre: str, evento: str, telefono: str, numero: int = None) -> "Image.Image":
+        return self._raster(self.layout(nombre, evento, telefono, numero), qr_url)
+
+    def _raster(self, layout, qr_url):
+        from PIL import Image, ImageDraw
+        W, H = layout["size"]
+        if layout["background"] is not None:
+            img = layout["background"].copy()
+        else:
+            img = Image.new("RGB", (W, H), "white")
+        qr_x, qr_y, qr_size = layout["qr"]
+        img.paste(qr_image(qr_url, qr_size), (qr_x, qr_y))
+
+        draw = ImageDraw.Draw(img)
+        for text, x, y, font_file, size in layout["texts"]:
+            font = self._font(font_file, size)
+            if x is None:
                 try:
                     w = draw.textlength(text, font=font)
-                except:
+                except Exception:
                     w = draw.textbbox((0, 0), text, font=font)[2]
                 x = (W - w) // 2
-                draw.text((x, y), text, font=font, fill=color)
-                return 60
-            
-            if numero is not None:
-                draw_centered(str(numero), qr_y - 60, font_phone)
-            
-            text_y = qr_y + qr_size + 40
-            draw_centered(telefono, text_y, font_phone)
-            text_y += 80
-            draw_centered(nombre, text_y, font_name)
-            
-            out = io.BytesIO()
-            bg.save(out, format="PNG")
-            return out.getvalue()
-        except Exception as e:
-            print(f"Error usando template: {e}")
-
-    qr_size = 480
-    qr_img = qr_img.resize((qr_size, qr_size), Image.NEAREST)
-    margin = 24
-    line_spacing = 10
-    try:
-        font_path = os.path.join(current_app.static_folder, 'arial.ttf')
-        font_title = ImageFont.truetype(font_path, 65)
-        font_text  = ImageFont.truetype(font_path, 55)
-    except Exception as e:
-        print(f"Error loading fonts (PROG mode): {e}")
-        font_title = ImageFont.load_default()
-        font_text  = ImageFont.load_default()
-
-    title = "QR Pass"
-    lines = [f"Nombre: {nombre}", f"Evento: {evento}", f"Teléfono: {telefono}"]
-    if numero is not None:
-        lines.append(f"Número: {numero}")
-
-    def wrap_line(txt, font, width_px):
-        max_chars = max(1, width_px // 12)
-        wrapped = []
-        for paragraph in txt.split("\n"):
-            wrapped.extend(textwrap.wrap(paragraph, width=max_chars))
-        return wrapped
-
-    canvas_width = qr_size + margin * 2
-    max_text_width = canvas_width - margin * 2
-
-    dummy = Image.new("RGB", (10, 10))
-    ddraw = ImageDraw.Draw(dummy)
-    try:
-        title_w, title_h = ddraw.textbbox((0, 0), title, font=font_title)[2:]
-    except:
-        title_w, title_h = ddraw.textsize(title, font=font_title)
-
-    wrapped_lines, text_block_h = [], 0
-    for ln in lines:
-        wlines = wrap_line(ln, font_text, max_text_width)
-        wrapped_lines.append(wlines)
-        for wln in wlines:
-            try:
-                _, h = ddraw.textbbox((0, 0), wln, font=font_text)[2:]
-            except:
-                _, h = ddraw.textsize(wln, font=font_text)
-            text_block_h += h + line_spacing
-    if text_block_h > 0:
-        text_block_h -= line_spacing
-
-    canvas_height = margin + title_h + margin + qr_size + margin + text_block_h + margin
-    canvas = Image.new("RGB", (canvas_width, canvas_height), "white")
-    draw = ImageDraw.Draw(canvas)
-
-    try:
-        title_len = draw.textlength(title, font=font_title)
-    except:
-        try:
-            title_len = ddraw.textbbox((0, 0), title, font=font_title)[2]
-        except:
-             title_len, _ = ddraw.textsize(title, font=font_title)
-             
-    title_x = int((canvas_width - title_len) // 2)
-    y = margin
-    draw.text((title_x, y), title, fill="black", font=font_title)
-    y += title_h + margin
-
-    qr_x = (canvas_width - qr_size) // 2
-    canvas.paste(qr_img, (qr_x, y))
-    y += qr_size + margin
-
-    for wlines in wrapped_lines:
-        for wln in wlines:
-            draw.text((margin, y), wln, fill="black", font=font_text)
-            try:
-                _, h = ddraw.textbbox((0, 0), wln, font=font_text)[2:]
-            except:
-                _, h = ddraw.textsize(wln, font=font_text)
-            y += h + line_spacing
-
-    out = io.BytesIO()
-    canvas.save(out, format="PNG")
-    return out.getvalue()
+            draw.text((x, y), text, font=font, fill=(0, 0, 0))
+        return img
+
+    def render(self, qr_url: str, nombre: str, evento: str, telefono: str, numero: int = None,
+               formato: str = "png", calidad: int = None, background_href: str = None) -> bytes:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato}")
+        with metrics.timed(metrics.TICKET_RENDER, formato):
+            return self._render(qr_url, nombre, evento, telefono, numero, formato, calidad, background_href)
+
+    def _render(self, qr_url, nombre, evento, telefono, numero, formato, calidad, background_href):
+        if formato == "svg":
+            return self._render_svg(qr_url, nombre, evento, telefono, numero, background_href)
+        if formato == "pdf":
+            return self._render_pdf(qr_url, nombre, evento, telefono, numero)
+
+        layout = self.layout(nombre, evento, telefono, numero)
+        img = self._raster(layout, qr_url)
+        out = io.BytesIO()
+        if formato == "png":
+            img.save(out, format="PNG", compress_level=self.png_compress_level)
+        elif formato == "png8":
+            self._quantized(img, layout["qr"], qr_url).save(out, format="PNG", compress_level=self.png_compress_level)
+        elif formato == "webp":
+            # Sin pérdida, así que no hay calidad que elegir: el QR queda
+            # idéntico. En lossless `quality` es el esfuerzo del encoder.
+            img.save(out, format="WEBP", lossless=True, quality=WEBP_EFFORT, method=WEBP_METHOD)
+        else:
+            # 4:4:4 para no mezclar crominancia entre módulos vecinos del QR
+            img.save(out, format="JPEG", quality=calidad or 85, subsampling=0, optimize=True)
+        return out.getvalue()
+
+    def _quantized(self, img, qr_box, qr_url):
+        # Paleta de 254 colores para el fondo y el texto; los dos índices
+        # restantes son negro y blanco puros y se usan para pegar el QR, que
+        # así no pasa por la cuantización.
+        from PIL import Image
+        pal = img.quantize(colors=254, dither=Image.Dither.NONE)
+        palette = (pal.getpalette() or [])[:254 * 3]
+        palette += [0] * (254 * 3 - len(palette)) + [0, 0, 0, 255, 255, 255]
+        pal.putpalette(palette)
+        qr_x, qr_y, qr_size = qr_box
+        qr = qr_image(qr_url, qr_size)
+        box = (qr_x, qr_y, qr_x + qr_size, qr_y + qr_size)
+        pal.paste(254, box, mask=qr.point(lambda v: 255 if v == 0 else 0))
+        pal.paste(255, box, mask=qr)
+        return pal
+
+    def _render_svg(self, qr_url, nombre, evento, telefono, numero, background_href):
+        # QR como un único path de módulos sobre el template referenciado
+        # (no embebido): pesa unos pocos KB y el QR escala sin pérdida.
+        layout = self.layout(nombre, evento, telefono, numero)
+        W, H = layout["size"]
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                 f'width="{W}" height="{H}" viewBox="0 0 {W} {H}">']
+        if layout["background"] is not None and background_href:
+            href = escape(background_href, {'"': "&quot;"})
+            parts.append(f'<image x="0" y="0" width="{W}" height="{H}" href="{href}" xlink:href="{href}"/>')
+        else:
+            parts.append(f'<rect width="{W}" height="{H}" fill="#fff"/>')
+
+        qr_x, qr_y, qr_size = layout["qr"]
+        matrix = qr_matrix(qr_url)
+        n = len(matrix)
+        parts.append(f'<rect x="{qr_x}" y="{qr_y}" width="{qr_size}" height="{qr_size}" fill="#fff"/>')
+        parts.append(f'<path transform="translate({qr_x} {qr_y}) scale({qr_size / n:.6f})" '
+                     f'shape-rendering="crispEdges" fill="#000" d="{"".join(_module_runs_path(matrix))}"/>')
+
+        for text, x, y, font_file, size in layout["texts"]:
+            ascent = self._font(font_file, size).getmetrics()[0]
+            weight = ' font-weight="bold"' if font_file == FONT_BOLD_FILE else ""
+            anchor = f'x="{W / 2:g}" text-anchor="middle"' if x is None else f'x="{x}"'
+            parts.append(f'<text {anchor} y="{y + ascent}" font-family="Arial, Helvetica, sans-serif" '
+                         f'font-size="{size}"{weight}>{escape(text)}</text>')
+        parts.append("</svg>")
+        return "".join(parts).encode("utf-8")
+
+    def _render_pdf(self, qr_url, nombre, evento, telefono, numero):
+        # Una página del tamaño del ticket (1 px = 1 pt). El template JPEG se
+        # embebe tal cual, sin recodificar; QR y textos son vectoriales.
+        from app.utils.pdf_stream import PdfStream, standard_fonts, jpeg_xobject
+
+        size, ops = self.pdf_tile(qr_url, nombre, evento, telefono, numero)
+        pdf = PdfStream()
+        out = [pdf.header()]
+        pages_id, catalog_id = pdf.reserve(), pdf.reserve()
+        fonts, resources = standard_fonts(pdf)
+        out.append(fonts)
+        template = self.template_jpeg()
+        if template is not None:
+            data, obj_id = jpeg_xobject(pdf, *template)
+            out.append(data)
+            resources += f"/XObject<</Tpl {obj_id} 0 R>>"
+        out.append(pdf.page(pages_id, ops, f"<<{resources}>>", size=size))
+        out.append(pdf.finish(pages_id, catalog_id))
+        return b"".join(out)
+
+    def template_jpeg(self):
+        # (jpeg, ancho, alto, modo) del template para embeber en un PDF. Si ya
+        # es JPEG se usan los bytes del archivo; si no, se codifica una vez.
+        if self._base is None:
+            return None
+        from PIL import Image
+        path = self._path(TEMPLATE_FILE)
+        with Image.open(path) as im:
+            formato, mode, size = im.format, im.mode, im.size
+        if formato == "JPEG" and mode in ("RGB", "L", "CMYK"):
+            with open(path, "rb") as fh:
+                return fh.read(), size[0], size[1], mode
+        buf = io.BytesIO()
+        self._base.save(buf, format="JPEG", quality=92, subsampling=0)
+        return buf.getvalue(), size[0], size[1], "RGB"
+
+    def pdf_tile(self, qr_url, nombre, evento, telefono, numero, background="/Tpl"):
+        # ((W, H), operadores PDF) de un ticket en sus propias coordenadas
+        # (origen abajo a la izquierda). Usa el template como XObject `background` y
+        # las fuentes /F1 (Helvetica) y /F2 (Helvetica-Bold) del recurso.
+        from app.utils.pdf_stream import pdf_string, num
+
+        layout = self.layout(nombre, evento, telefono, numero)
+        W, H = layout["size"]
+        ops = []
+        if layout["background"] is not None:
+            ops.append(f"q {W} 0 0 {H} 0 0 cm {background} Do Q")
+        else:
+            ops.append(f"1 g 0 0 {W} {H} re f")
+        qr_x, qr_y, qr_size = layout["qr"]
+        matrix = qr_matrix(qr_url)
+        module = qr_size / len(matrix)
+        top = H - qr_y
+        ops.append(f"1 g {qr_x} {top - qr_size} {qr_size} {qr_size} re f 0 g")
+        for y, row in enumerate(matrix):
+            for x, length in _dark_runs(row):
+                ops.append(f"{num(qr_x + x * module)} {num(top - (y + 1) * module)} {num(length * module)} {num(module)} re")
+        ops.append("f")
+        for text, x, y, font_file, size in layout["texts"]:
+            font = self._font(font_file, size)
+            if x is None:
+                x = (W - font.getlength(text)) / 2
+            baseline = H - y - font.getmetrics()[0]
+            ops.append(f"BT /{'F2' if font_file == FONT_BOLD_FILE else 'F1'} {size} Tf {num(float(x))} {baseline} Td "
+                       + pdf_string(text).decode("latin-1") + " Tj ET")
+        return (W, H), "\n".join(ops).encode("latin-1")
+
+def _dark_runs(row):
+    # (inicio, largo) de cada tramo de módulos oscuros consecutivos
+    x, n = 0, len(row)
+    while x < n:
+        if row[x]:
+            start = x
+            while x < n and row[x]:
+                x += 1
+            yield start, x - start
+        else:
+            x += 1
+
+def _module_runs_path(matrix):
+    for y, row in enumerate(matrix):
+        for x, length in _dark_runs(row):
+            yield f"M{x} {y}h{length}v1h-{length}z"
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_ticket_renderer(static_folder: str = None) -> TicketRenderer:
+    global _renderer
+    if static_folder is None:
+        static_folder = current_app.static_folder
+    renderer = _renderer
+    if renderer is None or renderer.static_folder != static_folder:
+        with _renderer_lock:
+            if _renderer is None or _renderer.static_folder != static_folder:
+                level = current_app.config.get("TICKET_PNG_COMPRESS_LEVEL", 6) if has_app_context() else 6
+                _renderer = TicketRenderer(static_folder, png_compress_level=level)
+            renderer = _renderer
+    elif has_app_context() and current_app.config.get("TEMPLATES_AUTO_RELOAD"):
+        renderer.reload_if_changed()
+    return renderer
+
+def build_qr_image_with_text(qr_url: str, nombre: str, evento: str, telefono: str, numero: int = None) -> bytes:
+    return get_ticket_renderer().render(qr_url, nombre=nombre, evento=evento, telefono=telefono, numero=numero)
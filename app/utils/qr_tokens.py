@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+# Tokens firmados para el QR: el escáner puede validar la entrada sin leer
+# Firestore. Formato: v1.<payload base64url>.<firma base64url>, con HMAC-SHA256
+# truncado a 128 bits para que el QR siga siendo chico.
+TOKEN_VERSION = "v1"
+SIGNATURE_BYTES = 16
+
+class TokenError(ValueError):
+    pass
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _signature(key: bytes, body: str) -> bytes:
+    return hmac.new(key, f"{TOKEN_VERSION}.{body}".encode("ascii"), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+def sign_ticket(key: bytes, entrada_id: str, evento: str, numero, expires_at: int) -> str:
+    payload = {"id": entrada_id, "ev": evento, "n": numero, "exp": int(expires_at)}
+    body = _b64encode(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return f"{TOKEN_VERSION}.{body}.{_b64encode(_signature(key, body))}"
+
+def verify_ticket_token(key: bytes, token: str, now: float = None) -> dict:
+    try:
+        version, body, sig = token.split(".")
+    except (AttributeError, ValueError):
+        raise TokenError("formato")
+    if version != TOKEN_VERSION:
+        raise TokenError("version")
+    try:
+        valid = hmac.compare_digest(_b64decode(sig), _signature(key, body))
+    except ValueError:
+        raise TokenError("formato")
+    if not valid:
+        raise TokenError("firma")
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        raise TokenError("formato")
+    if payload.get("exp", 0) < (now if now is not None else time.time()):
+        raise TokenError("expirado")
+    return payload
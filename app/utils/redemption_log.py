@@ -0,0 +1,170 @@
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime
+
+from app.utils.versions import bump_version
+from app.utils.event_stats import record_stats
+from app.utils.search_index import index_update
+
+# Registro local de canjes de QR firmados: un JSON por línea, sólo se agrega.
+# Con QR_OFFLINE_REDEMPTION es la única autoridad de doble uso de los QR
+# firmados (ver app/routes/main.py): cada canje se escribe bajo un flock, así
+# varios workers del mismo host comparten el archivo sin consultar Firestore.
+# `sync` lleva después los canjes a `entradas`; la sincronización también
+# queda registrada como una línea.
+class RedemptionLog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._canjes = {}
+        self._sincronizados = {}
+
+    def _apply(self, record):
+        if record.get("tipo") == "sync":
+            self._sincronizados[record["id"]] = record
+        else:
+            self._canjes.setdefault(record["id"], record)
+
+    def _refresh(self, fh):
+        # Lee sólo lo agregado desde la última lectura (también por otros procesos)
+        fh.seek(self._offset)
+        for line in fh:
+            if not line.endswith(b"\n"):
+                break
+            self._offset += len(line)
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                continue
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, "a+b")
+
+    def _append(self, fh, record):
+        fh.seek(0, os.SEEK_END)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        fh.write(line)
+        fh.flush()
+        os.fsync(fh.fileno())
+        self._offset += len(line)
+        self._apply(record)
+
+    def lookup(self, claims):
+        # Estado de la entrada del token según el registro, con la forma de
+        # redeem_entrada
+        with self._lock, self._open() as fh:
+            fcntl.flock(fh, fcntl.LOCK_SH)
+            try:
+                self._refresh(fh)
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            return _resultado(claims, self._canjes.get(claims["id"]), canjeada=False)
+
+    def redeem(self, claims, user=None):
+        # Canjea la entrada del token si no figura canjeada en el registro
+        with self._lock, self._open() as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._refresh(fh)
+                previo = self._canjes.get(claims["id"])
+                if previo:
+                    return _resultado(claims, previo, canjeada=False)
+                user = user or {}
+                record = {
+                    "id": claims["id"],
+                    "evento": claims.get("ev"),
+                    "numero": claims.get("n"),
+                    "usada_en": datetime.utcnow().isoformat() + "Z",
+                    "usada_por_uid": user.get("uid"),
+                    "usada_por_email": user.get("email"),
+                }
+                self._append(fh, record)
+                return _resultado(claims, record, canjeada=True)
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def pending(self):
+        with self._lock, self._open() as fh:
+            fcntl.flock(fh, fcntl.LOCK_SH)
+            try:
+                self._refresh(fh)
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            return [r for i, r in self._canjes.items() if i not in self._sincronizados]
+
+    def _mark_synced(self, entrada_id, resultado):
+        with self._lock, self._open() as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                self._refresh(fh)
+                if entrada_id not in self._sincronizados:
+                    self._append(fh, {"tipo": "sync", "id": entrada_id, "resultado": resultado,
+                                      "sincronizado_en": datetime.utcnow().isoformat() + "Z"})
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def sync(self, db):
+        # Lleva los canjes pendientes a `entradas`. Si la entrada ya figuraba
+        # usada por otro canje se reporta como doble uso.
+        from google.cloud import firestore
+        resumen = {"sincronizados": 0, "doble_uso": [], "inexistentes": []}
+        for canje in self.pending():
+            ref = db.collection("entradas").document(canje["id"])
+
+            @firestore.transactional
+            def apply_canje(tx, ref):
+                snap = ref.get(transaction=tx)
+                if not snap.exists:
+                    return "inexistente"
+                data = snap.to_dict() or {}
+                if data.get("estado") == "usado":
+                    return "ok" if data.get("usada_en") == canje["usada_en"] else "doble_uso"
+                tx.update(ref, {
+                    "estado": "usado",
+                    "usada_en": canje["usada_en"],
+                    "usada_por_uid": canje.get("usada_por_uid"),
+                    "usada_por_email": canje.get("usada_por_email"),
+                    "usada_offline": True,
+                })
+                bump_version(tx, db, data.get("evento"))
+                record_stats(tx, db, data.get("evento"), usadas=1)
+                return "ok"
+
+            resultado = apply_canje(db.transaction(), ref)
+            if resultado == "doble_uso":
+                resumen["doble_uso"].append(canje["id"])
+            elif resultado == "inexistente":
+                resumen["inexistentes"].append(canje["id"])
+            else:
+                resumen["sincronizados"] += 1
+                index_update("entradas", [(canje["id"], {"estado": "usado"})])
+            self._mark_synced(canje["id"], resultado)
+        return resumen
+
+def _resultado(claims, canje, canjeada):
+    # Sin Firestore no hay nombre ni teléfono: sólo lo que trae el token
+    return {
+        "estado": "usado" if canje else "valido",
+        "canjeada": canjeada,
+        "nombre": None,
+        "evento": claims.get("ev"),
+        "telefono": None,
+        "numero": claims.get("n"),
+        "usada_en": canje.get("usada_en") if canje else None,
+    }
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+def get_redemption_log(path) -> RedemptionLog:
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None:
+            log = _logs[path] = RedemptionLog(path)
+        return log
@@ -0,0 +1,78 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+
+from app.utils.qr_generator import TicketRenderer
+
+# Renderer propio de cada proceso del pool: template y fuentes se cargan una
+# sola vez en el initializer y se reutilizan para todos los tickets.
+_worker_renderer = None
+
+def _init_worker(static_folder, png_compress_level):
+    global _worker_renderer
+    _worker_renderer = TicketRenderer(static_folder, png_compress_level=png_compress_level)
+
+def _render_ticket(job):
+    # Devuelve (png, error) para que un ticket fallido no corte el lote
+    qr_url, nombre, evento, telefono, numero = job
+    try:
+        return _worker_renderer.render(qr_url, nombre=nombre, evento=evento, telefono=telefono, numero=numero), None
+    except Exception as e:
+        return None, str(e)
+
+def _warm_worker(_):
+    # Warm-up: un render descartable carga qrcode y los encoders en el proceso
+    _worker_renderer.render("warmup", "", "", "")
+    return os.getpid()
+
+def _render_pdf_tile(job):
+    qr_url, nombre, evento, telefono, numero = job
+    try:
+        return _worker_renderer.pdf_tile(qr_url, nombre, evento, telefono, numero), None
+    except Exception as e:
+        return None, str(e)
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = current_app.config.get("RENDER_PROCESSES") or os.cpu_count() or 1
+                # spawn: no heredar el canal gRPC de Firestore ni los hilos de gunicorn
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(current_app.static_folder, current_app.config.get("TICKET_PNG_COMPRESS_LEVEL", 6)),
+                )
+                _pool_workers = workers
+    return _pool
+
+def render_pool_workers() -> int:
+    # Procesos del pool (lo crea si hace falta)
+    get_render_pool()
+    return _pool_workers
+
+def imap_bounded(executor, fn, items, window):
+    # Como executor.map pero con a lo sumo `window` tareas en vuelo, para que
+    # los resultados no se acumulen en memoria si el consumidor es más lento.
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def render_tickets(jobs):
+    # jobs: iterable de (qr_url, nombre, evento, telefono, numero); devuelve
+    # (png, error) en el mismo orden.
+    pool = get_render_pool()
+    return imap_bounded(pool, _render_ticket, jobs, window=render_pool_workers() * 4)
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from app.utils.render_pool import get_render_pool, _render_ticket
+from app.utils.ticket_cache import ticket_key, get_ticket_cache, cached_ticket_png
+from app.utils import metrics
+
+# Render en segundo plano de los tickets recién creados: registrar_entrada
+# encola y responde; /ticket/<id>.png espera el resultado o lo sirve del
+# cache. La cola está acotada: si está llena no se encola y la imagen se
+# renderiza cuando alguien la pida.
+class RenderQueue:
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {"encolados": 0, "completados": 0, "errores": 0, "rechazados": 0,
+                       "esperas": 0, "latencia_total_s": 0.0, "latencia_max_s": 0.0}
+
+    def submit(self, qr_url, nombre, evento, telefono, numero):
+        # Devuelve la clave del ticket (sirve de ETag/versión de la URL)
+        key = ticket_key(qr_url, nombre, evento, telefono, numero)
+        cache = get_ticket_cache()
+        with self._lock:
+            if key in self._inflight:
+                return key
+            if len(self._inflight) >= self.max_pending:
+                self._stats["rechazados"] += 1
+                return key
+        if cache.get(key) is not None:
+            return key
+        encolado = time.monotonic()
+        future = get_render_pool().submit(_render_ticket, (qr_url, nombre, evento, telefono, numero))
+        with self._lock:
+            self._inflight[key] = future
+            self._stats["encolados"] += 1
+
+        def done(f):
+            try:
+                png, _ = f.result()
+            except Exception:
+                png = None
+            if png is not None:
+                cache.put(key, png)
+            latencia = time.monotonic() - encolado
+            metrics.RENDER_QUEUE.observe(latencia, "ok" if png is not None else "error")
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._stats["completados" if png is not None else "errores"] += 1
+                self._stats["latencia_total_s"] += latencia
+                self._stats["latencia_max_s"] = max(self._stats["latencia_max_s"], latencia)
+
+        future.add_done_callback(done)
+        return key
+
+    def get_png(self, qr_url, nombre, evento, telefono, numero, timeout):
+        # Del cache, esperando un render en curso, o renderizando acá
+        key = ticket_key(qr_url, nombre, evento, telefono, numero)
+        png = get_ticket_cache().get(key)
+        if png is not None:
+            return key, png
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            with self._lock:
+                self._stats["esperas"] += 1
+            try:
+                png, _ = future.result(timeout=timeout)
+            except Exception:
+                png = None
+            if png is not None:
+                return key, png
+        return cached_ticket_png(qr_url, nombre, evento, telefono, numero)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, pendientes=len(self._inflight), max_pendientes=self.max_pending)
+        terminados = stats["completados"] + stats["errores"]
+        stats["latencia_media_s"] = round(stats["latencia_total_s"] / terminados, 4) if terminados else None
+        return stats
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_render_queue(max_pending=None) -> RenderQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from app.config import Config
+                _queue = RenderQueue(max_pending or Config.RENDER_QUEUE_MAX_PENDING)
+    return _queue
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+from app.firebase import db
+from app.utils.ticket_numbers import get_allocator
+from app.utils.versions import bump_versions
+from app.utils.event_stats import record_stats
+from app.utils.search_index import index_update
+
+BATCH_SIZE = 500
+
+def _orden_numero(numero):
+    # Las numeradas primero, por número; después las que no tienen
+    if isinstance(numero, (int, float)) and not isinstance(numero, bool):
+        return (0, numero)
+    return (1, 0)
+
+def plan_renumbering(db, evento=None):
+    # Numeración objetivo por evento (orden de creación) y lista de los
+    # documentos cuyo `numero` actual no coincide.
+    query = db.collection("entradas").select(["evento", "creada_en", "numero"])
+    if evento:
+        query = query.where("evento", "==", evento)
+    by_event = {}
+    for doc in query.stream():
+        d = doc.to_dict() or {}
+        ev = d.get("evento", "(Sin evento)")
+        numero = d.get("numero")
+        by_event.setdefault(ev, []).append((str(d.get("creada_en") or ""), _orden_numero(numero), doc.id, numero))
+
+    cambios, totales = [], {}
+    for ev, ev_entradas in by_event.items():
+        # Empates de creada_en (importaciones viejas con un solo creada_en):
+        # se respeta el número actual antes que el id, así no se renumeran
+        # entradas ya impresas o enviadas
+        ev_entradas.sort()
+        totales[ev] = len(ev_entradas)
+        for index, (_, _, doc_id, numero) in enumerate(ev_entradas):
+            # Las que no tienen el campo evento se escriben igual: con evento
+            # nulo vuelven a entrar en el orden de la lista
+            if numero != index + 1 or ev == "(Sin evento)":
+                cambios.append((doc_id, index + 1, ev))
+    return cambios, totales
+
+def renumerar_entradas(job, evento=None):
+    cambios, totales = plan_renumbering(db, evento)
+    job.total = len(cambios)
+
+    entradas = db.collection("entradas")
+
+    def commit_chunk(chunk):
+        batch = db.batch()
+        bump_versions(batch, db, (None if ev == "(Sin evento)" else ev for _, _, ev in chunk))
+        maximos = {}
+        for doc_id, numero, ev in chunk:
+            cambio = {"numero": numero}
+            if ev == "(Sin evento)":
+                cambio["evento"] = None
+            batch.update(entradas.document(doc_id), cambio)
+            maximos[ev] = max(maximos.get(ev, 0), numero)
+        for ev, numero in maximos.items():
+            if ev != "(Sin evento)":
+                record_stats(batch, db, ev, numero=numero)
+        batch.commit()
+        index_update("entradas", ((doc_id, {"numero": numero}) for doc_id, numero, _ in chunk))
+        job.advance(procesados=len(chunk), actualizados=len(chunk))
+
+    # Lugar en cada batch para la versión y las estadísticas de los eventos
+    por_batch = max(BATCH_SIZE // 2, BATCH_SIZE - 2 * len(totales))
+    chunks = [cambios[i:i + por_batch] for i in range(0, len(cambios), por_batch)]
+    with ThreadPoolExecutor(max_workers=Config.RENUMBER_PARALLEL_BATCHES) as pool:
+        for _ in pool.map(commit_chunk, chunks):
+            pass
+
+    allocator = get_allocator()
+    for ev, total in totales.items():
+        if ev != "(Sin evento)":
+            allocator.ensure_at_least(ev, total)
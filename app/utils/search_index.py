@@ -0,0 +1,344 @@
+import bisect
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from app.config import Config
+from app.utils.helpers import fold_accents
+
+logger = logging.getLogger(__name__)
+
+# Índice de búsqueda en memoria para el type-ahead de /lista y /eventos.
+# Cada registro aporta tokens normalizados (sin acentos, en minúscula; los
+# teléfonos sólo con dígitos) a una lista ordenada de (token, id): una
+# búsqueda por prefijo es un bisect y un recorrido del rango, sin tocar
+# Firestore. Se arma una vez (del espejo si está conectado, si no leyendo la
+# colección) y después se actualiza en cada alta, baja y canje hechos por la
+# app. Las escrituras de otros procesos o de la consola aparecen en la
+# reconstrucción periódica (SEARCH_INDEX_REFRESH_SECONDS).
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_TELEFONO_RE = re.compile(r"^[\d\s()+\-.]+$")
+
+def normalize(text):
+    return fold_accents(str(text or "")).lower()
+
+def _digits(text):
+    return re.sub(r"\D", "", str(text or ""))
+
+def phone_tokens(telefono):
+    # El número completo y los últimos 10 y 8 dígitos, para encontrarlo
+    # escrito sin código de país ni de área
+    digitos = _digits(telefono)
+    return {t for t in (digitos, digitos[-10:], digitos[-8:]) if t}
+
+def entrada_tokens(data):
+    tokens = set(_TOKEN_RE.findall(normalize(data.get("nombre"))))
+    tokens |= phone_tokens(data.get("telefono"))
+    if data.get("numero") is not None:
+        tokens.add(str(data.get("numero")))
+    return tokens
+
+def evento_tokens(data):
+    return set(_TOKEN_RE.findall(normalize(data.get("nombre"))))
+
+def query_terms(q):
+    # Un teléfono escrito con espacios o guiones se busca como un solo número
+    q = (q or "").strip()
+    if _TELEFONO_RE.match(q) and len(_digits(q)) > 4:
+        return [_digits(q)]
+    return _TOKEN_RE.findall(normalize(q))
+
+class SearchIndex:
+    # Memoria: los registros son namedtuples y las claves (token, id) se
+    # guardan en dos listas paralelas ordenadas por token; los tokens de
+    # nombres se internan porque se repiten mucho entre entradas.
+
+    def __init__(self, campos, tokenizer, orden):
+        self.campos = campos
+        self.record_cls = namedtuple("Registro", ("id",) + tuple(campos))
+        self.tokenizer = tokenizer
+        self.orden = orden
+        self._records = {}   # id -> Registro
+        self._orden = {}     # id -> clave de orden de los resultados
+        self._tokens = {}    # id -> tupla de tokens indexados
+        self._tok = []       # tokens ordenados
+        self._ids = []       # id de cada posición de _tok
+        self._lock = threading.RLock()
+        self._pending = None  # cambios durante una reconstrucción
+        self.built_at = None
+        self.stats_counters = {"busquedas": 0, "reconstrucciones": 0, "cambios": 0}
+
+    def __len__(self):
+        return len(self._records)
+
+    def _record(self, doc_id, data):
+        return self.record_cls(data.get("id") or doc_id, *(data.get(c) for c in self.campos))
+
+    def _index_tokens(self, data):
+        return tuple(sys.intern(t) for t in self.tokenizer(data))
+
+    def _set_keys(self, pares):
+        pares.sort()
+        self._tok = [t for t, _ in pares]
+        self._ids = [i for _, i in pares]
+
+    def load(self, items):
+        # Carga completa: [(id, data)]
+        nuevo = SearchIndex(self.campos, self.tokenizer, self.orden)
+        pares = []
+        for doc_id, data in items:
+            record = nuevo._records[doc_id] = nuevo._record(doc_id, data)
+            nuevo._orden[doc_id] = self.orden(record)
+            tokens = nuevo._tokens[doc_id] = nuevo._index_tokens(data)
+            pares.extend((t, doc_id) for t in tokens)
+        nuevo._set_keys(pares)
+        with self._lock:
+            self._records, self._orden, self._tokens = nuevo._records, nuevo._orden, nuevo._tokens
+            self._tok, self._ids = nuevo._tok, nuevo._ids
+            self.built_at = time.time()
+
+    def upsert_many(self, items):
+        items = list(items)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("upsert", items))
+            nuevas, cambian = [], []
+            for doc_id, data in items:
+                tokens = self._index_tokens(data)
+                if self._tokens.get(doc_id) != tokens:
+                    # Sólo las claves de los tokens que cambiaron (un canje
+                    # no toca ninguna)
+                    cambian.append(doc_id)
+                    nuevas.extend((t, doc_id) for t in tokens)
+            self._discard(cambian, registros=False)
+            for doc_id, data in items:
+                record = self._records[doc_id] = self._record(doc_id, data)
+                self._orden[doc_id] = self.orden(record)
+                self._tokens[doc_id] = self._index_tokens(data)
+            if len(nuevas) > 64:
+                # Importaciones: agregar y reordenar sale más barato que
+                # insertar de a una (timsort aprovecha los tramos ordenados)
+                self._set_keys(list(zip(self._tok, self._ids)) + nuevas)
+            else:
+                for token, doc_id in nuevas:
+                    # Dentro de un mismo token los ids quedan ordenados
+                    i, j = self._token_range(token)
+                    i = bisect.bisect_left(self._ids, doc_id, lo=i, hi=j)
+                    self._tok.insert(i, token)
+                    self._ids.insert(i, doc_id)
+            self.stats_counters["cambios"] += len(items)
+
+    def discard_many(self, doc_ids):
+        doc_ids = list(doc_ids)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("discard", doc_ids))
+            self._discard(doc_ids)
+
+    def _discard(self, doc_ids, registros=True):
+        with self._lock:
+            viejas = []
+            for doc_id in doc_ids:
+                if registros:
+                    self._records.pop(doc_id, None)
+                    self._orden.pop(doc_id, None)
+                viejas.extend((t, doc_id) for t in self._tokens.pop(doc_id, ()))
+            if len(viejas) > 64:
+                quitar = set(viejas)
+                self._set_keys([p for p in zip(self._tok, self._ids) if p not in quitar])
+                return
+            for token, doc_id in viejas:
+                i, j = self._token_range(token)
+                k = bisect.bisect_left(self._ids, doc_id, lo=i, hi=j)
+                if k < j and self._ids[k] == doc_id:
+                    del self._tok[k]
+                    del self._ids[k]
+
+    def _token_range(self, token):
+        i = bisect.bisect_left(self._tok, token)
+        return i, bisect.bisect_right(self._tok, token, lo=i)
+
+    def update_many(self, cambios):
+        # Cambios parciales [(id, {campo: valor})] sobre registros ya
+        # indexados (canjes, renumeración); los que no están se ignoran
+        cambios = list(cambios)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("update", cambios))
+            items = [(doc_id, dict(self._records[doc_id]._asdict(), **campos))
+                     for doc_id, campos in cambios if doc_id in self._records]
+            pending, self._pending = self._pending, None
+            try:
+                self.upsert_many(items)
+            finally:
+                self._pending = pending
+
+    def rebuild(self, source):
+        # Reconstrucción sin cortar las búsquedas: se arma aparte y los
+        # cambios que llegan desde que se empieza a leer `source()` se
+        # vuelven a aplicar al final
+        with self._lock:
+            self._pending = []
+        nuevo = SearchIndex(self.campos, self.tokenizer, self.orden)
+        try:
+            nuevo.load(source())
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pendientes, self._pending = self._pending, None
+            self._records, self._orden, self._tokens = nuevo._records, nuevo._orden, nuevo._tokens
+            self._tok, self._ids = nuevo._tok, nuevo._ids
+            self.built_at = nuevo.built_at
+            for op, arg in pendientes:
+                if op == "upsert":
+                    self.upsert_many(arg)
+                elif op == "discard":
+                    self.discard_many(arg)
+                else:
+                    self.update_many(arg)
+            self.stats_counters["reconstrucciones"] += 1
+
+    def _prefix_range(self, term):
+        # Posiciones [i, j) de los tokens que empiezan con `term`
+        return bisect.bisect_left(self._tok, term), bisect.bisect_left(self._tok, term + "\uffff")
+
+    def search(self, q, limit=20, **filtros):
+        # Registros que tienen, para cada término, algún token que empieza
+        # con él. Se parte del rango del término más selectivo; un término
+        # con un rango mucho más grande se comprueba contra los tokens de
+        # cada candidato en vez de armar su conjunto. Devuelve (primeros
+        # `limit` como dicts en el orden del índice, total).
+        terms = query_terms(q)
+        if not terms:
+            return [], 0
+        filtros = [(self.record_cls._fields.index(k), v) for k, v in filtros.items() if v]
+        with self._lock:
+            self.stats_counters["busquedas"] += 1
+            rangos = sorted((j - i, i, j, term) for term in set(terms) for i, j in [self._prefix_range(term)])
+            _, i, j, _ = rangos[0]
+            ids = set(self._ids[i:j])
+            resto = []
+            for n, i, j, term in rangos[1:]:
+                if n > 50 * len(ids):
+                    resto.append(term)
+                else:
+                    ids.intersection_update(self._ids[i:j])
+            if resto:
+                tokens = self._tokens
+                ids = [doc_id for doc_id in ids
+                       if all(any(t.startswith(term) for t in tokens[doc_id]) for term in resto)]
+            records = self._records
+            if filtros:
+                ids = [doc_id for doc_id in ids if all(records[doc_id][k] == v for k, v in filtros)]
+            primeros = heapq.nsmallest(limit, ids, key=self._orden.__getitem__)
+            return [records[doc_id]._asdict() for doc_id in primeros], len(ids)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.stats_counters, registros=len(self._records), tokens=len(self._tok),
+                        antiguedad_s=round(time.time() - self.built_at, 3) if self.built_at else None)
+
+def _orden_entrada(r):
+    return (r.evento or "", r.numero if isinstance(r.numero, int) else float("inf"), r.nombre or "")
+
+def _orden_evento(r):
+    return (r.fecha_hora or "", r.nombre or "")
+
+INDEXES = {
+    "entradas": (("evento", "nombre", "telefono", "numero", "estado"), entrada_tokens, _orden_entrada),
+    "eventos": (("nombre", "fecha_hora"), evento_tokens, _orden_evento),
+}
+
+def _source_items(collection):
+    from app.firebase import db
+    from app.utils.firestore_cache import live_mirror
+    campos = INDEXES[collection][0]
+    mirror = live_mirror(collection)
+    if mirror is not None:
+        return [(r.id, r.to_dict()) for r in mirror.records()]
+    return [(doc.id, doc.to_dict() or {}) for doc in db.collection(collection).select(list(campos)).stream()]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_refreshing = set()
+_intentos = {}  # colección -> último intento de armarlo
+
+class IndexUnavailable(Exception):
+    pass
+
+def _refresh(collection, index):
+    def source():
+        items = _source_items(collection)
+        if len(items) > Config.SEARCH_INDEX_MAX_RECORDS:
+            raise IndexUnavailable(f"{collection}: {len(items)} registros, más que SEARCH_INDEX_MAX_RECORDS")
+        return items
+    try:
+        index.rebuild(source)
+    except Exception as e:
+        # Se reintenta recién en el próximo vencimiento (ver get_search_index)
+        logger.warning("No se pudo armar el índice de búsqueda de %s: %s", collection, e)
+    finally:
+        with _indexes_lock:
+            _refreshing.discard(collection)
+
+def get_search_index(collection, wait=True):
+    # Índice listo para buscar. El primero se arma en el llamador con
+    # wait=True (warm-up, colecciones chicas); con wait=False se arma en
+    # segundo plano y mientras tanto se levanta IndexUnavailable. Vencido
+    # SEARCH_INDEX_REFRESH_SECONDS se reconstruye en segundo plano.
+    index = _indexes.get(collection)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(collection)
+            if index is None:
+                index = _indexes[collection] = SearchIndex(*INDEXES[collection])
+    ultimo = index.built_at or _intentos.get(collection)
+    if ultimo is None or time.time() - ultimo > Config.SEARCH_INDEX_REFRESH_SECONDS:
+        with _indexes_lock:
+            lanzar = collection not in _refreshing
+            _refreshing.add(collection)
+            if lanzar:
+                _intentos[collection] = time.time()
+        if lanzar and index.built_at is None and wait:
+            _refresh(collection, index)
+        elif lanzar:
+            threading.Thread(target=_refresh, args=(collection, index), name=f"indice-{collection}", daemon=True).start()
+    if index.built_at is None:
+        raise IndexUnavailable(f"{collection}: índice en construcción")
+    return index
+
+# Ganchos para las escrituras de la app: sólo tocan índices ya armados o
+# en construcción
+
+def _accepting(collection):
+    index = _indexes.get(collection)
+    if index is not None and (index.built_at is not None or index._pending is not None):
+        return index
+    return None
+
+def index_upsert(collection, items):
+    index = _accepting(collection)
+    if index is not None:
+        index.upsert_many(items)
+
+def index_discard(collection, doc_ids):
+    index = _accepting(collection)
+    if index is not None:
+        index.discard_many(doc_ids)
+
+def index_update(collection, cambios):
+    index = _accepting(collection)
+    if index is not None:
+        index.update_many(cambios)
+
+def index_stats():
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    return [dict(i.stats(), coleccion=c) for c, i in indexes.items()]
@@ -0,0 +1,116 @@
+import codecs
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from app.utils.zip_stream import stream_zip
+
+# Serialización de filas (dicts) a CSV y XLSX como generadores de bytes: se
+# emite un chunk cada FILAS_POR_CHUNK filas, sin armar el archivo entero.
+
+TITULOS = {"numero": "N°", "evento": "Evento", "nombre": "Nombre", "telefono": "Teléfono",
+           "estado": "Estado", "creada_en": "Creada", "usada_en": "Usada", "id": "ID"}
+FILAS_POR_CHUNK = 500
+
+# Textos que Excel/LibreOffice tomarían como fórmula (inyección en la
+# planilla): se les antepone ', en CSV y en XLSX.
+_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+def _es_formula(v):
+    return isinstance(v, str) and v.startswith(_FORMULA)
+
+def _valor(v):
+    if v is None:
+        return ""
+    return "'" + v if _es_formula(v) else v
+
+def csv_stream(filas, campos):
+    # BOM para que Excel reconozca UTF-8 (y los acentos) al abrir el archivo
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    yield codecs.BOM_UTF8
+    writer.writerow([TITULOS[c] for c in campos])
+    for i, fila in enumerate(filas, start=1):
+        writer.writerow([_valor(fila[c]) for c in campos])
+        if i % FILAS_POR_CHUNK == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+# --- XLSX ---
+# Un libro mínimo escrito a mano: los textos van como inlineStr (una tabla
+# de sharedStrings obligaría a tener todas las filas antes de escribir).
+
+_XML_INVALIDO = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+_ESTATICOS = {
+    "[Content_Types].xml": _XML + (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'),
+    "_rels/.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/_rels/workbook.xml.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_REL}/styles" Target="styles.xml"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": _XML + (
+        f'<workbook {_NS} xmlns:r="{_REL}">'
+        '<sheets><sheet name="Entradas" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    # Estilo 1: negrita, para la fila de títulos
+    "xl/styles.xml": _XML + (
+        f'<styleSheet {_NS}>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'),
+}
+_ANCHOS = {"numero": 8, "evento": 24, "nombre": 30, "telefono": 20, "estado": 10,
+           "creada_en": 28, "usada_en": 28, "id": 38}
+
+def _celda(v, estilo=""):
+    if v is None or v == "":
+        return f"<c{estilo}/>"
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return f"<c{estilo}><v>{v}</v></c>"
+    texto = escape(_XML_INVALIDO.sub("", str(_valor(v))))
+    espacio = ' xml:space="preserve"' if texto != texto.strip() else ""
+    return f'<c{estilo} t="inlineStr"><is><t{espacio}>{texto}</t></is></c>'
+
+def _hoja(filas, campos):
+    cols = "".join(f'<col min="{i}" max="{i}" width="{_ANCHOS[c]}" customWidth="1"/>'
+                   for i, c in enumerate(campos, start=1))
+    # Fila de títulos fija al desplazarse
+    partes = [_XML, f"<worksheet {_NS}><sheetViews><sheetView workbookViewId=\"0\">"
+              '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+              f"</sheetView></sheetViews><cols>{cols}</cols><sheetData>",
+              "<row>" + "".join(_celda(TITULOS[c], ' s="1"') for c in campos) + "</row>"]
+    for i, fila in enumerate(filas, start=1):
+        partes.append("<row>" + "".join(_celda(fila[c]) for c in campos) + "</row>")
+        if i % FILAS_POR_CHUNK == 0:
+            yield "".join(partes).encode("utf-8")
+            partes = []
+    partes.append("</sheetData></worksheet>")
+    yield "".join(partes).encode("utf-8")
+
+def xlsx_stream(filas, campos):
+    entries = [(name, data.encode("utf-8")) for name, data in _ESTATICOS.items()]
+    entries.append(("xl/worksheets/sheet1.xml", _hoja(filas, campos)))
+    return stream_zip(entries, compression=zipfile.ZIP_DEFLATED)
@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import request, send_from_directory, Response
+
+# Archivos estáticos con el hash del contenido en el nombre
+# (style.css -> style.3f2a9c1b7d0e.css), calculados una vez al arrancar.
+# url_for("static", filename="style.css") devuelve el nombre con hash, así los
+# templates no cambian; esas URLs se sirven con cache "immutable" de un año,
+# porque si el archivo cambia cambia la URL. Los archivos de texto se
+# comprimen en memoria (gzip y, si está instalado el paquete `brotli`, br) y
+# se elige la variante según Accept-Encoding. Los nombres sin hash se siguen
+# sirviendo como siempre (SEND_FILE_MAX_AGE_DEFAULT).
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml", ".map"}
+MIN_COMPRESS_BYTES = 512
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+class StaticAsset:
+    __slots__ = ("filename", "hashed", "digest", "mimetype", "encoded")
+
+    def __init__(self, filename, hashed, digest, mimetype):
+        self.filename = filename
+        self.hashed = hashed
+        self.digest = digest
+        self.mimetype = mimetype
+        self.encoded = {}  # encoding -> bytes
+
+class StaticAssets:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.by_filename = {}
+        self.by_hashed = {}
+        self.scan()
+
+    def scan(self):
+        brotli = _brotli()
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, "/")
+                with open(path, "rb") as fh:
+                    data = fh.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                base, ext = os.path.splitext(filename)
+                mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = StaticAsset(filename, f"{base}.{digest}{ext}", digest, mimetype)
+                if ext.lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+                    # Sólo se guarda la variante si ahorra al menos un 10%
+                    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+                    if brotli is not None:
+                        variants["br"] = brotli.compress(data, quality=11)
+                    asset.encoded = {enc: body for enc, body in variants.items() if len(body) < len(data) * 0.9}
+                self.by_filename[filename] = asset
+                self.by_hashed[asset.hashed] = asset
+
+    def url_filename(self, filename):
+        asset = self.by_filename.get(filename)
+        return asset.hashed if asset is not None else filename
+
+    def stats(self):
+        return {"archivos": len(self.by_filename),
+                "comprimidos": sum(1 for a in self.by_filename.values() if a.encoded)}
+
+def _pick_encoding(asset):
+    # La variante disponible con mayor q en Accept-Encoding; br antes que gzip
+    best, best_q = None, 0
+    for encoding in ("br", "gzip"):
+        if encoding in asset.encoded:
+            q = request.accept_encodings[encoding]
+            if q > best_q:
+                best, best_q = encoding, q
+    return best
+
+def serve_asset(assets, filename):
+    asset = assets.by_hashed.get(filename)
+    if asset is None:
+        return send_from_directory(assets.static_folder, filename)
+    encoding = _pick_encoding(asset)
+    if encoding is None:
+        resp = send_from_directory(assets.static_folder, asset.filename, max_age=IMMUTABLE_MAX_AGE,
+                                   etag=asset.digest, mimetype=asset.mimetype)
+    else:
+        resp = Response(asset.encoded[encoding], mimetype=asset.mimetype)
+        resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(f"{asset.digest}-{encoding}")
+        resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+        resp.make_conditional(request)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    if asset.encoded:
+        resp.vary.add("Accept-Encoding")
+    return resp
+
+def init_static_assets(app):
+    if not app.config.get("STATIC_FINGERPRINT"):
+        return None
+    assets = app.extensions["static_assets"] = StaticAssets(app.static_folder)
+
+    @app.url_defaults
+    def _fingerprint(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = assets.url_filename(values["filename"])
+
+    app.view_functions["static"] = lambda filename: serve_asset(assets, filename)
+    return assets
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from app.config import Config
+from app.utils.qr_generator import get_ticket_renderer
+
+# Cache de imágenes de tickets direccionado por contenido: la clave es un
+# hash de todo lo que entra al render (URL del QR, textos, número) más la
+# huella del template y las fuentes, así que nunca hay que invalidar. Un
+# nivel en memoria (LRU acotado por bytes) por proceso y, opcional, un
+# directorio compartido entre workers de gunicorn, también acotado por bytes:
+# cada proceso suma lo que escribe y, al pasarse del tope, recorre el
+# directorio y borra por mtime (un acierto en disco la renueva) hasta quedar
+# en el 90%.
+
+def ticket_cache_key(fingerprint, qr_url, nombre, evento, telefono, numero, formato="png"):
+    raw = json.dumps([fingerprint, formato, qr_url, nombre, evento, telefono, numero],
+                     ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class TicketImageCache:
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_bytes = None
+        self._disk_lock = threading.Lock()
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previo = self._items.pop(key, None)
+            if previo is not None:
+                self._bytes -= len(previo)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, viejo = self._items.popitem(last=False)
+                self._bytes -= len(viejo)
+                self._stats["evictions"] += 1
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+                return data
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as fh:
+                    data = fh.read()
+            except OSError:
+                data = None
+            if data:
+                try:
+                    os.utime(self._disk_path(key))
+                except OSError:
+                    pass
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                self._remember(key, data)
+                return data
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.disk_dir:
+            # Escritura atómica: otro worker nunca ve un archivo a medias
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                return
+            self._disk_written(len(data))
+
+    def _disk_written(self, size):
+        if not self.disk_max_bytes:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+                if self._disk_bytes <= self.disk_max_bytes:
+                    return
+        # Un solo hilo por proceso recorre el directorio; los demás siguen
+        if self._disk_lock.acquire(blocking=False):
+            try:
+                self._prune_disk()
+            finally:
+                self._disk_lock.release()
+
+    def _prune_disk(self):
+        entries = []
+        try:
+            for sub in os.scandir(self.disk_dir):
+                if sub.is_dir():
+                    for e in os.scandir(sub.path):
+                        if e.is_file() and not e.name.startswith("tmp"):
+                            st = e.stat()
+                            entries.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        if total > self.disk_max_bytes:
+            entries.sort()
+            objetivo = self.disk_max_bytes * 0.9
+            borrados = 0
+            for _, size, path in entries:
+                if total <= objetivo:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                borrados += 1
+            with self._lock:
+                self._stats["disk_evictions"] += borrados
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._items), bytes=self._bytes, max_bytes=self.max_bytes,
+                        disk_bytes=self._disk_bytes, disk_max_bytes=self.disk_max_bytes)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_ticket_cache() -> TicketImageCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TicketImageCache(Config.TICKET_CACHE_MAX_BYTES, Config.TICKET_CACHE_DIR,
+                                          Config.TICKET_CACHE_DIR_MAX_BYTES)
+    return _cache
+
+def ticket_key(qr_url, nombre, evento, telefono, numero, formato="png", calidad=None, background_href=None):
+    # Sirve de ETag: se calcula sin renderizar
+    variante = formato if formato == "png" else f"{formato}:{calidad}:{background_href or ''}"
+    return ticket_cache_key(get_ticket_renderer().fingerprint, qr_url, nombre, evento, telefono, numero, variante)
+
+def cached_ticket(qr_url, nombre, evento, telefono, numero, formato="png", calidad=None, background_href=None):
+    # Devuelve (clave, bytes), renderizando sólo si no estaba en cache
+    key = ticket_key(qr_url, nombre, evento, telefono, numero, formato, calidad, background_href)
+    cache = get_ticket_cache()
+    data = cache.get(key)
+    if data is None:
+        data = get_ticket_renderer().render(qr_url, nombre=nombre, evento=evento, telefono=telefono, numero=numero,
+                                            formato=formato, calidad=calidad, background_href=background_href)
+        cache.put(key, data)
+    return key, data
+
+def cached_ticket_png(qr_url, nombre, evento, telefono, numero):
+    return cached_ticket(qr_url, nombre, evento, telefono, numero)
@@ -0,0 +1,139 @@
+import hashlib
+import random
+import threading
+import time
+
+from app.config import Config
+from app.firebase import db as default_db
+
+# Un documento por evento con el último número entregado. Los números se
+# reservan incrementándolo dentro de una transacción, así dos registros
+# concurrentes nunca reciben el mismo `numero`.
+COUNTERS_COLLECTION = "contadores_eventos"
+
+def counter_ref(db, evento):
+    # El nombre del evento puede tener "/" u otros caracteres inválidos como id
+    doc_id = hashlib.sha1((evento or "").encode("utf-8")).hexdigest()
+    return db.collection(COUNTERS_COLLECTION).document(doc_id)
+
+def max_existing_number(db, evento, transaction=None):
+    from google.cloud import firestore
+    query = (db.collection("entradas")
+             .where("evento", "==", evento)
+             .order_by("numero", direction=firestore.Query.DESCENDING)
+             .limit(1))
+    for doc in query.stream(transaction=transaction):
+        return doc.to_dict().get("numero") or 0
+    return 0
+
+class TicketNumberAllocator:
+    def __init__(self, db, block_size=1, max_attempts=8, base_delay=0.05, max_delay=2.0):
+        self.db = db
+        self.block_size = max(1, block_size)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._blocks = {}
+        self._refill_locks = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"reservas": 0, "reintentos": 0, "agotados": 0, "espera_s": 0.0}
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _run(self, fn, *args):
+        # Reintentos propios con backoff exponencial y jitter (la transacción
+        # se crea con max_attempts=1) para poder medir la contención.
+        from google.api_core import exceptions as gexc
+        for attempt in range(self.max_attempts):
+            transaction = self.db.transaction(max_attempts=1)
+            try:
+                return fn(transaction, *args)
+            except (ValueError, gexc.Aborted, gexc.Conflict):
+                if attempt == self.max_attempts - 1:
+                    self._count("agotados")
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                self._count("reintentos")
+                self._count("espera_s", delay)
+                time.sleep(delay)
+
+    def reserve(self, evento, n=1):
+        # Reserva n números contiguos y devuelve el primero
+        from google.cloud import firestore
+        ref = counter_ref(self.db, evento)
+
+        @firestore.transactional
+        def increment(transaction, ref):
+            snap = ref.get(transaction=transaction)
+            if snap.exists:
+                ultimo = (snap.to_dict() or {}).get("ultimo_numero", 0)
+            else:
+                # Primer uso del contador: se siembra desde las entradas existentes
+                ultimo = max_existing_number(self.db, evento, transaction=transaction)
+            transaction.set(ref, {"evento": evento, "ultimo_numero": ultimo + n}, merge=True)
+            return ultimo + 1
+
+        first = self._run(increment, ref)
+        self._count("reservas")
+        return first
+
+    def next_number(self, evento):
+        # Entrega números desde el bloque reservado en memoria; sólo va a
+        # Firestore cuando el bloque se agota. Un único hilo por evento
+        # repone el bloque para no descartar números ya reservados.
+        if self.block_size == 1:
+            return self.reserve(evento, 1)
+        with self._lock:
+            refill_lock = self._refill_locks.setdefault(evento, threading.Lock())
+        with refill_lock:
+            block = self._blocks.get(evento)
+            if not block or block[0] >= block[1]:
+                first = self.reserve(evento, self.block_size)
+                block = self._blocks[evento] = [first, first + self.block_size]
+            numero = block[0]
+            block[0] += 1
+            return numero
+
+    def ensure_at_least(self, evento, numero):
+        # Sube el contador si quedó por debajo (p. ej. tras renumerar); nunca
+        # lo baja, porque otros procesos pueden tener bloques ya reservados.
+        from google.cloud import firestore
+        ref = counter_ref(self.db, evento)
+
+        @firestore.transactional
+        def raise_counter(transaction, ref):
+            snap = ref.get(transaction=transaction)
+            ultimo = (snap.to_dict() or {}).get("ultimo_numero", 0) if snap.exists else 0
+            if ultimo < numero:
+                transaction.set(ref, {"evento": evento, "ultimo_numero": numero}, merge=True)
+
+        self._run(raise_counter, ref)
+
+def seed_counters(db):
+    # Migración única: crea o corrige los contadores a partir de las entradas
+    # existentes. Idempotente; nunca baja un contador.
+    maximos = {}
+    for doc in db.collection("entradas").select(["evento", "numero"]).stream():
+        d = doc.to_dict() or {}
+        evento = d.get("evento")
+        if not evento:
+            continue
+        maximos[evento] = max(maximos.get(evento, 0), d.get("numero") or 0)
+    allocator = TicketNumberAllocator(db)
+    for evento, maximo in maximos.items():
+        allocator.ensure_at_least(evento, maximo)
+    return maximos
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+def get_allocator() -> TicketNumberAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = TicketNumberAllocator(default_db, block_size=Config.TICKET_NUMBER_BLOCK_SIZE)
+    return _allocator
@@ -0,0 +1,105 @@
+from collections import deque
+
+from app.utils.pdf_stream import PdfStream, A4, standard_fonts, jpeg_xobject, pdf_string, num
+from app.utils.qr_generator import get_ticket_renderer
+from app.utils.render_pool import get_render_pool, render_pool_workers, imap_bounded, _render_pdf_tile
+
+# Pliegos A4 para imprimir tickets: N por hoja, con marcas de corte. Cada
+# ticket es vectorial (QR y textos) sobre el template, que se embebe una sola
+# vez para todo el documento. Los tiles se arman en el pool de procesos y
+# cada página se envía apenas está completa.
+
+# tickets por hoja -> (columnas, filas)
+GRILLAS = {1: (1, 1), 2: (2, 1), 4: (2, 2), 9: (3, 3)}
+MARGEN = 28
+MEDIANIL = 14
+MARCA = 6
+
+def _template_xobject(pdf, renderer):
+    template = renderer.template_jpeg()
+    if template is None:
+        return b"", ""
+    data, obj_id = jpeg_xobject(pdf, *template)
+    return data, f"/XObject<</Tpl {obj_id} 0 R>>"
+
+def _celdas(por_hoja, aspecto):
+    # (x, y, ancho, alto) de cada celda, de arriba a la izquierda hacia abajo
+    cols, filas = GRILLAS[por_hoja]
+    ancho_util, alto_util = A4[0] - 2 * MARGEN, A4[1] - 2 * MARGEN - 14
+    w = min((ancho_util - (cols - 1) * MEDIANIL) / cols,
+            (alto_util - (filas - 1) * MEDIANIL) / filas * aspecto)
+    h = w / aspecto
+    x0 = (A4[0] - (cols * w + (cols - 1) * MEDIANIL)) / 2
+    y_top = A4[1] - MARGEN - (alto_util - (filas * h + (filas - 1) * MEDIANIL)) / 2
+    return [(x0 + c * (w + MEDIANIL), y_top - (f + 1) * h - f * MEDIANIL, w, h)
+            for f in range(filas) for c in range(cols)]
+
+def _marcas_de_corte(x, y, w, h):
+    ops = []
+    for cx in (x, x + w):
+        for cy in (y, y + h):
+            dx = -1 if cx == x else 1
+            dy = -1 if cy == y else 1
+            ops.append(f"{num(cx + dx)} {num(cy)} m {num(cx + dx * (1 + MARCA))} {num(cy)} l")
+            ops.append(f"{num(cx)} {num(cy + dy)} m {num(cx)} {num(cy + dy * (1 + MARCA))} l")
+    return ops
+
+def _pagina(tiles, celdas, pie):
+    ops = ["0 G 0.25 w"]
+    for (x, y, w, h), (tile, error, numero) in zip(celdas, tiles):
+        ops.extend(_marcas_de_corte(x, y, w, h))
+        ops.append("S")
+        if tile is None:
+            ops.append(f"BT /F1 10 Tf {num(x + 8)} {num(y + h / 2)} Td "
+                       + pdf_string(f"Ticket {numero}: no se pudo generar ({error})").decode("latin-1") + " Tj ET")
+            continue
+        (W, H), tile_ops = tile
+        escala = min(w / W, h / H)
+        ox, oy = x + (w - W * escala) / 2, y + (h - H * escala) / 2
+        ops.append(f"q {escala:.6f} 0 0 {escala:.6f} {num(ox)} {num(oy)} cm")
+        ops.append(tile_ops.decode("latin-1"))
+        ops.append("Q")
+    ops.append(f"0 g BT /F1 8 Tf {MARGEN} {MARGEN / 2} Td " + pdf_string(pie).decode("latin-1") + " Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+def ticket_sheets_pdf(jobs, por_hoja=4, titulo="Tickets", static_folder=None):
+    # jobs: iterable de (qr_url, nombre, evento, telefono, numero), ya en el
+    # orden de impresión. Generador de bytes del PDF.
+    if por_hoja not in GRILLAS:
+        raise ValueError(f"Tickets por hoja no soportado: {por_hoja}")
+    renderer = get_ticket_renderer(static_folder)
+    pdf = PdfStream()
+    yield pdf.header()
+    pages_id, catalog_id = pdf.reserve(), pdf.reserve()
+    fonts, font_res = standard_fonts(pdf)
+    tpl, tpl_res = _template_xobject(pdf, renderer)
+    yield fonts + tpl
+    resources = f"<<{font_res}{tpl_res}>>"
+
+    W, H = renderer.layout("", "", "", 0)["size"]
+    celdas = _celdas(por_hoja, W / H)
+    pool = get_render_pool()
+
+    numeros = deque()
+    def con_numero(items):
+        for job in items:
+            numeros.append(job[4])
+            yield job
+
+    pendientes = []
+    resultados = imap_bounded(pool, _render_pdf_tile, con_numero(jobs), window=render_pool_workers() * 4)
+    for tile, error in resultados:
+        pendientes.append((tile, error, numeros.popleft()))
+        if len(pendientes) == por_hoja:
+            yield _emitir(pdf, pages_id, resources, pendientes, celdas, titulo)
+            pendientes = []
+    if pendientes or not pdf.page_ids:
+        yield _emitir(pdf, pages_id, resources, pendientes, celdas, titulo)
+    yield pdf.finish(pages_id, catalog_id, {"Title": titulo, "Producer": "QR Pass"})
+
+def _emitir(pdf, pages_id, resources, pendientes, celdas, titulo):
+    rango = ""
+    if pendientes:
+        rango = f" - N° {pendientes[0][2]} a {pendientes[-1][2]}"
+    pie = f"{titulo}{rango} - hoja {len(pdf.page_ids) + 1}"
+    return pdf.page(pages_id, _pagina(pendientes, celdas, pie), resources)
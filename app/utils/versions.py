@@ -0,0 +1,95 @@
+import hashlib
+import threading
+import uuid
+
+# Versión de las entradas de cada evento: un contador que sube con cada
+# escritura a `entradas` (en el mismo batch o transacción que la escritura).
+# Sirve como clave de cache de los exports: si ninguna versión cambió, el
+# resultado es el mismo. Escrituras hechas por fuera de la app (consola) no
+# la suben.
+VERSIONS_COLLECTION = "versiones_entradas"
+# Lo mismo por colección entera, para las que no van por evento (`eventos`)
+COLLECTION_VERSIONS = "versiones_colecciones"
+
+# Escrituras propias de este proceso, por evento o colección. Las páginas
+# leen las versiones del espejo (ver page_versions), que se entera de una
+# escritura recién cuando llega el listener; estos contadores hacen que el
+# redirect después de un POST ya vea otra versión.
+_EPOCA = uuid.uuid4().hex[:8]
+_locales = {}
+_locales_lock = threading.Lock()
+
+def _note_local(clave):
+    with _locales_lock:
+        _locales[clave] = _locales.get(clave, 0) + 1
+        _locales[None] = _locales.get(None, 0) + 1
+
+def version_ref(db, evento):
+    doc_id = hashlib.sha1((evento or "").encode("utf-8")).hexdigest()
+    return db.collection(VERSIONS_COLLECTION).document(doc_id)
+
+def collection_version_ref(db, coleccion):
+    return db.collection(COLLECTION_VERSIONS).document(coleccion)
+
+def bump_version(writer, db, evento, n=1):
+    # writer: WriteBatch o Transaction
+    from google.cloud import firestore
+    writer.set(version_ref(db, evento), {"evento": evento or "", "version": firestore.Increment(n)}, merge=True)
+    _note_local(("evento", evento or ""))
+
+def bump_versions(writer, db, eventos):
+    for evento in set(eventos):
+        bump_version(writer, db, evento)
+
+def bump_collection_version(writer, db, coleccion):
+    from google.cloud import firestore
+    writer.set(collection_version_ref(db, coleccion), {"coleccion": coleccion, "version": firestore.Increment(1)},
+               merge=True)
+    _note_local(("coleccion", coleccion))
+
+def _hash(versiones):
+    return hashlib.sha256(repr(versiones).encode("utf-8")).hexdigest()[:24]
+
+def versions_key(db, evento=None) -> str:
+    # Huella de las versiones relevantes: las de un evento o las de todos
+    if evento:
+        snap = version_ref(db, evento).get()
+        versiones = [(evento, (snap.to_dict() or {}).get("version", 0) if snap.exists else 0)]
+    else:
+        versiones = sorted(((d.to_dict() or {}).get("evento", ""), (d.to_dict() or {}).get("version", 0))
+                           for d in db.collection(VERSIONS_COLLECTION).stream())
+    return _hash(versiones)
+
+def page_versions(db, evento=None, colecciones=()) -> str:
+    # Como versions_key pero para el cache HTTP de las páginas: lee del espejo
+    # de las versiones si está conectado (sin leer documentos) y suma las
+    # escrituras propias todavía no vistas por el listener. No sirve como
+    # clave persistente (los exports en disco siguen con versions_key).
+    from app.utils.firestore_cache import live_mirror
+    entradas = live_mirror(VERSIONS_COLLECTION)
+    if entradas is None:
+        base = versions_key(db, evento)
+    elif evento:
+        base = _hash([(evento, max((r.version for r in entradas.records() if r.clave == evento), default=0))])
+    else:
+        base = _hash(sorted((r.clave, r.version) for r in entradas.records()))
+    partes = [base]
+    if colecciones:
+        espejo = live_mirror(COLLECTION_VERSIONS)
+        for coleccion in colecciones:
+            if espejo is not None:
+                version = next((r.version for r in espejo.records() if r.clave == coleccion), 0)
+            else:
+                snap = collection_version_ref(db, coleccion).get()
+                version = (snap.to_dict() or {}).get("version", 0) if snap.exists else 0
+            partes.append((coleccion, version))
+    with _locales_lock:
+        if evento:
+            locales = [_locales.get(("evento", evento), 0)]
+        else:
+            locales = [_locales.get(None, 0)]
+        locales += [_locales.get(("coleccion", c), 0) for c in colecciones]
+    if any(locales):
+        # Sólo con escrituras propias la huella depende del proceso
+        partes.append((_EPOCA, locales))
+    return _hash(partes)
@@ -0,0 +1,60 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Calentamiento opcional de un worker: hace por adelantado lo que si no
+# pagaría el primer request (imports de Google, canal gRPC, listeners de los
+# mirrors, índice de búsqueda, templates de Jinja, template y fuentes del ticket, procesos del
+# pool de render). Cada paso es independiente; un paso que falla se informa
+# y no corta los demás.
+
+def _firestore():
+    from app.firebase import db
+    # La primera RPC abre el canal gRPC
+    list(db.collection("eventos").limit(1).stream())
+
+def _auth():
+    from app.firebase import get_auth
+    get_auth()
+
+def _mirrors():
+    from app.utils.firestore_cache import MIRRORED, get_mirror
+    for collection in MIRRORED:
+        get_mirror(collection)
+
+def _search_index():
+    from app.utils.search_index import INDEXES, get_search_index
+    for collection in INDEXES:
+        get_search_index(collection)
+
+def _templates():
+    from flask import current_app
+    env = current_app.jinja_env
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+
+def _renderer():
+    # Un render descartable carga template, fuentes, qrcode y el encoder PNG
+    from app.utils.qr_generator import get_ticket_renderer
+    get_ticket_renderer().render("warmup", "", "", "")
+
+def _render_pool():
+    from app.utils.render_pool import get_render_pool, render_pool_workers, _warm_worker
+    list(get_render_pool().map(_warm_worker, range(render_pool_workers())))
+
+def warm_up(app):
+    # Devuelve {paso: ms} o {paso: "error: ..."}
+    pasos = [("firestore", _firestore), ("auth", _auth), ("mirrors", _mirrors),
+             ("search_index", _search_index), ("templates", _templates), ("renderer", _renderer), ("render_pool", _render_pool)]
+    resultado = {}
+    with app.app_context():
+        for nombre, paso in pasos:
+            inicio = time.perf_counter()
+            try:
+                paso()
+                resultado[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+            except Exception as e:
+                logger.warning("Warm-up %s falló: %s", nombre, e)
+                resultado[nombre] = f"error: {e}"
+    return resultado
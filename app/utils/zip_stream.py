@@ -0,0 +1,50 @@
+import io
+import zipfile
+
+class _ChunkSink(io.RawIOBase):
+    # Destino no seekable para ZipFile: acumula lo escrito hasta que el
+    # generador lo entrega a la respuesta.
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED):
+    # entries: iterable de (nombre, bytes). Cada archivo se emite en cuanto se
+    # escribe, así el ZIP empieza a descargarse antes de tener todo el contenido.
+    # Por defecto sin compresión: los PNG ya vienen comprimidos.
+    # En lugar de bytes puede venir un iterable de chunks: el archivo se
+    # escribe de a partes (tamaños en el data descriptor) sin armarlo entero.
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as zf:
+        for name, data in entries:
+            if isinstance(data, (bytes, bytearray, str)):
+                zf.writestr(name, data)
+            else:
+                with zf.open(name, mode="w") as fh:
+                    for part in data:
+                        fh.write(part)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
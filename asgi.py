@@ -0,0 +1,5 @@
+from app.asgi import create_asgi_app
+
+# Modo asyncio (ver app/asgi.py):
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 1
+app = create_asgi_app()
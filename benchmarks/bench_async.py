@@ -0,0 +1,217 @@
+# Comparación de carga de los dos modos de servicio en los endpoints del
+# escáner: hilos (wsgi.py, como gunicorn --threads) contra asyncio (asgi.py,
+# ver app/asgi.py), contra Firestore en memoria (benchmarks/fake_firebase.py)
+# con latencia simulada en cada RPC. Sin latencia no hay I/O que esperar y la
+# comparación no dice nada.
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.bench_async
+#   python -m benchmarks.bench_async --latencia-rpc-ms 50 --concurrencias 24,200 --escenarios verificar_usar
+#
+# El modo hilos se modela como gunicorn gthread: a lo sumo --hilos requests
+# dentro de la app a la vez; el resto espera turno y esa espera cuenta en la
+# latencia. El modo asyncio corre la app ASGI en un event loop. Los dos se
+# llaman directo (environ WSGI / scope ASGI armados a mano, sin cliente HTTP
+# de por medio), así se mide la app y no el cliente. Cada combinación corre
+# en un subproceso recién sembrado.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+ENTRADAS = 2000
+# Peticiones sin medir antes de cada corrida (primeros renders, plantillas)
+CALENTAMIENTO = 200
+
+# --- escenarios: (ids, random) -> (método, url, datos) ---
+
+def esc_verificar(ids, rnd):
+    return "GET", f"/verificar?id={rnd.choice(ids)}", None
+
+def esc_verificar_usar(ids, rnd):
+    return "POST", "/verificar/usar", {"entrada_id": rnd.choice(ids)}
+
+def esc_descargar(ids, rnd):
+    # Pocos ids (caben en el cache de tickets): mide la lectura, no el render
+    return "GET", f"/descargar/{rnd.choice(ids[:50])}", None
+
+ESCENARIOS = ["verificar", "verificar_usar", "descargar"]
+
+def _resumen(resultados, duracion, rpcs):
+    from benchmarks.bench_load import percentil
+    latencias = [dt * 1000 for dt, _ in resultados]
+    return {
+        "peticiones": len(resultados),
+        "errores": sum(1 for _, ok in resultados if not ok),
+        "rps": round(len(resultados) / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50), 1),
+        "p99_ms": round(percentil(latencias, 99), 1),
+        "rpc_por_peticion": round(rpcs / len(resultados), 2),
+    }
+
+def _peticion(fn, ids, i, cookie):
+    # (método, path, query, cuerpo, headers)
+    metodo, url, datos = fn(ids, random.Random(i))
+    path, _, query = url.partition("?")
+    headers = [("cookie", f"session={cookie}"), ("host", "localhost")]
+    cuerpo = b""
+    if datos is not None:
+        cuerpo = urlencode(datos).encode()
+        headers.append(("content-type", "application/x-www-form-urlencoded"))
+    return metodo, path, query, cuerpo, headers
+
+def correr_hilos(flask_app, cookie, store, fn, ids, peticiones, concurrencia, hilos):
+    # gunicorn gthread: --hilos requests a la vez dentro de la app
+    from app.asgi import build_environ
+    semaforo = threading.BoundedSemaphore(hilos)
+
+    def una(i):
+        metodo, path, query, cuerpo, headers = _peticion(fn, ids, i, cookie)
+        inicio = time.perf_counter()
+        estado = []
+        try:
+            environ = build_environ({"method": metodo, "path": path, "query_string": query.encode(),
+                                     "headers": [(k.encode(), v.encode()) for k, v in headers]}, cuerpo)
+            with semaforo:
+                b"".join(flask_app(environ, lambda status, h, exc_info=None: estado.append(status)))
+            ok = estado[0].startswith("200")
+        except Exception as e:
+            print(f"  error: {e!r}", file=sys.stderr)
+            ok = False
+        return time.perf_counter() - inicio, ok
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(-max(concurrencia, CALENTAMIENTO), 0)))
+        rpcs = store.rpc_count
+        inicio = time.perf_counter()
+        resultados = list(pool.map(una, range(peticiones)))
+    return _resumen(resultados, time.perf_counter() - inicio, store.rpc_count - rpcs)
+
+async def correr_asyncio(asgi_app, cookie, store, fn, ids, peticiones, concurrencia):
+    async def una(i):
+        metodo, path, query, cuerpo, headers = _peticion(fn, ids, i, cookie)
+        scope = {"type": "http", "method": metodo, "path": path, "query_string": query.encode(),
+                 "headers": [(k.encode(), v.encode()) for k, v in headers], "http_version": "1.1",
+                 "scheme": "http", "server": ("localhost", 80)}
+        recibido, estado = [], []
+        fin = asyncio.Event()
+
+        async def receive():
+            if not recibido:
+                recibido.append(True)
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            await fin.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                estado.append(message["status"])
+            elif not message.get("more_body"):
+                fin.set()
+
+        inicio = time.perf_counter()
+        try:
+            await asgi_app(scope, receive, send)
+            ok = estado == [200]
+        except Exception as e:
+            print(f"  error: {e!r}", file=sys.stderr)
+            ok = False
+        return time.perf_counter() - inicio, ok
+
+    async def conexion(cola, resultados):
+        while cola:
+            resultados.append(await una(cola.pop()))
+
+    async def tanda(numeros):
+        cola, resultados = list(numeros), []
+        await asyncio.gather(*(conexion(cola, resultados) for _ in range(concurrencia)))
+        return resultados
+
+    await tanda(range(-max(concurrencia, CALENTAMIENTO), 0))
+    rpcs = store.rpc_count
+    inicio = time.perf_counter()
+    resultados = await tanda(range(peticiones))
+    return _resumen(resultados, time.perf_counter() - inicio, store.rpc_count - rpcs)
+
+def correr_uno(args):
+    # Subproceso: configura el entorno antes de importar la app
+    tmp = tempfile.mkdtemp(prefix="bench_async_")
+    os.environ.update({
+        "FLASK_DEBUG": "0",
+        "REDEMPTION_LOG_PATH": os.path.join(tmp, "canjes.jsonl"),
+        "EXPORT_CACHE_DIR": os.path.join(tmp, "exports"),
+        "ASGI_WSGI_THREADS": str(args.hilos),
+    })
+    from benchmarks import fake_firebase
+    from benchmarks.bench_load import sembrar
+    fake = fake_firebase.install()
+
+    from app import create_app
+    flask_app = create_app()
+    ids = sembrar(fake.client, ENTRADAS)
+    fake.store.rpc_latency = args.latencia_rpc_ms / 1000
+    cookie = fake.auth.make_cookie("bench", "bench@example.com")
+    fn = globals()[f"esc_{args.escenario}"]
+    if args.modo == "hilos":
+        return correr_hilos(flask_app, cookie, fake.store, fn, ids, args.peticiones, args.concurrencia, args.hilos)
+    from app.asgi import create_asgi_app
+    return asyncio.run(correr_asyncio(create_asgi_app(flask_app), cookie, fake.store, fn, ids,
+                                      args.peticiones, args.concurrencia))
+
+def imprimir(resultados):
+    columnas = ("peticiones", "errores", "rps", "p50_ms", "p99_ms", "rpc_por_peticion")
+    titulos = ("pet", "err", "req/s", "p50 ms", "p99 ms", "rpc/pet")
+    for escenario, filas in resultados.items():
+        print(f"\n{escenario}")
+        print(f"  {'modo':<10}{'clientes':>9}" + "".join(f"{t:>10}" for t in titulos))
+        for (modo, concurrencia), valores in filas.items():
+            print(f"  {modo:<10}{concurrencia:>9}" + "".join(f"{valores[c]:>10}" for c in columnas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Modo hilos contra modo asyncio en los endpoints del escáner")
+    parser.add_argument("--concurrencias", default="24,100,400", help="clientes simultáneos, separados por coma")
+    parser.add_argument("--hilos", type=int, default=24, help="--threads de gunicorn en el modo hilos")
+    parser.add_argument("--latencia-rpc-ms", type=float, default=30.0)
+    parser.add_argument("--peticiones", type=int, default=1000)
+    parser.add_argument("--escenarios", default="", help="lista separada por comas (por defecto todos)")
+    parser.add_argument("--guardar", metavar="ARCHIVO", help="resultados en JSON")
+    parser.add_argument("--modo", choices=("hilos", "asyncio"), help=argparse.SUPPRESS)
+    parser.add_argument("--escenario", help=argparse.SUPPRESS)
+    parser.add_argument("--concurrencia", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        print(json.dumps(correr_uno(args)))
+        return
+
+    escenarios = [e for e in args.escenarios.split(",") if e] or ESCENARIOS
+    resultados = {}
+    for escenario in escenarios:
+        resultados[escenario] = {}
+        for concurrencia in [int(c) for c in args.concurrencias.split(",") if c]:
+            for modo in ("hilos", "asyncio"):
+                cmd = [sys.executable, "-m", "benchmarks.bench_async", "--modo", modo, "--escenario", escenario,
+                       "--concurrencia", str(concurrencia), "--hilos", str(args.hilos),
+                       "--latencia-rpc-ms", str(args.latencia_rpc_ms), "--peticiones", str(args.peticiones)]
+                salida = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True).stdout
+                valores = json.loads(salida.strip().splitlines()[-1])
+                resultados[escenario][(modo, concurrencia)] = valores
+                print(f"{escenario} {modo} x{concurrencia}: {valores}", file=sys.stderr)
+    imprimir(resultados)
+
+    if args.guardar:
+        with open(args.guardar, "w") as fh:
+            json.dump({"latencia_rpc_ms": args.latencia_rpc_ms, "hilos": args.hilos,
+                       "resultados": {e: [dict(v, modo=m, clientes=c) for (m, c), v in filas.items()]
+                                      for e, filas in resultados.items()}}, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Benchmark de los exports CSV/XLSX: tiempo, tamaño y pico de memoria.
+# Uso (desde la raíz del repo): python -m benchmarks.bench_export [filas]
+#
+# Las filas se generan en el momento (como llegarían página por página de
+# Firestore), así se mide sólo la serialización. "en memoria" arma el archivo
+# entero antes de enviarlo, como haría un export sin streaming.
+import sys
+import time
+import tracemalloc
+import uuid
+
+from app.utils.spreadsheet import TITULOS, csv_stream, xlsx_stream
+
+CAMPOS = tuple(TITULOS)
+
+def filas(n, campos):
+    for i in range(n):
+        fila = {
+            "numero": i + 1,
+            "evento": f"Evento {i % 7}",
+            "nombre": f"Invitado Número {i} Peña",
+            "telefono": f"+54 9 11 {5000_0000 + i}",
+            "estado": "usado" if i % 3 == 0 else "valido",
+            "creada_en": "2025-03-01T18:30:00.000000Z",
+            "usada_en": "2025-03-02T01:10:00.000000Z" if i % 3 == 0 else None,
+            "id": str(uuid.UUID(int=i)),
+        }
+        yield {c: fila[c] for c in campos}
+
+def consume(make_chunks, materializar):
+    if materializar:
+        return len(b"".join(make_chunks()))
+    return sum(len(chunk) for chunk in make_chunks())
+
+def measure(label, n, make_chunks, materializar=False):
+    # Tiempo y memoria en pasadas separadas: tracemalloc hace todo más lento
+    start = time.perf_counter()
+    total = consume(make_chunks, materializar)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    consume(make_chunks, materializar)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<20} {elapsed:6.2f} s  {n / elapsed:>9,.0f} filas/s  {total / 1e6:7.2f} MB  pico {pico / 1e6:7.2f} MB")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    proyeccion = ("numero", "nombre", "telefono")
+    print(f"{n} filas")
+    for formato, stream in (("csv", csv_stream), ("xlsx", xlsx_stream)):
+        measure(f"{formato} streaming", n, lambda: stream(filas(n, CAMPOS), CAMPOS))
+        measure(f"{formato} en memoria", n, lambda: stream(list(filas(n, CAMPOS)), CAMPOS), materializar=True)
+        measure(f"{formato} 3 columnas", n, lambda: stream(filas(n, proyeccion), proyeccion))
+
+if __name__ == "__main__":
+    main()
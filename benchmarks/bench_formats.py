@@ -0,0 +1,46 @@
+# Tamaño y tiempo de encode de cada formato de ticket, y verificación de que
+# el QR llega intacto (el chequeo con asserts es benchmarks/check_qr_roundtrip.py).
+# Uso (desde la raíz del repo): python -m benchmarks.bench_formats [iteraciones]
+import io
+import sys
+import time
+
+from PIL import Image
+
+from app.utils.qr_generator import TicketRenderer, FORMATOS, qr_image, qr_matrix
+from benchmarks.bench_render import STATIC, SAMPLE
+from benchmarks.check_qr_roundtrip import leer_qr
+
+def qr_check(renderer, formato, data):
+    # "exacto": los píxeles del QR son idénticos al QR de referencia.
+    # "módulos": la matriz leída del archivo coincide (ver check_qr_roundtrip).
+    esperado = [[bool(v) for v in row] for row in qr_matrix(SAMPLE["qr_url"])]
+    if leer_qr(renderer, formato, data) != esperado:
+        return "ERROR"
+    if formato in ("svg", "pdf"):
+        return "vectorial"
+    x, y, size = renderer.layout(SAMPLE["nombre"], SAMPLE["evento"], SAMPLE["telefono"], SAMPLE["numero"])["qr"]
+    got = Image.open(io.BytesIO(data)).convert("L").crop((x, y, x + size, y + size))
+    return "exacto" if got.tobytes() == qr_image(SAMPLE["qr_url"], size).tobytes() else "módulos"
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    renderer = TicketRenderer(STATIC)
+    variantes = [("png", None), ("png8", None), ("webp", None), ("jpeg", 85), ("jpeg", 70),
+                 ("svg", None), ("pdf", None)]
+    assert {f for f, _ in variantes} == set(FORMATOS)
+    base = None
+    print(f"{'formato':<10} {'bytes':>9} {'vs png':>7} {'ms/ticket':>10}  qr")
+    for formato, calidad in variantes:
+        kwargs = dict(SAMPLE, formato=formato, calidad=calidad, background_href="ticketDDA.jpg")
+        data = renderer.render(**kwargs)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            renderer.render(**kwargs)
+        ms = (time.perf_counter() - start) / iterations * 1000
+        base = base or len(data)
+        label = formato if calidad is None else f"{formato}/{calidad}"
+        print(f"{label:<10} {len(data):>9} {len(data) / base:>6.0%} {ms:>10.1f}  {qr_check(renderer, formato, data)}")
+
+if __name__ == "__main__":
+    main()
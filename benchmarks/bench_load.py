@@ -0,0 +1,304 @@
+# Prueba de carga de la app completa (Flask real, cliente de test de
+# Werkzeug) contra Firestore y Auth en memoria (benchmarks/fake_firebase.py).
+# Siembra N entradas y corre cada escenario con varios hilos a la vez;
+# informa throughput, latencia p50/p99, RPCs a Firestore por petición y
+# pico de memoria (RSS) del proceso y cuánto creció sobre lo sembrado.
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.bench_load                        # 1k, 10k y 100k
+#   python -m benchmarks.bench_load --tamanios 1000 --guardar-base base.json
+#   python -m benchmarks.bench_load --tamanios 1000 --comparar base.json
+#
+# Cada escenario de cada tamaño corre en un subproceso propio recién
+# sembrado, así la memoria y los datos no arrastran lo de otro escenario. Con
+# --comparar, una métrica que empeora más que --tolerancia se marca como
+# regresión y el comando sale con código 1. El fake no tiene latencia de red:
+# --latencia-rpc-ms la simula en cada RPC. Los renders en el pool de procesos
+# no cuentan en la memoria del proceso principal.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EVENTOS = [f"Evento {i}" for i in range(10)]
+
+# (nombre, peticiones, concurrencia máxima)
+ESCENARIOS = [
+    ("lista", 200, None),
+    ("descargar_lista_pdf", 10, None),
+    ("descargar", 40, None),
+    ("verificar_usar", 300, None),
+    ("registrar", 200, None),
+    ("asignar_numeros", 3, 1),
+]
+
+# Métrica -> (más alto es mejor, diferencia mínima, multiplicador de la
+# tolerancia). Diferencias absolutas menores que el mínimo no cuentan (ruido
+# en latencias de pocos ms); el p99 es más ruidoso y tolera el doble, y con
+# menos de 100 peticiones (p99 = la más lenta) no se compara.
+METRICAS = {"rps": (True, 0.0, 1), "p50_ms": (False, 2.0, 1), "p99_ms": (False, 10.0, 2),
+            "incremento_rss_mb": (False, 5.0, 1), "rpc_por_peticion": (False, 0.5, 1)}
+
+# --- escenarios: (cliente, contexto, random) -> bool (respuesta correcta) ---
+
+def esc_lista(client, ctx, rnd):
+    r = client.get("/lista", query_string={"evento": rnd.choice(EVENTOS)})
+    return r.status_code == 200
+
+def esc_descargar_lista_pdf(client, ctx, rnd):
+    r = client.get("/descargar_lista_pdf", query_string={"evento": rnd.choice(EVENTOS)})
+    return r.status_code == 200 and r.get_data().startswith(b"%PDF")
+
+def esc_descargar(client, ctx, rnd):
+    r = client.get(f"/descargar/{rnd.choice(ctx['ids'])}")
+    return r.status_code == 200 and len(r.get_data()) > 0
+
+def esc_verificar_usar(client, ctx, rnd):
+    r = client.post("/verificar/usar", data={"entrada_id": rnd.choice(ctx["ids"])})
+    return r.status_code == 200
+
+def esc_registrar(client, ctx, rnd):
+    r = client.post("/registrar_entrada", data={
+        "evento": rnd.choice(EVENTOS),
+        "nombre": f"Carga {rnd.randrange(10 ** 6)}",
+        "telefono": f"+54 9 11 {rnd.randrange(10 ** 8):08d}",
+    })
+    return r.status_code == 200
+
+def esc_asignar_numeros(client, ctx, rnd):
+    # Dispara el trabajo y espera a que termine
+    r = client.post("/asignar_numeros", data={"evento": rnd.choice(EVENTOS)},
+                    headers={"Accept": "application/json"})
+    if r.status_code != 202:
+        return False
+    job_id = r.get_json()["id"]
+    while True:
+        estado = client.get(f"/asignar_numeros/{job_id}").get_json()["estado"]
+        if estado in ("completado", "error"):
+            return estado == "completado"
+        time.sleep(0.01)
+
+# --- medición ---
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class PicoRSS:
+    # Muestrea el RSS cada 10 ms mientras corre un escenario
+    def __init__(self):
+        self.inicial = self.pico = _rss_mb()
+        self._fin = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+
+    def _muestrear(self):
+        while not self._fin.wait(0.01):
+            self.pico = max(self.pico, _rss_mb())
+
+    def detener(self):
+        self._fin.set()
+        self._hilo.join()
+        self.pico = max(self.pico, _rss_mb())
+        return self.pico
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def correr(app, cookie, store, fn, peticiones, concurrencia, ctx):
+    local = threading.local()
+
+    def una(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+            client.set_cookie("session", cookie)
+        inicio = time.perf_counter()
+        try:
+            ok = fn(client, ctx, random.Random(i))
+        except Exception as e:
+            print(f"  error: {e!r}", file=sys.stderr)
+            ok = False
+        return time.perf_counter() - inicio, ok
+
+    # Calentamiento sin medir: arranque del pool de render, primeras
+    # plantillas, etc.
+    if peticiones >= 20:
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            list(pool.map(una, range(-concurrencia, 0)))
+
+    rss = PicoRSS()
+    rpcs = store.rpc_count
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        resultados = list(pool.map(una, range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    pico = rss.detener()
+    latencias = [dt * 1000 for dt, _ in resultados]
+    return {
+        "peticiones": peticiones,
+        "errores": sum(1 for _, ok in resultados if not ok),
+        "rps": round(peticiones / duracion, 2),
+        "p50_ms": round(percentil(latencias, 50), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+        "rpc_por_peticion": round((store.rpc_count - rpcs) / peticiones, 2),
+        "pico_rss_mb": round(pico, 1),
+        "incremento_rss_mb": round(pico - rss.inicial, 1),
+    }
+
+def sembrar(db, n):
+    # n entradas repartidas en los eventos, numeradas por evento en orden de
+    # creación; 10% ya usadas y 1% sin número (importaciones viejas)
+    for i, nombre in enumerate(EVENTOS):
+        db.collection("eventos").document(f"ev{i}").set({"nombre": nombre, "fecha_hora": "2025-12-31T22:00", "id": f"ev{i}"})
+    ids, numeros = [], dict.fromkeys(EVENTOS, 0)
+    batch = db.batch()
+    for i in range(n):
+        evento = EVENTOS[i % len(EVENTOS)]
+        entrada_id = f"{i:08d}-0000-4000-8000-000000000000"
+        data = {"evento": evento, "nombre": f"Invitado {i}", "telefono": f"+54 9 11 {i:08d}",
+                "id": entrada_id, "estado": "usado" if i % 10 == 0 else "valido",
+                "creada_en": f"2025-03-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}Z"}
+        if i % 100 != 99:
+            numeros[evento] += 1
+            data["numero"] = numeros[evento]
+        batch.set(db.collection("entradas").document(entrada_id), data)
+        ids.append(entrada_id)
+        if len(batch) == 500:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    # Estadísticas por evento ya recalculadas, como tras migrar
+    from app.utils.event_stats import reconcile_event
+    for evento in EVENTOS:
+        reconcile_event(db, evento)
+    return ids
+
+def correr_tamanio(args):
+    # Subproceso: configura el entorno antes de importar la app
+    tmp = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ.update({
+        "FLASK_DEBUG": "0",
+        "EXPORT_CACHE_DIR": os.path.join(tmp, "exports"),
+        "EXPORT_CACHE_MAX_FILES": "0",  # sin cache: cada PDF se genera
+        "REDEMPTION_LOG_PATH": os.path.join(tmp, "canjes.jsonl"),
+        "TICKET_CACHE_MAX_BYTES": "0",  # sin cache: cada descarga renderiza
+    })
+    from benchmarks import fake_firebase
+    fake = fake_firebase.install(rpc_latency=args.latencia_rpc_ms / 1000)
+
+    from app import create_app
+    app = create_app()
+    inicio = time.perf_counter()
+    ctx = {"ids": sembrar(fake.client, args.tamanio)}
+    print(f"[{args.tamanio}] sembrado en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    cookie = fake.auth.make_cookie("bench", "bench@example.com")
+
+    resultados = {}
+    for nombre, peticiones, maximo in ESCENARIOS:
+        if args.escenarios and nombre not in args.escenarios:
+            continue
+        peticiones = max(1, int(peticiones * args.escala))
+        concurrencia = min(args.concurrencia, maximo or args.concurrencia)
+        fn = globals()[f"esc_{nombre}"]
+        resultados[nombre] = correr(app, cookie, fake.store, fn, peticiones, concurrencia, ctx)
+        print(f"[{args.tamanio}] {nombre}: {resultados[nombre]}", file=sys.stderr)
+    return resultados
+
+# --- reporte y comparación ---
+
+def comparar(actual, base, tolerancia):
+    # Devuelve {(tamaño, escenario, métrica): (antes, ahora)} de las regresiones
+    regresiones = {}
+    for tamanio, escenarios in actual.items():
+        for escenario, valores in escenarios.items():
+            previos = base.get(tamanio, {}).get(escenario)
+            if not previos:
+                continue
+            for metrica, (mayor_mejor, minimo, factor) in METRICAS.items():
+                antes, ahora = previos.get(metrica), valores.get(metrica)
+                if antes is None or ahora is None:
+                    continue
+                if metrica == "p99_ms" and valores["peticiones"] < 100:
+                    continue
+                peor = antes - ahora if mayor_mejor else ahora - antes
+                if peor > minimo and peor > abs(antes) * tolerancia * factor:
+                    regresiones[(tamanio, escenario, metrica)] = (antes, ahora)
+    return regresiones
+
+def imprimir(resultados, regresiones):
+    columnas = ("peticiones", "errores", "rps", "p50_ms", "p99_ms", "rpc_por_peticion", "pico_rss_mb",
+                "incremento_rss_mb")
+    titulos = ("pet", "err", "req/s", "p50 ms", "p99 ms", "rpc/pet", "pico MB", "+MB")
+    for tamanio, escenarios in resultados.items():
+        print(f"\n{int(tamanio):,} entradas")
+        print(f"  {'escenario':<22}" + "".join(f"{t:>10}" for t in titulos))
+        for escenario, valores in escenarios.items():
+            celdas = []
+            for col in columnas:
+                marca = "!" if (tamanio, escenario, col) in regresiones else " "
+                celdas.append(f"{valores[col]:>9}{marca}")
+            print(f"  {escenario:<22}" + "".join(celdas))
+    for (tamanio, escenario, metrica), (antes, ahora) in sorted(regresiones.items()):
+        print(f"REGRESIÓN {tamanio} {escenario} {metrica}: {antes} -> {ahora}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga contra Firestore en memoria")
+    parser.add_argument("--tamanios", default="1000,10000,100000")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--escala", type=float, default=1.0, help="multiplica las peticiones de cada escenario")
+    parser.add_argument("--escenarios", default="", help="lista separada por comas (por defecto todos)")
+    parser.add_argument("--latencia-rpc-ms", type=float, default=0.0)
+    parser.add_argument("--guardar-base", metavar="ARCHIVO")
+    parser.add_argument("--comparar", metavar="ARCHIVO")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument("--tamanio", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.escenarios = [e for e in args.escenarios.split(",") if e]
+
+    if args.tamanio:
+        print(json.dumps(correr_tamanio(args)))
+        return
+
+    resultados = {}
+    for tamanio in [int(t) for t in args.tamanios.split(",") if t]:
+        resultados[str(tamanio)] = {}
+        for nombre, _, _ in ESCENARIOS:
+            if args.escenarios and nombre not in args.escenarios:
+                continue
+            cmd = [sys.executable, "-m", "benchmarks.bench_load", "--tamanio", str(tamanio),
+                   "--concurrencia", str(args.concurrencia), "--escala", str(args.escala),
+                   "--escenarios", nombre, "--latencia-rpc-ms", str(args.latencia_rpc_ms)]
+            salida = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True).stdout
+            resultados[str(tamanio)].update(json.loads(salida.strip().splitlines()[-1]))
+
+    regresiones = {}
+    if args.comparar:
+        with open(args.comparar) as fh:
+            base = json.load(fh)
+        regresiones = comparar(resultados, base["resultados"], args.tolerancia)
+    imprimir(resultados, regresiones)
+
+    if args.guardar_base:
+        with open(args.guardar_base, "w") as fh:
+            json.dump({"maquina": {"python": platform.python_version(), "cpus": os.cpu_count(),
+                                   "concurrencia": args.concurrencia, "escala": args.escala,
+                                   "latencia_rpc_ms": args.latencia_rpc_ms},
+                       "resultados": resultados}, fh, indent=2)
+    if regresiones:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Micro-benchmark del render de tickets.
+# Uso (desde la raíz del repo): python -m benchmarks.bench_render [iteraciones]
+import io
+import os
+import sys
+import time
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+from app.utils.qr_generator import TicketRenderer
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+SAMPLE = dict(
+    qr_url="https://qrpass.example.com/verificar?id=0b8f5c8e-7d1e-4c57-9a51-8d3c7f6a2b10",
+    nombre="María José Fernández",
+    evento="Fiesta de Fin de Año",
+    telefono="+54 9 11 5555-1234",
+    numero=1234,
+)
+
+def legacy_render(qr_url, nombre, evento, telefono, numero=None):
+    # Implementación anterior: reabre template y fuentes y reescala el QR en cada llamada
+    qr_img = qrcode.make(qr_url).convert("RGB")
+    bg = Image.open(os.path.join(STATIC, "ticketDDA.jpg")).convert("RGB")
+    W, H = bg.size
+    qr_size = 650
+    qr_img = qr_img.resize((qr_size, qr_size), Image.NEAREST)
+    qr_x = (W - qr_size) // 2
+    qr_y = (H - qr_size) // 2 - 40
+    bg.paste(qr_img, (qr_x, qr_y))
+    draw = ImageDraw.Draw(bg)
+    font_phone = ImageFont.truetype(os.path.join(STATIC, "arialbd.ttf"), 65)
+    font_name = ImageFont.truetype(os.path.join(STATIC, "arial.ttf"), 55)
+
+    def draw_centered(text, y, font):
+        w = draw.textlength(text, font=font)
+        draw.text(((W - w) // 2, y), text, font=font, fill=(0, 0, 0))
+
+    if numero is not None:
+        draw_centered(str(numero), qr_y - 60, font_phone)
+    draw_centered(telefono, qr_y + qr_size + 40, font_phone)
+    draw_centered(nombre, qr_y + qr_size + 120, font_name)
+    out = io.BytesIO()
+    bg.save(out, format="PNG")
+    return out.getvalue()
+
+def measure(label, fn, iterations):
+    fn(**SAMPLE)  # calentamiento
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(**dict(SAMPLE, numero=i))
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{label:<12} {rate:8.2f} renders/s  ({elapsed / iterations * 1000:.1f} ms/render)")
+    return rate
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    renderer = TicketRenderer(STATIC)
+    before = measure("antes", legacy_render, iterations)
+    after = measure("despues", renderer.render, iterations)
+    print(f"mejora x{after / before:.2f} (png compress_level={renderer.png_compress_level})")
+    renderer.png_compress_level = 3
+    fast = measure("despues/z3", renderer.render, iterations)
+    print(f"mejora x{fast / before:.2f} (png compress_level=3)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Tiempo de arranque de un worker: importar la app y crear el Flask app (lo
+# que hace gunicorn al levantar cada worker), el costo diferido al primer uso
+# de Firebase, y el primer request con y sin warm-up (app/utils/warmup.py).
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --repeticiones 10 --importtime 15
+#
+# Cada medición corre en un intérprete nuevo (imports en frío, salvo el cache
+# de disco del sistema operativo) y se informa la mediana. El arranque usa las
+# dependencias reales y no necesita credenciales: el cliente de Firestore ya
+# no se crea al importar. El primer request usa Firestore y Auth en memoria
+# (benchmarks/fake_firebase.py), así que no incluye abrir el canal gRPC real.
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+PESADOS = ("firebase_admin", "google.cloud.firestore", "grpc", "requests", "qrcode", "PIL.Image", "fpdf")
+
+def medir_create_app():
+    inicio = time.perf_counter()
+    from app import create_app
+    create_app()
+    return {"create_app_ms": (time.perf_counter() - inicio) * 1000,
+            "cargados": [m for m in PESADOS if m in sys.modules]}
+
+def medir_firebase():
+    # Lo que antes pagaba cada import de app.firebase y ahora paga el primer
+    # uso (o el warm-up)
+    inicio = time.perf_counter()
+    import firebase_admin.firestore  # noqa: F401
+    import firebase_admin.auth  # noqa: F401
+    return {"import_firebase_ms": (time.perf_counter() - inicio) * 1000}
+
+def medir_primer_request(warmup):
+    from benchmarks import fake_firebase
+    fake = fake_firebase.install()
+    from app import create_app
+    app = create_app()
+    db = fake.client
+    db.collection("eventos").document("ev0").set({"nombre": "Evento 0", "fecha_hora": "2025-12-31T22:00", "id": "ev0"})
+    for i in range(20):
+        entrada_id = f"{i:08d}-0000-4000-8000-000000000000"
+        db.collection("entradas").document(entrada_id).set({
+            "evento": "Evento 0", "nombre": f"Invitado {i}", "telefono": f"+54 9 11 {i:08d}",
+            "id": entrada_id, "estado": "valido", "numero": i + 1, "creada_en": f"2025-03-01T00:00:{i:02d}Z"})
+    resultado = {}
+    if warmup:
+        from app.utils.warmup import warm_up
+        inicio = time.perf_counter()
+        pasos = warm_up(app)
+        resultado["warmup_ms"] = (time.perf_counter() - inicio) * 1000
+        resultado.update({f"warmup_{k}_ms": v for k, v in pasos.items() if isinstance(v, float)})
+    client = app.test_client()
+    client.set_cookie("session", fake.auth.make_cookie("bench", "bench@example.com"))
+    for nombre, url in (("lista", "/lista"), ("descargar", f"/descargar/{0:08d}-0000-4000-8000-000000000000")):
+        for intento in ("primero", "segundo"):
+            inicio = time.perf_counter()
+            r = client.get(url)
+            r.get_data()
+            assert r.status_code == 200, (url, r.status_code)
+            resultado[f"{nombre}_{intento}_ms"] = (time.perf_counter() - inicio) * 1000
+    return resultado
+
+MEDICIONES = {
+    "create_app": medir_create_app,
+    "firebase": medir_firebase,
+    "primer_request": lambda: medir_primer_request(False),
+    "primer_request_warmup": lambda: medir_primer_request(True),
+}
+
+def correr(medicion, repeticiones):
+    muestras = []
+    for _ in range(repeticiones):
+        cmd = [sys.executable, "-m", "benchmarks.bench_startup", "--medir", medicion]
+        salida = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True).stdout
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+    resumen = {}
+    for clave, valor in muestras[0].items():
+        if isinstance(valor, (int, float)):
+            resumen[clave] = round(statistics.median(m[clave] for m in muestras), 1)
+        else:
+            resumen[clave] = valor
+    return resumen
+
+def importtime(n):
+    # Módulos de primer nivel que más tardan en importarse al crear la app
+    cmd = [sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app()"]
+    salida = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, check=True, text=True).stderr
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, acumulado, nombre = linea.split("|")
+        if acumulado.strip().isdigit() and not nombre.startswith("  "):
+            filas.append((int(acumulado) / 1000, nombre.strip()))
+    return sorted(filas, reverse=True)[:n]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque y del primer request")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=10, metavar="N",
+                        help="muestra los N imports de primer nivel más lentos (0: no)")
+    parser.add_argument("--medir", choices=sorted(MEDICIONES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(MEDICIONES[args.medir]()))
+        return
+
+    for medicion in MEDICIONES:
+        resumen = correr(medicion, args.repeticiones)
+        print(f"\n{medicion} (mediana de {args.repeticiones})")
+        for clave, valor in resumen.items():
+            print(f"  {clave:<32}{valor}")
+    if args.importtime:
+        print("\nimports más lentos al crear la app (ms acumulados)")
+        for ms, nombre in importtime(args.importtime):
+            print(f"  {nombre:<32}{ms:8.1f}")
+
+if __name__ == "__main__":
+    main()
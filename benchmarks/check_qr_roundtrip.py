@@ -0,0 +1,114 @@
+# Chequeo de que el QR de cada formato de ticket se lee igual al generado:
+# se reconstruye la matriz de módulos desde el archivo (píxeles en el centro
+# de cada módulo para los raster, el path en SVG, los rectángulos en PDF) y
+# tiene que coincidir con qr_matrix() de la URL. Si está pyzbar instalado,
+# además se decodifica el raster y el texto tiene que ser la URL.
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.check_qr_roundtrip
+#
+# Recorre todos los FORMATOS que acepta /descargar/<id> y, para jpeg, los
+# extremos de ?calidad. Sale con código 1 si falla alguno.
+import io
+import re
+import sys
+import zlib
+
+from PIL import Image
+
+from app.utils.qr_generator import TicketRenderer, FORMATOS, qr_matrix
+from benchmarks.bench_render import STATIC, SAMPLE
+
+try:
+    from pyzbar.pyzbar import decode as zbar_decode
+except ImportError:
+    zbar_decode = None
+
+# (formato, calidad) como los pide el endpoint; None = sin ?calidad
+VARIANTES = [(f, None) for f in FORMATOS] + [("jpeg", 1), ("jpeg", 100)]
+
+def _vacia(n):
+    return [[False] * n for _ in range(n)]
+
+def raster_modules(data, qr_box, n):
+    x, y, size = qr_box
+    img = Image.open(io.BytesIO(data)).convert("L")
+    modulo = size / n
+    return [[img.getpixel((int(x + (col + 0.5) * modulo), int(y + (row + 0.5) * modulo))) < 128
+             for col in range(n)] for row in range(n)]
+
+def svg_modules(data, n):
+    d = re.search(rb'<path [^>]*d="([^"]*)"', data).group(1).decode("ascii")
+    matrix = _vacia(n)
+    for x, y, largo in re.findall(r"M(\d+) (\d+)h(\d+)v1h-\d+z", d):
+        for col in range(int(x), int(x) + int(largo)):
+            matrix[int(y)][col] = True
+    return matrix
+
+def _pdf_contenido(data):
+    # El stream de contenido de la página, descomprimido si hace falta
+    for m in re.finditer(rb"<<([^>]*)>>\nstream\n", data):
+        fin = data.index(b"\nendstream", m.end())
+        stream = data[m.end():fin]
+        if b"FlateDecode" in m.group(1):
+            stream = zlib.decompressobj().decompress(stream)
+        texto = stream.decode("latin-1")
+        if " re f 0 g" in texto:
+            return texto
+    raise AssertionError("pdf: no se encontró el contenido de la página")
+
+def pdf_modules(data, qr_box, alto, n):
+    # Los módulos son los `re` entre "... re f 0 g" (fondo blanco del QR) y el "f" que los pinta
+    qr_x, qr_y, size = qr_box
+    stream = _pdf_contenido(data)
+    inicio = stream.index(" re f 0 g") + len(" re f 0 g")
+    bloque = stream[inicio:stream.index("\nf", inicio)]
+    modulo = size / n
+    top = alto - qr_y
+    matrix = _vacia(n)
+    for x, y, w, _ in re.findall(r"([\d.]+) ([\d.]+) ([\d.]+) ([\d.]+) re", bloque):
+        row = round((top - float(y)) / modulo) - 1
+        col = round((float(x) - qr_x) / modulo)
+        for c in range(col, col + round(float(w) / modulo)):
+            matrix[row][c] = True
+    return matrix
+
+def leer_qr(renderer, formato, data):
+    # Matriz de módulos del QR tal como quedó en el archivo
+    layout = renderer.layout(SAMPLE["nombre"], SAMPLE["evento"], SAMPLE["telefono"], SAMPLE["numero"])
+    n = len(qr_matrix(SAMPLE["qr_url"]))
+    if formato == "svg":
+        return svg_modules(data, n)
+    if formato == "pdf":
+        return pdf_modules(data, layout["qr"], layout["size"][1], n)
+    return raster_modules(data, layout["qr"], n)
+
+def chequear(renderer, formato, calidad):
+    data = renderer.render(**SAMPLE, formato=formato, calidad=calidad, background_href="ticketDDA.jpg")
+    esperado = [[bool(v) for v in row] for row in qr_matrix(SAMPLE["qr_url"])]
+    leido = leer_qr(renderer, formato, data)
+    assert leido == esperado, f"{formato}/{calidad}: {sum(a != b for r1, r2 in zip(leido, esperado) for a, b in zip(r1, r2))} módulos distintos"
+    if zbar_decode is not None and formato not in ("svg", "pdf"):
+        textos = [r.data.decode("utf-8") for r in zbar_decode(Image.open(io.BytesIO(data)))]
+        assert textos == [SAMPLE["qr_url"]], f"{formato}/{calidad}: zbar leyó {textos}"
+    return len(data)
+
+def main():
+    renderer = TicketRenderer(STATIC)
+    fallas = 0
+    for formato, calidad in VARIANTES:
+        label = formato if calidad is None else f"{formato}/{calidad}"
+        try:
+            size = chequear(renderer, formato, calidad)
+        except AssertionError as e:
+            fallas += 1
+            print(f"  FALLA: {e}")
+            continue
+        print(f"{label:<10} {size:>9} bytes  ok")
+    if zbar_decode is None:
+        print("(sin pyzbar: sólo se comparó la matriz de módulos)")
+    if fallas:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Chequeo de concurrencia del contador de números (app/utils/ticket_numbers.py)
+# contra Firestore en memoria (benchmarks/fake_firebase.py): N hilos piden
+# números para el mismo evento a la vez y se verifica que no se repita
+# ninguno y que no se pierda ninguno.
+#
+# Uso (desde la raíz del repo):
+#   python -m benchmarks.check_ticket_numbers
+#   python -m benchmarks.check_ticket_numbers --hilos 32 --bloque 10 --procesos 4 --latencia-rpc-ms 5
+#
+# --procesos simula varios workers: un TicketNumberAllocator por proceso, cada
+# uno con sus bloques en memoria, sobre el mismo contador. Con --bloque 1 los
+# números entregados tienen que ser exactamente existentes+1..existentes+N.
+# Con bloques, lo entregado más lo que quedó sin usar en cada bloque tiene
+# que cubrir justo hasta el valor del contador. Sale con código 1 si falla.
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EVENTO = "Evento concurrente"
+
+def sembrar(db, existentes):
+    # Entradas ya numeradas de antes del contador: el primer uso lo siembra
+    batch = db.batch()
+    for i in range(existentes):
+        entrada_id = f"{i:08d}-0000-4000-8000-000000000000"
+        batch.set(db.collection("entradas").document(entrada_id),
+                  {"evento": EVENTO, "nombre": f"Invitado {i}", "id": entrada_id, "estado": "valido", "numero": i + 1})
+    batch.commit()
+
+def chequear(entregados, sobrantes, existentes, ultimo, bloque):
+    errores = []
+    repetidos = len(entregados) - len(set(entregados))
+    if repetidos:
+        errores.append(f"{repetidos} números repetidos")
+    if any(n <= existentes for n in entregados):
+        errores.append("números ya usados por entradas existentes")
+    esperado = set(range(existentes + 1, ultimo + 1))
+    if bloque == 1:
+        if set(entregados) != esperado:
+            errores.append(f"no son contiguos: contador en {ultimo}, entregados {len(set(entregados))}")
+    else:
+        cubiertos = set(entregados) | set(sobrantes)
+        if cubiertos != esperado or set(entregados) & set(sobrantes):
+            errores.append(f"se perdieron números: contador en {ultimo}, cubiertos {len(cubiertos)}")
+    return errores
+
+def main():
+    parser = argparse.ArgumentParser(description="Unicidad y contigüidad de los números de entrada bajo concurrencia")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--numeros", type=int, default=50, help="números pedidos por hilo")
+    parser.add_argument("--bloque", type=int, default=1, help="TICKET_NUMBER_BLOCK_SIZE")
+    parser.add_argument("--procesos", type=int, default=1, help="allocators independientes sobre el mismo contador")
+    parser.add_argument("--existentes", type=int, default=0, help="entradas ya numeradas antes del primer uso")
+    parser.add_argument("--latencia-rpc-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    from benchmarks import fake_firebase
+    fake = fake_firebase.install()
+    from app.utils.ticket_numbers import TicketNumberAllocator, counter_ref
+
+    db = fake.client
+    sembrar(db, args.existentes)
+    fake.store.rpc_latency = args.latencia_rpc_ms / 1000
+    # Muchos reintentos con poca espera: el chequeo es de unicidad, no de backoff
+    allocators = [TicketNumberAllocator(db, block_size=args.bloque, max_attempts=200, base_delay=0.001, max_delay=0.05)
+                  for _ in range(args.procesos)]
+    barrera = threading.Barrier(args.hilos)
+
+    def pedir(i):
+        allocator = allocators[i % len(allocators)]
+        barrera.wait()
+        return [allocator.next_number(EVENTO) for _ in range(args.numeros)]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        entregados = [n for numeros in pool.map(pedir, range(args.hilos)) for n in numeros]
+    duracion = time.perf_counter() - inicio
+
+    ultimo = counter_ref(db, EVENTO).get().to_dict()["ultimo_numero"]
+    sobrantes = [n for a in allocators for desde, hasta in a._blocks.values() for n in range(desde, hasta)]
+    errores = chequear(entregados, sobrantes, args.existentes, ultimo, args.bloque)
+
+    reservas = sum(a.stats["reservas"] for a in allocators)
+    reintentos = sum(a.stats["reintentos"] for a in allocators)
+    print(f"{len(entregados)} números en {duracion:.2f} s ({args.hilos} hilos, {args.procesos} procesos, "
+          f"bloque {args.bloque}): contador en {ultimo}, {reservas} reservas, {reintentos} reintentos")
+    if errores:
+        for error in errores:
+            print(f"  FALLA: {error}")
+        sys.exit(1)
+    print("  ok: sin repetidos ni huecos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,925 @@
+# Firestore y Firebase Auth en memoria para benchmarks y pruebas locales.
+#
+# install() registra módulos falsos para ``firebase_admin`` y
+# ``google.cloud.firestore`` en sys.modules; debe llamarse antes de importar
+# ``app``. Implementa el subconjunto de la API que usa la aplicación:
+# referencias, consultas (where/order_by/limit/start_after/select/count),
+# batches, transacciones optimistas con reintentos, get_all y on_snapshot.
+# AsyncClient cubre lo que usa el modo ASGI (documentos y transacciones) sobre
+# los mismos datos.
+#
+# Cada llamada que en Firestore sería un RPC pasa por _Store.rpc(): cuenta
+# (rpc_count) y opcionalmente duerme rpc_latency segundos para simular la
+# red. Los filtros de igualdad usan un índice por campo, así una consulta
+# cuesta en proporción a lo que filtra y no al tamaño de la colección.
+import asyncio
+import bisect
+import copy
+import functools
+import queue
+import sys
+import threading
+import time
+import types
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions as gexc
+
+class _Sentinel:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+SERVER_TIMESTAMP = _Sentinel("SERVER_TIMESTAMP")
+DELETE_FIELD = _Sentinel("DELETE_FIELD")
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+class Maximum:
+    def __init__(self, value):
+        self.value = value
+
+class FieldFilter:
+    def __init__(self, field_path, op_string, value=None):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+class FieldPath:
+    @staticmethod
+    def document_id():
+        return "__name__"
+
+_MISSING = object()
+
+def _get_field(data, path):
+    cur = data
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+def _set_field(data, path, value):
+    parts = path.split(".")
+    cur = data
+    for part in parts[:-1]:
+        cur = cur.setdefault(part, {})
+    if value is DELETE_FIELD:
+        cur.pop(parts[-1], None)
+        return
+    if isinstance(value, Increment):
+        prev = cur.get(parts[-1])
+        value = (prev if isinstance(prev, (int, float)) else 0) + value.value
+    elif isinstance(value, Maximum):
+        prev = cur.get(parts[-1])
+        value = max(prev, value.value) if isinstance(prev, (int, float)) else value.value
+    elif value is SERVER_TIMESTAMP:
+        value = datetime.now(timezone.utc)
+    cur[parts[-1]] = value
+
+def _type_rank(v):
+    if v is None:
+        return 0
+    if isinstance(v, bool):
+        return 1
+    if isinstance(v, (int, float)):
+        return 2
+    if isinstance(v, datetime):
+        return 3
+    if isinstance(v, str):
+        return 4
+    if isinstance(v, bytes):
+        return 5
+    return 9
+
+def _sort_key(v):
+    rank = _type_rank(v)
+    return (rank, v if rank < 9 else repr(v))
+
+def _matches(value, op, target):
+    if op == "==":
+        return value is not _MISSING and value == target
+    if op == "!=":
+        return value is not _MISSING and value is not None and value != target
+    if op == "in":
+        return value is not _MISSING and value in target
+    if op == "not-in":
+        return value is not _MISSING and value not in target
+    if op == "array-contains":
+        return isinstance(value, list) and target in value
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(t in value for t in target)
+    if value is _MISSING or _type_rank(value) != _type_rank(target):
+        return False
+    if op == "<":
+        return value < target
+    if op == "<=":
+        return value <= target
+    if op == ">":
+        return value > target
+    if op == ">=":
+        return value >= target
+    raise ValueError(f"Operador no soportado: {op}")
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+        self.create_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections = {}
+        self.versions = {}
+        self.listeners = []
+        self.rpc_latency = 0.0
+        self.rpc_count = 0
+        self._rpc_lock = threading.Lock()
+        self.indexes = {}
+        # Resultados ordenados por consulta, válidos mientras no haya escrituras
+        # (como un índice de Firestore: paginar no reordena la colección)
+        self.generation = 0
+        self.sorted_cache = {}
+        self._events = queue.Queue()
+        self._dispatcher = None
+
+    def rpc(self):
+        with self._rpc_lock:
+            self.rpc_count += 1
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    async def arpc(self):
+        with self._rpc_lock:
+            self.rpc_count += 1
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+
+    def docs(self, collection):
+        return self.collections.setdefault(collection, {})
+
+    def _index(self, collection, doc_id, data, add):
+        # Sólo campos de primer nivel con valores hasheables
+        for field, value in (data or {}).items():
+            if isinstance(value, (dict, list)):
+                continue
+            ids = self.indexes.setdefault((collection, field), {}).setdefault(value, set())
+            if add:
+                ids.add(doc_id)
+            else:
+                ids.discard(doc_id)
+
+    def candidates(self, collection, filters):
+        # Ids que cumplen los filtros de igualdad (None: no hay ninguno)
+        sets = [self.indexes.get((collection, field), {}).get(value, set())
+                for field, op, value in filters if op == "==" and field != "__name__"
+                and not isinstance(value, (dict, list))]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return set(sets[0]).intersection(*sets[1:])
+
+    def read(self, collection, doc_id):
+        entry = self.docs(collection).get(doc_id)
+        version = self.versions.get((collection, doc_id), 0)
+        return entry, version
+
+    def apply(self, writes, reads=None):
+        with self.lock:
+            if reads:
+                for key, version in reads.items():
+                    if self.versions.get(key, 0) != version:
+                        raise gexc.Aborted("Transaction contention")
+            changed = []
+            self.generation += 1
+            self.sorted_cache.clear()
+            now = datetime.now(timezone.utc)
+            for op, ref, data, merge in writes:
+                docs = self.docs(ref._collection)
+                key = (ref._collection, ref.id)
+                before = docs.get(ref.id)
+                if op == "create":
+                    if before is not None:
+                        raise gexc.Conflict(f"Document already exists: {ref.path}")
+                    op = "set"
+                if op == "delete":
+                    docs.pop(ref.id, None)
+                    after = None
+                elif op == "set":
+                    base = copy.deepcopy(before[0]) if (merge and before) else {}
+                    for field, value in data.items():
+                        if merge and isinstance(value, dict) and isinstance(base.get(field), dict):
+                            for sub, subval in value.items():
+                                _set_field(base, f"{field}.{sub}", subval)
+                        else:
+                            _set_field(base, field, copy.deepcopy(value))
+                    after = (base, now)
+                elif op == "update":
+                    if before is None:
+                        raise gexc.NotFound(f"No document to update: {ref.path}")
+                    base = copy.deepcopy(before[0])
+                    for field, value in data.items():
+                        _set_field(base, field, copy.deepcopy(value))
+                    after = (base, now)
+                else:
+                    raise ValueError(op)
+                if before is not None:
+                    self._index(ref._collection, ref.id, before[0], add=False)
+                if after is not None:
+                    docs[ref.id] = after
+                    self._index(ref._collection, ref.id, after[0], add=True)
+                self.versions[key] = self.versions.get(key, 0) + 1
+                changed.append((ref, before, after))
+            if changed and self.listeners:
+                self._notify(changed, now)
+            return now
+
+    def _notify(self, changed, now):
+        for listener in list(self.listeners):
+            changes = []
+            for ref, before, after in changed:
+                if ref._collection != listener.query._collection:
+                    continue
+                was = ref.id in listener.matched
+                now_match = after is not None and listener.query._matches(after[0])
+                if now_match:
+                    listener.matched[ref.id] = after
+                    kind = "MODIFIED" if was else "ADDED"
+                    snap = DocumentSnapshot(ref, after[0], after[1], now)
+                elif was:
+                    del listener.matched[ref.id]
+                    kind = "REMOVED"
+                    snap = DocumentSnapshot(ref, before[0] if before else None, now, now)
+                else:
+                    continue
+                changes.append(DocumentChange(kind, snap))
+            if changes:
+                self._dispatch(listener, changes, now)
+
+    def _dispatch(self, listener, changes, now):
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._run_dispatcher, daemon=True)
+            self._dispatcher.start()
+        self._events.put((listener, changes, now))
+
+    def _run_dispatcher(self):
+        while True:
+            listener, changes, now = self._events.get()
+            if listener.active:
+                docs = [DocumentSnapshot(Client._ref_for(self, listener.query._collection, doc_id), d[0], d[1], now)
+                        for doc_id, d in listener.matched.items()]
+                try:
+                    listener.callback(docs, changes, now)
+                except Exception as e:
+                    print("fake on_snapshot callback error:", e)
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+class DocumentChange:
+    def __init__(self, kind, document):
+        self.type = _ChangeType(kind)
+        self.document = document
+
+class Watch:
+    def __init__(self, store, query, callback):
+        self.store = store
+        self.query = query
+        self.callback = callback
+        self.active = True
+        self.matched = {}
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def unsubscribe(self):
+        self.active = False
+        with self.store.lock:
+            if self in self.store.listeners:
+                self.store.listeners.remove(self)
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+        self.read_time = datetime.now(timezone.utc)
+
+class AggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggs = []
+
+    def count(self, alias=None):
+        self._aggs.append(("count", None, alias or "field_1"))
+        return self
+
+    def sum(self, field_ref, alias=None):
+        self._aggs.append(("sum", field_ref, alias or f"field_{len(self._aggs) + 1}"))
+        return self
+
+    def get(self, transaction=None, **kwargs):
+        self._query._client._store.rpc()
+        rows = [d for _, d in self._query._results()]
+        out = []
+        for kind, field, alias in self._aggs:
+            if kind == "count":
+                out.append(AggregationResult(alias, len(rows)))
+            else:
+                total = 0
+                for data in rows:
+                    v = _get_field(data, field)
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        total += v
+                out.append(AggregationResult(alias, total))
+        return [out]
+
+    def stream(self, transaction=None, **kwargs):
+        yield from self.get(transaction=transaction)
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, collection, filters=(), orders=(), limit=None, cursor=None, projection=None, offset=0):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+        self._offset = offset
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                    cursor=self._cursor, projection=self._projection, offset=self._offset)
+        args.update(kw)
+        return Query(self._client, self._collection, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def _cursor_values(self, document_fields):
+        if isinstance(document_fields, DocumentSnapshot):
+            data = document_fields._data or {}
+            values = [document_fields.id if f == "__name__" else _get_field(data, f) for f, _ in self._orders]
+            return values + [document_fields.id], True
+        if isinstance(document_fields, dict):
+            return [document_fields.get(f) for f, _ in self._orders], False
+        return list(document_fields), False
+
+    def start_after(self, document_fields):
+        return self._copy(cursor=("after",) + self._cursor_values(document_fields))
+
+    def start_at(self, document_fields):
+        return self._copy(cursor=("at",) + self._cursor_values(document_fields))
+
+    def count(self, alias=None):
+        return AggregationQuery(self).count(alias=alias)
+
+    def sum(self, field_ref, alias=None):
+        return AggregationQuery(self).sum(field_ref, alias=alias)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if not _matches(_get_field(data, field), op, value):
+                return False
+        for field, _ in self._orders:
+            if field != "__name__" and _get_field(data, field) is _MISSING:
+                return False
+        return True
+
+    def _sorted(self):
+        store = self._client._store
+        cache_key = (self._collection, repr(self._filters), self._orders)
+        with store.lock:
+            cached = store.sorted_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            generation = store.generation
+            docs = store.docs(self._collection)
+            ids = store.candidates(self._collection, self._filters)
+            entries = docs.items() if ids is None else ((i, docs[i]) for i in ids if i in docs)
+            items = [(doc_id, entry[0]) for doc_id, entry in entries if self._matches(entry[0])]
+        def key(item):
+            doc_id, data = item
+            parts = []
+            for field, direction in self._orders:
+                v = doc_id if field == "__name__" else _get_field(data, field)
+                k = _sort_key(v)
+                parts.append(_Desc(k) if direction == self.DESCENDING else k)
+            parts.append(doc_id)
+            return tuple(parts)
+        keyed = sorted(((key(item), item) for item in items), key=lambda x: x[0])
+        with store.lock:
+            if store.generation == generation:
+                store.sorted_cache[cache_key] = keyed
+        return keyed
+
+    def _results(self):
+        keyed = self._sorted()
+        if self._cursor:
+            # Con las claves ya ordenadas, el cursor es una búsqueda binaria
+            mode, values, with_id = self._cursor
+            target = []
+            for (field, direction), v in zip(self._orders, values):
+                k = _sort_key(v)
+                target.append(_Desc(k) if direction == self.DESCENDING else k)
+            n = len(target)
+            if with_id:
+                target.append(values[-1])
+            target = tuple(target)
+            cmp_key = (lambda x: x[0]) if with_id else (lambda x: x[0][:n])
+            start = (bisect.bisect_right if mode == "after" else bisect.bisect_left)(keyed, target, key=cmp_key)
+        else:
+            start = 0
+        start += self._offset or 0
+        end = None if self._limit is None else start + self._limit
+        return [item for _, item in keyed[start:end]]
+
+    def stream(self, transaction=None, **kwargs):
+        store = self._client._store
+        store.rpc()
+        now = datetime.now(timezone.utc)
+        for doc_id, data in self._results():
+            if transaction is not None:
+                transaction._reads[(self._collection, doc_id)] = store.versions.get((self._collection, doc_id), 0)
+            if self._projection is not None:
+                projected = {}
+                for f in self._projection:
+                    v = _get_field(data, f)
+                    if v is not _MISSING:
+                        _set_field(projected, f, copy.deepcopy(v))
+                data = projected
+            yield DocumentSnapshot(self._client._ref_for(store, self._collection, doc_id), data, now, now)
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        store = self._client._store
+        watch = Watch(store, self, callback)
+        with store.lock:
+            watch.matched = {doc_id: entry for doc_id, entry in store.docs(self._collection).items()
+                             if self._matches(entry[0])}
+            store.listeners.append(watch)
+            now = datetime.now(timezone.utc)
+            changes = [DocumentChange("ADDED", DocumentSnapshot(self._client._ref_for(store, self._collection, i), e[0], e[1], now))
+                       for i, e in watch.matched.items()]
+            store._dispatch(watch, changes, now)
+        return watch
+
+class _Desc:
+    __slots__ = ("k",)
+
+    def __init__(self, k):
+        self.k = k
+
+    def __lt__(self, other):
+        return self.k > other.k
+
+    def __gt__(self, other):
+        return self.k < other.k
+
+    def __eq__(self, other):
+        return self.k == other.k
+
+    def __le__(self, other):
+        return self.k >= other.k
+
+    def __ge__(self, other):
+        return self.k <= other.k
+
+class CollectionReference(Query):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+
+    @property
+    def id(self):
+        return self._collection
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._collection, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self, page_size=None):
+        store = self._client._store
+        with store.lock:
+            ids = list(store.docs(self._collection).keys())
+        return [self.document(i) for i in ids]
+
+class DocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection}/{self.id}"
+
+    @property
+    def parent(self):
+        return self._client.collection(self._collection)
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        self._client._store.rpc()
+        return self._read(field_paths, transaction)
+
+    def _read(self, field_paths=None, transaction=None):
+        store = self._client._store
+        with store.lock:
+            entry, version = store.read(self._collection, self.id)
+        if transaction is not None:
+            transaction._reads[(self._collection, self.id)] = version
+        now = datetime.now(timezone.utc)
+        if entry is None:
+            return DocumentSnapshot(self, None, None, now)
+        data = entry[0]
+        if field_paths is not None:
+            projected = {}
+            for f in field_paths:
+                v = _get_field(data, f)
+                if v is not _MISSING:
+                    _set_field(projected, f, v)
+            data = projected
+        return DocumentSnapshot(self, copy.deepcopy(data), entry[1], now)
+
+    def set(self, document_data, merge=False):
+        self._client._store.rpc()
+        self._client._store.apply([("set", self, document_data, merge)])
+
+    def create(self, document_data):
+        self._client._store.rpc()
+        self._client._store.apply([("create", self, document_data, False)])
+
+    def update(self, field_updates):
+        self._client._store.rpc()
+        self._client._store.apply([("update", self, field_updates, False)])
+
+    def delete(self):
+        self._client._store.rpc()
+        self._client._store.apply([("delete", self, None, False)])
+
+    def on_snapshot(self, callback):
+        return self._client.collection(self._collection).where("__name__", "==", self.id).on_snapshot(callback)
+
+class WriteBatch:
+    MAX_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _add(self, write):
+        self._writes.append(write)
+        return self
+
+    def set(self, reference, document_data, merge=False):
+        return self._add(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        return self._add(("create", reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        return self._add(("update", reference, field_updates, False))
+
+    def delete(self, reference):
+        return self._add(("delete", reference, None, False))
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise gexc.InvalidArgument("maximum 500 writes allowed per request")
+        store = self._client._store
+        store.rpc()
+        writes, self._writes = self._writes, []
+        return store.apply(writes)
+
+class Transaction(WriteBatch):
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._reads = {}
+        self.in_progress = False
+
+    def _begin(self):
+        self._reads = {}
+        self._writes = []
+        self.in_progress = True
+
+    def _rollback(self):
+        self._reads = {}
+        self._writes = []
+        self.in_progress = False
+
+    def _commit(self):
+        store = self._client._store
+        store.rpc()
+        writes, reads = self._writes, self._reads
+        self._writes, self._reads = [], {}
+        self.in_progress = False
+        return store.apply(writes, reads=reads)
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+def transactional(to_wrap):
+    @functools.wraps(to_wrap)
+    def wrapper(transaction, *args, **kwargs):
+        attempts = transaction._max_attempts
+        for _ in range(attempts):
+            transaction._begin()
+            try:
+                result = to_wrap(transaction, *args, **kwargs)
+            except Exception:
+                transaction._rollback()
+                raise
+            try:
+                transaction._commit()
+                return result
+            except gexc.Aborted:
+                continue
+        raise ValueError(f"Failed to commit transaction in {attempts:d} attempts.")
+    return wrapper
+
+class Client:
+    def __init__(self, store=None, project="fake-project"):
+        self._store = store or _Store()
+        self.project = project
+
+    @staticmethod
+    def _ref_for(store, collection, doc_id):
+        return DocumentReference(_clients_by_store[id(store)], collection, doc_id)
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def document(self, path):
+        collection, doc_id = path.split("/", 1)
+        return DocumentReference(self, collection, doc_id)
+
+    def collections(self):
+        return [CollectionReference(self, n) for n in list(self._store.collections)]
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False, **kwargs):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        # Un solo RPC (BatchGetDocuments) para todas las referencias
+        self._store.rpc()
+        for ref in references:
+            yield ref._read(field_paths, transaction)
+
+# --- asyncio ---
+
+class AsyncDocumentReference(DocumentReference):
+    async def get(self, field_paths=None, transaction=None, **kwargs):
+        await self._client._store.arpc()
+        return self._read(field_paths, transaction)
+
+    async def set(self, document_data, merge=False):
+        await self._client._store.arpc()
+        self._client._store.apply([("set", self, document_data, merge)])
+
+    async def update(self, field_updates):
+        await self._client._store.arpc()
+        self._client._store.apply([("update", self, field_updates, False)])
+
+    async def delete(self):
+        await self._client._store.arpc()
+        self._client._store.apply([("delete", self, None, False)])
+
+class AsyncCollectionReference(CollectionReference):
+    def document(self, document_id=None):
+        return AsyncDocumentReference(self._client, self._collection, document_id or uuid.uuid4().hex[:20])
+
+class AsyncWriteBatch(WriteBatch):
+    async def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise gexc.InvalidArgument("maximum 500 writes allowed per request")
+        store = self._client._store
+        await store.arpc()
+        writes, self._writes = self._writes, []
+        return store.apply(writes)
+
+class AsyncTransaction(Transaction):
+    async def _commit(self):
+        store = self._client._store
+        await store.arpc()
+        writes, reads = self._writes, self._reads
+        self._writes, self._reads = [], {}
+        self.in_progress = False
+        return store.apply(writes, reads=reads)
+
+def async_transactional(to_wrap):
+    @functools.wraps(to_wrap)
+    async def wrapper(transaction, *args, **kwargs):
+        attempts = transaction._max_attempts
+        for _ in range(attempts):
+            transaction._begin()
+            try:
+                result = await to_wrap(transaction, *args, **kwargs)
+            except Exception:
+                transaction._rollback()
+                raise
+            try:
+                await transaction._commit()
+                return result
+            except gexc.Aborted:
+                continue
+        raise ValueError(f"Failed to commit transaction in {attempts:d} attempts.")
+    return wrapper
+
+class AsyncClient(Client):
+    def collection(self, name):
+        return AsyncCollectionReference(self, name)
+
+    def document(self, path):
+        collection, doc_id = path.split("/", 1)
+        return AsyncDocumentReference(self, collection, doc_id)
+
+    def batch(self):
+        return AsyncWriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False, **kwargs):
+        return AsyncTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        await self._store.arpc()
+        for ref in references:
+            yield ref._read(field_paths, transaction)
+
+_clients_by_store = {}
+
+class FakeAuth:
+    class InvalidSessionCookieError(Exception):
+        pass
+
+    class RevokedSessionCookieError(InvalidSessionCookieError):
+        pass
+
+    class UserNotFoundError(Exception):
+        pass
+
+    def __init__(self):
+        self.verify_calls = 0
+        self.revocation_checks = 0
+        self.latency = 0.0
+        self._revoked_after = {}
+
+    def create_session_cookie(self, id_token, expires_in=None):
+        return f"fake-session:{id_token}:{time.time():.6f}"
+
+    def make_cookie(self, uid, email=None):
+        return f"fake-session:{uid}|{email or uid + '@example.com'}:{time.time():.6f}"
+
+    def verify_session_cookie(self, session_cookie, check_revoked=False, app=None):
+        self.verify_calls += 1
+        if not session_cookie or not session_cookie.startswith("fake-session:"):
+            raise self.InvalidSessionCookieError("invalid cookie")
+        _, ident, issued = session_cookie.split(":", 2)
+        uid, _, email = ident.partition("|")
+        issued = float(issued)
+        if check_revoked:
+            self.revocation_checks += 1
+            if self.latency:
+                time.sleep(self.latency)
+            if self._revoked_after.get(uid, 0) > issued:
+                raise self.RevokedSessionCookieError("revoked")
+        return {"uid": uid, "email": email or None, "iat": int(issued), "auth_time": int(issued),
+                "exp": int(issued) + 5 * 86400}
+
+    def revoke_refresh_tokens(self, uid, app=None):
+        self._revoked_after[uid] = time.time()
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    return mod
+
+_installed = None
+
+def install(rpc_latency=0.0, auth_latency=0.0):
+    global _installed
+    if _installed is not None:
+        return _installed
+    store = _Store()
+    store.rpc_latency = rpc_latency
+    client = Client(store)
+    _clients_by_store[id(store)] = client
+    async_client = AsyncClient(store)
+    fake_auth = FakeAuth()
+    fake_auth.latency = auth_latency
+
+    firestore_api = dict(
+        Client=Client, Query=Query, Transaction=Transaction, WriteBatch=WriteBatch,
+        transactional=transactional, Increment=Increment, Maximum=Maximum, FieldFilter=FieldFilter,
+        FieldPath=FieldPath, SERVER_TIMESTAMP=SERVER_TIMESTAMP, DELETE_FIELD=DELETE_FIELD,
+        DocumentSnapshot=DocumentSnapshot, DocumentReference=DocumentReference,
+        CollectionReference=CollectionReference, AsyncClient=AsyncClient, AsyncTransaction=AsyncTransaction,
+        async_transactional=async_transactional,
+    )
+    gcf = _module("google.cloud.firestore", **firestore_api)
+
+    fa = _module("firebase_admin", _apps={})
+
+    def initialize_app(credential=None, options=None, name="[DEFAULT]"):
+        fa._apps[name] = types.SimpleNamespace(name=name, credential=credential, options=options or {})
+        return fa._apps[name]
+
+    fa.initialize_app = initialize_app
+    fa.get_app = lambda name="[DEFAULT]": fa._apps[name]
+    fa.credentials = _module("firebase_admin.credentials",
+                             Certificate=lambda cert: types.SimpleNamespace(cert=cert),
+                             ApplicationDefault=lambda: types.SimpleNamespace())
+    fa.firestore = _module("firebase_admin.firestore", client=lambda app=None: client, **firestore_api)
+    fa.firestore_async = _module("firebase_admin.firestore_async", client=lambda app=None: async_client,
+                                 **firestore_api)
+    fa.auth = _module(
+        "firebase_admin.auth",
+        verify_session_cookie=fake_auth.verify_session_cookie,
+        create_session_cookie=fake_auth.create_session_cookie,
+        revoke_refresh_tokens=fake_auth.revoke_refresh_tokens,
+        InvalidSessionCookieError=FakeAuth.InvalidSessionCookieError,
+        RevokedSessionCookieError=FakeAuth.RevokedSessionCookieError,
+        UserNotFoundError=FakeAuth.UserNotFoundError,
+    )
+    sys.modules.update({
+        "firebase_admin": fa,
+        "firebase_admin.credentials": fa.credentials,
+        "firebase_admin.firestore": fa.firestore,
+        "firebase_admin.firestore_async": fa.firestore_async,
+        "firebase_admin.auth": fa.auth,
+        "google.cloud.firestore": gcf,
+    })
+    try:
+        import google.cloud
+        google.cloud.firestore = gcf
+    except ImportError:
+        pass
+    _installed = types.SimpleNamespace(client=client, async_client=async_client, store=store, auth=fake_auth)
+    return _installed
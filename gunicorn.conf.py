@@ -0,0 +1,18 @@
+import threading
+
+# gunicorn carga este archivo solo (está en el directorio de trabajo); las
+# opciones de línea de comandos del Procfile tienen prioridad.
+
+def post_worker_init(worker):
+    # La app ya está cargada en el worker: con WARMUP_ON_START=1 se calienta
+    # en un hilo aparte para no demorar el arranque ni los primeros requests.
+    from app.config import Config
+    # Con el worker de uvicorn (asgi.py) calienta el lifespan de la app
+    if not Config.WARMUP_ON_START or hasattr(worker.wsgi, "flask_app"):
+        return
+    from app.utils.warmup import warm_up
+
+    def run():
+        worker.log.info("Warm-up: %s", warm_up(worker.wsgi))
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()